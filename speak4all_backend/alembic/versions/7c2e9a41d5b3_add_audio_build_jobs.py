@@ -0,0 +1,64 @@
+"""add audio build jobs
+
+Revision ID: 7c2e9a41d5b3
+Revises: dad633939ff3
+Create Date: 2026-10-16 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e9a41d5b3'
+down_revision: Union[str, Sequence[str], None] = 'dad633939ff3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+audio_status = postgresql.ENUM('PENDING', 'READY', 'FAILED', name='audiostatus', create_type=False)
+audio_job_status = postgresql.ENUM('PENDING', 'RUNNING', 'DONE', 'FAILED', name='audiojobstatus', create_type=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    audio_status.create(op.get_bind(), checkfirst=True)
+    audio_job_status.create(op.get_bind(), checkfirst=True)
+
+    op.add_column('exercises', sa.Column('audio_status', audio_status, nullable=False, server_default='READY'))
+    op.alter_column('exercises', 'audio_path',
+               existing_type=sa.String(),
+               nullable=True)
+
+    op.create_table('audio_build_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('exercise_id', sa.Integer(), nullable=False),
+    sa.Column('marked_text', sa.Text(), nullable=False),
+    sa.Column('status', audio_job_status, nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('locked_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['exercise_id'], ['exercises.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_audio_build_jobs_exercise_id'), 'audio_build_jobs', ['exercise_id'], unique=False)
+    op.create_index('ix_audio_build_jobs_status_created_at', 'audio_build_jobs', ['status', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_audio_build_jobs_status_created_at', table_name='audio_build_jobs')
+    op.drop_index(op.f('ix_audio_build_jobs_exercise_id'), table_name='audio_build_jobs')
+    op.drop_table('audio_build_jobs')
+
+    op.execute("UPDATE exercises SET audio_path = '' WHERE audio_path IS NULL")
+    op.alter_column('exercises', 'audio_path',
+               existing_type=sa.String(),
+               nullable=False)
+    op.drop_column('exercises', 'audio_status')
+
+    audio_job_status.drop(op.get_bind(), checkfirst=True)
+    audio_status.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,80 @@
+"""add exercise batches
+
+Revision ID: a8d4e1f09b37
+Revises: f3c9b2e7a4d1
+Create Date: 2026-10-17 00:05:41.327519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d4e1f09b37'
+down_revision: Union[str, Sequence[str], None] = 'f3c9b2e7a4d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+batch_status = postgresql.ENUM('RUNNING', 'DONE', 'FAILED', name='exercisebatchstatus', create_type=False)
+batch_item_status = postgresql.ENUM(
+    'QUEUED', 'GENERATING', 'RENDERING', 'DONE', 'FAILED', name='exercisebatchitemstatus', create_type=False
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    batch_status.create(op.get_bind(), checkfirst=True)
+    batch_item_status.create(op.get_bind(), checkfirst=True)
+
+    op.create_table('exercise_batches',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('therapist_id', sa.Integer(), nullable=False),
+    sa.Column('folder_id', sa.Integer(), nullable=True),
+    sa.Column('status', batch_status, nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['folder_id'], ['exercise_folders.id'], ),
+    sa.ForeignKeyConstraint(['therapist_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_exercise_batches_therapist_id'), 'exercise_batches', ['therapist_id'], unique=False)
+
+    op.create_table('exercise_batch_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('batch_id', sa.String(length=32), nullable=False),
+    sa.Column('index', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('prompt', sa.Text(), nullable=False),
+    sa.Column('profile_id', sa.Integer(), nullable=True),
+    sa.Column('status', batch_item_status, nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('locked_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('marked_text', sa.Text(), nullable=True),
+    sa.Column('audio_path', sa.String(), nullable=True),
+    sa.Column('audio_manifest', sa.JSON(), nullable=True),
+    sa.Column('exercise_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['batch_id'], ['exercise_batches.id'], ),
+    sa.ForeignKeyConstraint(['exercise_id'], ['exercises.id'], ),
+    sa.ForeignKeyConstraint(['profile_id'], ['profiles.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('batch_id', 'index', name='uq_exercise_batch_items_batch_index')
+    )
+    op.create_index(op.f('ix_exercise_batch_items_batch_id'), 'exercise_batch_items', ['batch_id'], unique=False)
+    op.create_index('ix_exercise_batch_items_status_id', 'exercise_batch_items', ['status', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_exercise_batch_items_status_id', table_name='exercise_batch_items')
+    op.drop_index(op.f('ix_exercise_batch_items_batch_id'), table_name='exercise_batch_items')
+    op.drop_table('exercise_batch_items')
+    op.drop_index(op.f('ix_exercise_batches_therapist_id'), table_name='exercise_batches')
+    op.drop_table('exercise_batches')
+
+    batch_item_status.drop(op.get_bind(), checkfirst=True)
+    batch_status.drop(op.get_bind(), checkfirst=True)
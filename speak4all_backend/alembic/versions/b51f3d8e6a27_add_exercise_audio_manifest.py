@@ -0,0 +1,30 @@
+"""add exercise marked_text and audio manifest
+
+Revision ID: b51f3d8e6a27
+Revises: 7c2e9a41d5b3
+Create Date: 2026-10-16 11:40:03.552871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b51f3d8e6a27'
+down_revision: Union[str, Sequence[str], None] = '7c2e9a41d5b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('exercises', sa.Column('marked_text', sa.Text(), nullable=True))
+    op.add_column('exercises', sa.Column('audio_manifest', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('exercises', 'audio_manifest')
+    op.drop_column('exercises', 'marked_text')
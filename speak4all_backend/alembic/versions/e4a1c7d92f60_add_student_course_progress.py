@@ -0,0 +1,40 @@
+"""add student course progress
+
+Revision ID: e4a1c7d92f60
+Revises: b51f3d8e6a27
+Create Date: 2026-10-16 15:02:27.481930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a1c7d92f60'
+down_revision: Union[str, Sequence[str], None] = 'b51f3d8e6a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('student_course_progress',
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('weighted_sum', sa.Float(), nullable=False),
+    sa.Column('total_weight', sa.Integer(), nullable=False),
+    sa.Column('evaluated_count', sa.Integer(), nullable=False),
+    sa.Column('total_exercises', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ),
+    sa.ForeignKeyConstraint(['student_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('course_id', 'student_id')
+    )
+    # Poblar tras migrar: python -m app.services.progress_store rebuild
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('student_course_progress')
@@ -0,0 +1,28 @@
+"""add rubric template version
+
+Revision ID: f3c9b2e7a4d1
+Revises: e4a1c7d92f60
+Create Date: 2026-10-16 23:40:12.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c9b2e7a4d1'
+down_revision: Union[str, Sequence[str], None] = 'e4a1c7d92f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('rubric_templates', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('rubric_templates', 'version')
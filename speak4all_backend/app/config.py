@@ -9,6 +9,9 @@ class Settings(BaseSettings):
 
     # === Google OAuth ===
     google_client_id: str | None = None
+    google_jwks_url: str = "https://www.googleapis.com/oauth2/v3/certs"
+    google_jwks_cache_file: str | None = None  # por defecto en el directorio temporal
+    google_jwks_file: str | None = None  # JWKS local fijo, sin red (pruebas)
 
     # === OpenAI ===
     openai_api_key: str
@@ -22,6 +25,42 @@ class Settings(BaseSettings):
     audio_rate: int = 44100
     bitrate: str = "192k"
 
+    # === Jobs de generación de audio ===
+    audio_job_workers: int = 2  # workers por proceso (0 = no procesar jobs en esta réplica)
+    audio_job_poll_interval_s: float = 2.0
+    audio_job_timeout_s: int = 900  # un job RUNNING más antiguo se considera abandonado
+    audio_job_max_attempts: int = 3
+
+    # === Generación de ejercicios por lotes ===
+    exercise_batch_max_items: int = 30
+    exercise_batch_concurrency: int = 4  # elementos en curso a la vez entre todos los lotes y réplicas
+
+    # === Evaluaciones en bloque ===
+    evaluation_bulk_max_items: int = 200
+
+    # === Caché de rúbricas ===
+    rubric_cache_max_entries: int = 1024
+
+    # === Pool de contraseñas (bcrypt) ===
+    password_pool_workers: int = 2  # procesos; 0 = en un hilo del proceso de la API
+    password_pool_max_pending: int = 64  # en espera + en curso; por encima se responde 503
+
+    # === Caché del usuario autenticado ===
+    user_cache_ttl_s: float = 30  # 0 desactiva la caché
+    user_cache_max_entries: int = 10000
+
+    # === WebSocket entre workers (LISTEN/NOTIFY) ===
+    ws_backplane_enabled: bool = True
+    ws_backplane_channel: str = "speak4all_ws"
+    ws_backplane_queue_size: int = 1000  # publicaciones pendientes; por encima se descartan (solo local)
+    # Cola de envío por socket: los broadcasts solo encolan
+    ws_send_queue_size: int = 100
+    ws_send_timeout_s: float = 10.0  # un envío más lento desconecta al cliente
+    ws_overflow_policy: str = "disconnect"  # o "drop_oldest" (descarta el mensaje más antiguo)
+
+    # === Métricas ===
+    metrics_token: str | None = None  # cabecera X-Metrics-Token; sin token, /metrics responde 404
+
     # === CORS ===
     cors_origins: str = "http://localhost:3000"
 
@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.pool import QueuePool
 from .config import settings
@@ -18,6 +20,39 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _async_engine_args(database_url: str) -> tuple:
+    """
+    Misma base de datos con el driver asyncpg. asyncpg no entiende
+    connect_timeout ni sslmode en la URL: se pasan como connect_args.
+    """
+    url = make_url(database_url)
+    connect_args = {"timeout": 10}
+    if url.get_backend_name() == "postgresql":
+        query = dict(url.query)
+        sslmode = query.pop("sslmode", None)
+        if sslmode and sslmode != "disable":
+            connect_args["ssl"] = sslmode
+        url = url.set(drivername="postgresql+asyncpg", query=query)
+    return url, connect_args
+
+
+_async_url, _async_connect_args = _async_engine_args(settings.database_url)
+
+# Pool propio para los endpoints async: no bloquean el event loop mientras esperan a la BD
+async_engine = create_async_engine(
+    _async_url,
+    echo=False,
+    pool_size=20,
+    max_overflow=40,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    connect_args=_async_connect_args,
+)
+
+# expire_on_commit=False: tras el commit se siguen leyendo atributos sin volver a consultar
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 # Dependencia para inyectar el DB en los endpoints
@@ -28,3 +63,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Dependencia async para endpoints `async def`
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
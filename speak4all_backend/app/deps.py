@@ -1,14 +1,18 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Annotated
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from .config import settings
 from .database import get_db
 from . import models
+from .services import user_cache
 from passlib.context import CryptContext
 
 # Esquema "Bearer" simple para Swagger
@@ -28,8 +32,9 @@ def verify_password(plain_password: str, password_hash: str) -> bool:
 
 def create_access_token(data: dict, expires_minutes: int = 60 * 24) -> str:
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(minutes=expires_minutes)
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    expire = now + timedelta(minutes=expires_minutes)
+    to_encode.update({"exp": expire, "iat": int(now.timestamp())})
     encoded_jwt = jwt.encode(
         to_encode,
         settings.jwt_secret,
@@ -38,12 +43,7 @@ def create_access_token(data: dict, expires_minutes: int = 60 * 24) -> str:
     return encoded_jwt
 
 
-def get_current_user(
-    credentials: Annotated[HTTPAuthorizationCredentials, Depends(bearer_scheme)],
-    db: Session = Depends(get_db),
-) -> models.User:
-    token = credentials.credentials  # <-- aquí está el JWT
-
+def _decode_token(token: str) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudo validar el token",
@@ -58,9 +58,20 @@ def get_current_user(
         sub = payload.get("sub")
         if sub is None:
             raise credentials_exception
-        user_id = int(sub)
+        payload["sub"] = int(sub)
     except (JWTError, ValueError):
         raise credentials_exception
+    return payload
+
+
+def _load_user(db: Session, payload: dict) -> models.User:
+    """Usuario del token: primero la caché (user_id, iat), si no la BD."""
+    user_id = payload["sub"]
+    iat = int(payload.get("iat") or 0)
+
+    user = user_cache.get(db, user_id, iat)
+    if user is not None:
+        return user
 
     user = db.query(models.User).filter(
         models.User.id == user_id,
@@ -68,12 +79,51 @@ def get_current_user(
     ).first()
 
     if not user:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="No se pudo validar el token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
+    user_cache.put(user_id, iat, user)
     return user
 
 
-async def get_current_user_ws(token: str, db: Session) -> models.User:
+def get_current_user(
+    credentials: Annotated[HTTPAuthorizationCredentials, Depends(bearer_scheme)],
+    db: Session = Depends(get_db),
+) -> models.User:
+    token = credentials.credentials  # <-- aquí está el JWT
+    return _load_user(db, _decode_token(token))
+
+
+@dataclass(frozen=True)
+class TokenClaims:
+    """Id y rol del usuario tomados del token, sin consultar la BD."""
+    id: int
+    role: models.UserRole
+
+
+def get_current_claims(
+    credentials: Annotated[HTTPAuthorizationCredentials, Depends(bearer_scheme)],
+    db: Session = Depends(get_db),
+) -> TokenClaims:
+    """
+    Para endpoints que solo necesitan id y rol (sirve con require_therapist y
+    demás comprobaciones que leen `.id` / `.role`). No comprueba si el usuario
+    fue dado de baja después de emitir el token: usar get_current_user en
+    endpoints que escriben. Los tokens antiguos sin `role` pasan por la caché/BD.
+    """
+    payload = _decode_token(credentials.credentials)
+    role = payload.get("role")
+    try:
+        return TokenClaims(id=payload["sub"], role=models.UserRole(role))
+    except ValueError:
+        user = _load_user(db, payload)
+        return TokenClaims(id=user.id, role=user.role)
+
+
+async def get_current_user_ws(token: str, db: AsyncSession) -> models.User:
     """
     Validate JWT token for WebSocket connections (no HTTPBearer, token from query param)
     """
@@ -94,10 +144,12 @@ async def get_current_user_ws(token: str, db: Session) -> models.User:
     except (JWTError, ValueError):
         raise credentials_exception
 
-    user = db.query(models.User).filter(
-        models.User.id == user_id,
-        models.User.deleted_at.is_(None),
-    ).first()
+    user = (await db.execute(
+        select(models.User).where(
+            models.User.id == user_id,
+            models.User.deleted_at.is_(None),
+        )
+    )).scalars().first()
 
     if not user:
         raise credentials_exception
@@ -1,4 +1,5 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Request, status
+from fastapi.responses import JSONResponse
 from .routers import (
     auth, courses, exercises, submissions, course_exercises, 
     observations, course_students, course_groups, exercise_folders,
@@ -7,8 +8,13 @@ from .routers import (
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import logging
+import secrets
 from .config import settings
+from .database import async_engine
+from .websocket_manager import manager as ws_manager
+from .services import ai_exercises, audio_jobs, google_jwks, password_pool, rubric_cache, user_cache
 
 # Configurar logging
 logging.basicConfig(
@@ -36,10 +42,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Time-To-First-Token-Ms", "Server-Timing"],
 )
 
 logger.info(f"CORS configurado para: {origins}")
 
+
+@app.exception_handler(password_pool.PasswordPoolBusy)
+async def password_pool_busy_handler(request: Request, exc: password_pool.PasswordPoolBusy):
+    # Demasiados logins a la vez: mejor rechazar ya que responder tarde
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Servidor ocupado, inténtalo de nuevo en unos segundos"},
+        headers={"Retry-After": str(exc.retry_after_s)},
+    )
+
 # Montar solo la carpeta media (no todo el proyecto)
 app.mount(
     "/media",
@@ -65,12 +82,49 @@ app.include_router(categories.router)
 
 app.include_router(websocket.router, tags=["websocket"])
 
+
+@app.on_event("startup")
+async def start_background_workers():
+    # Workers que generan el audio de los ejercicios en segundo plano
+    audio_jobs.start_workers()
+    # Procesos para bcrypt (login, registro, cambio de contraseña)
+    await asyncio.to_thread(password_pool.start)
+    # Claves de Google para verificar id_token (en segundo plano)
+    google_jwks.prefetch()
+    # Reenvío de broadcasts WebSocket entre workers/réplicas
+    await ws_manager.start_backplane()
+
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await audio_jobs.stop_workers()
+    await ws_manager.stop_backplane()
+    await async_engine.dispose()
+    await asyncio.to_thread(password_pool.shutdown)
+
 # Endpoint de healthcheck para Docker y monitoreo
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+# Contadores de las cachés en proceso (por réplica). Solo con METRICS_TOKEN
+@app.get("/metrics")
+def metrics(x_metrics_token: str | None = Header(None)):
+    if not settings.metrics_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_metrics_token or not secrets.compare_digest(x_metrics_token, settings.metrics_token):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token de métricas inválido.")
+    return {
+        "user_cache": user_cache.stats(),
+        "rubric_cache": rubric_cache.stats(),
+        "password_pool": password_pool.stats(),
+        "google_jwks": google_jwks.stats(),
+        "websocket": ws_manager.stats(),
+        "tts_cache": ai_exercises.tts_cache.stats() if ai_exercises.tts_cache is not None else None,
+    }
+
+
 @app.get("/")
 def root():
     return {"message": "Speak4All backend OK"}
\ No newline at end of file
@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Column, Integer, String, Boolean, DateTime, ForeignKey, Text,
-    Enum, UniqueConstraint
+    Enum, UniqueConstraint, Index, JSON, Float
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -28,6 +28,33 @@ class SubmissionStatus(str, enum.Enum):
     DONE = "DONE"
 
 
+class AudioStatus(str, enum.Enum):
+    PENDING = "PENDING"
+    READY = "READY"
+    FAILED = "FAILED"
+
+
+class AudioJobStatus(str, enum.Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
+class ExerciseBatchStatus(str, enum.Enum):
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
+class ExerciseBatchItemStatus(str, enum.Enum):
+    QUEUED = "QUEUED"
+    GENERATING = "GENERATING"
+    RENDERING = "RENDERING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -106,7 +133,11 @@ class Exercise(Base):
     name = Column(String, nullable=False)
     prompt = Column(Text, nullable=True)         # prompt usado con IA
     text = Column(Text, nullable=False)         # texto final del ejercicio
-    audio_path = Column(String, nullable=False) # path relativo del mp3
+    marked_text = Column(Text, nullable=True)   # guion con [REP] usado para el audio
+    audio_path = Column(String, nullable=True)  # path relativo del mp3 (None mientras se genera)
+    audio_status = Column(Enum(AudioStatus), nullable=False, default=AudioStatus.READY)
+    # Manifiesto de segmentos renderizados: [{type, text_hash, pause, chunk_path}, ...]
+    audio_manifest = Column(JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), default=utcnow)
     updated_at = Column(DateTime(timezone=True), default=utcnow)
     is_deleted = Column(Boolean, default=False)
@@ -115,6 +146,79 @@ class Exercise(Base):
     folder = relationship("ExerciseFolder", back_populates="exercises")
 
 
+class AudioBuildJob(Base):
+    """
+    Trabajo pendiente de generación de audio (TTS + ffmpeg) para un ejercicio.
+    Cualquier réplica de la API lo reclama con SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    __tablename__ = "audio_build_jobs"
+
+    id = Column(Integer, primary_key=True)
+    exercise_id = Column(Integer, ForeignKey("exercises.id"), nullable=False, index=True)
+    marked_text = Column(Text, nullable=False)  # guion con [REP] a sintetizar
+    status = Column(Enum(AudioJobStatus), nullable=False, default=AudioJobStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)  # cuándo lo reclamó un worker
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+    updated_at = Column(DateTime(timezone=True), default=utcnow)
+
+    exercise = relationship("Exercise")
+
+    __table_args__ = (
+        Index("ix_audio_build_jobs_status_created_at", "status", "created_at"),
+    )
+
+
+class ExerciseBatch(Base):
+    """
+    Lote de ejercicios generados con IA. Los ejercicios correctos se insertan
+    juntos cuando todos los elementos terminan.
+    """
+    __tablename__ = "exercise_batches"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    therapist_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    folder_id = Column(Integer, ForeignKey("exercise_folders.id"), nullable=True)
+    status = Column(Enum(ExerciseBatchStatus), nullable=False, default=ExerciseBatchStatus.RUNNING)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    items = relationship("ExerciseBatchItem", back_populates="batch", order_by="ExerciseBatchItem.index")
+
+
+class ExerciseBatchItem(Base):
+    """
+    Elemento de un lote: guion con IA + audio. Lo reclaman los mismos workers
+    que los audio_build_jobs (SELECT ... FOR UPDATE SKIP LOCKED).
+    """
+    __tablename__ = "exercise_batch_items"
+
+    id = Column(Integer, primary_key=True)
+    batch_id = Column(String(32), ForeignKey("exercise_batches.id"), nullable=False, index=True)
+    index = Column(Integer, nullable=False)
+    name = Column(String, nullable=False)
+    prompt = Column(Text, nullable=False)
+    profile_id = Column(Integer, ForeignKey("profiles.id"), nullable=True)
+    status = Column(Enum(ExerciseBatchItemStatus), nullable=False, default=ExerciseBatchItemStatus.QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)  # cuándo lo reclamó un worker
+    marked_text = Column(Text, nullable=True)  # se conserva entre reintentos
+    audio_path = Column(String, nullable=True)
+    audio_manifest = Column(JSON, nullable=True)
+    exercise_id = Column(Integer, ForeignKey("exercises.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+    updated_at = Column(DateTime(timezone=True), default=utcnow)
+
+    batch = relationship("ExerciseBatch", back_populates="items")
+
+    __table_args__ = (
+        UniqueConstraint("batch_id", "index", name="uq_exercise_batch_items_batch_index"),
+        Index("ix_exercise_batch_items_status_id", "status", "id"),
+    )
+
+
 class ExerciseCategory(Base):
     """
     Categoría de ejercicio creada por el terapeuta.
@@ -198,6 +302,7 @@ class RubricTemplate(Base):
     course_exercise_id = Column(Integer, ForeignKey("course_exercises.id"), nullable=False, unique=True)
     therapist_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     max_score = Column(Integer, nullable=False, default=100)  # Puntuación máxima
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Se incrementa en cada cambio del árbol
     created_at = Column(DateTime(timezone=True), default=utcnow)
     updated_at = Column(DateTime(timezone=True), default=utcnow)
     is_deleted = Column(Boolean, default=False)
@@ -305,6 +410,23 @@ class ExerciseWeighting(Base):
     course_exercise = relationship("CourseExercise")
 
 
+class StudentCourseProgress(Base):
+    """
+    Progreso materializado de un estudiante en un curso.
+    Lo mantienen las rutas que cambian notas o pesos (ver services/progress_store);
+    weighted_score = weighted_sum / total_weight.
+    """
+    __tablename__ = "student_course_progress"
+
+    course_id = Column(Integer, ForeignKey("courses.id"), primary_key=True)
+    student_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    weighted_sum = Column(Float, nullable=False, default=0.0)  # Σ nota_normalizada(0-100) · peso
+    total_weight = Column(Integer, nullable=False, default=0)  # Σ pesos de ejercicios no borrados
+    evaluated_count = Column(Integer, nullable=False, default=0)
+    total_exercises = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=utcnow)
+
+
 class ExerciseFolder(Base):
     """
     Carpeta para organizar ejercicios del terapeuta.
@@ -1,15 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from google.oauth2 import id_token
-from google.auth.transport import requests
 import logging
 import re
 
-from ..database import get_db
+from ..database import get_async_db, get_db
 from .. import models
 from ..deps import create_access_token, hash_password, verify_password
 from .. import schemas
 from ..config import settings
+from ..services import google_jwks, password_pool, user_cache
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -25,25 +26,16 @@ FULL_NAME_ALLOWED_REGEX = re.compile(r"^[A-Za-zÁÉÍÓÚáéíóúÑñÜü\s]+$
 
 def verify_google_token(token: str) -> dict:
     """
-    Verifica y decodifica el id_token de Google.
-    Retorna el payload con información del usuario.
+    Verifica y decodifica el id_token de Google con las claves cacheadas
+    (sin ir a la red en cada login). Retorna el payload con información del usuario.
     """
     try:
         if not settings.google_client_id:
             logger.warning("GOOGLE_CLIENT_ID no configurado, saltando validación de token")
             return None
         
-        idinfo = id_token.verify_oauth2_token(
-            token, 
-            requests.Request(), 
-            settings.google_client_id
-        )
-        
-        if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-            raise ValueError('Token inválido')
-        
-        return idinfo
-    except Exception as e:
+        return google_jwks.verify_id_token(token, settings.google_client_id)
+    except google_jwks.GoogleTokenError as e:
         logger.error(f"Error verificando token de Google: {e}")
         raise HTTPException(status_code=401, detail="Token de Google inválido")
 
@@ -119,6 +111,7 @@ def login_google(
         if user.google_sub is None:
             user.google_sub = google_sub
             db.commit()
+            user_cache.invalidate_user(user.id)
             db.refresh(user)
             logger.info(f"Cuenta {user.id} enlazada con Google")
         elif user.google_sub != google_sub:
@@ -152,7 +145,7 @@ def login_google(
         
         # Si se proporciona contraseña, guardarla
         if payload.password:
-            user.password_hash = hash_password(payload.password)
+            user.password_hash = password_pool.run_blocking(hash_password, payload.password)
         
         db.add(user)
         db.commit()
@@ -171,9 +164,9 @@ def login_google(
 
 
 @router.post("/register", response_model=schemas.LoginResponse)
-def register(
+async def register(
     payload: schemas.RegisterRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     email = payload.email.strip()
     full_name = payload.full_name.strip()
@@ -211,31 +204,34 @@ def register(
             detail="El nombre solo puede contener letras y espacios",
         )
 
-    existing = db.query(models.User).filter(
-        models.User.email == email,
-        models.User.deleted_at.is_(None),
-    ).first()
+    existing = (await db.execute(
+        select(models.User.id).where(
+            models.User.email == email,
+            models.User.deleted_at.is_(None),
+        )
+    )).first()
     if existing:
         raise HTTPException(status_code=400, detail="El correo ya está registrado")
 
+    # bcrypt en el pool de procesos: no bloquea el event loop
     user = models.User(
         email=email,
         full_name=full_name,
         role=payload.role,
-        password_hash=hash_password(payload.password),
+        password_hash=await password_pool.run(hash_password, payload.password),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     token_str = create_access_token({"sub": str(user.id), "role": user.role.value})
     return schemas.LoginResponse(token=schemas.Token(access_token=token_str), user=user)
 
 
 @router.post("/login", response_model=schemas.LoginResponse)
-def login(
+async def login(
     payload: schemas.LoginRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     email = payload.email.strip()
 
@@ -251,14 +247,16 @@ def login(
             detail=f"La contraseña debe tener entre {PASSWORD_MIN_LENGTH} y {PASSWORD_MAX_LENGTH} caracteres",
         )
 
-    user = db.query(models.User).filter(
-        models.User.email == email,
-        models.User.deleted_at.is_(None),
-    ).first()
+    user = (await db.execute(
+        select(models.User).where(
+            models.User.email == email,
+            models.User.deleted_at.is_(None),
+        )
+    )).scalars().first()
     if not user or not user.password_hash:
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
 
-    if not verify_password(payload.password, user.password_hash):
+    if not await password_pool.run(verify_password, payload.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
 
     token_str = create_access_token({"sub": str(user.id), "role": user.role.value})
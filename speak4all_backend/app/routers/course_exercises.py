@@ -1,13 +1,16 @@
 # app/routers/course_exercises.py
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 from datetime import datetime, timezone
 
 from .. import models, schemas
-from ..database import get_db
+from ..database import get_async_db, get_db
 from ..deps import get_current_user
 from ..websocket_manager import manager
+from ..services import criteria_analytics, progress_store
 
 router = APIRouter()
 
@@ -33,7 +36,7 @@ def require_student(user: models.User):
 @router.post("/", response_model=schemas.CourseExerciseOut)
 async def publish_exercise_to_course(
     body: schemas.CourseExerciseCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
@@ -42,11 +45,13 @@ async def publish_exercise_to_course(
     require_therapist(current_user)
 
     # Verificar que el curso pertenece al terapeuta
-    course = db.query(models.Course).filter(
-        models.Course.id == body.course_id,
-        models.Course.therapist_id == current_user.id,
-        models.Course.is_active.is_(True)
-    ).first()
+    course = (await db.execute(
+        select(models.Course).where(
+            models.Course.id == body.course_id,
+            models.Course.therapist_id == current_user.id,
+            models.Course.is_active.is_(True)
+        )
+    )).scalars().first()
 
     if not course:
         raise HTTPException(
@@ -55,11 +60,13 @@ async def publish_exercise_to_course(
         )
 
     # Verificar que el ejercicio pertenece al terapeuta
-    exercise = db.query(models.Exercise).filter(
-        models.Exercise.id == body.exercise_id,
-        models.Exercise.therapist_id == current_user.id,
-        models.Exercise.is_deleted.is_(False)
-    ).first()
+    exercise = (await db.execute(
+        select(models.Exercise).where(
+            models.Exercise.id == body.exercise_id,
+            models.Exercise.therapist_id == current_user.id,
+            models.Exercise.is_deleted.is_(False)
+        )
+    )).scalars().first()
 
     if not exercise:
         raise HTTPException(
@@ -67,12 +74,20 @@ async def publish_exercise_to_course(
             detail="Ejercicio no encontrado o no pertenece al terapeuta."
         )
 
+    if exercise.audio_status != models.AudioStatus.READY:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El audio del ejercicio aún no está listo."
+        )
+
     # Verificar si el ejercicio ya está publicado en este curso
-    existing = db.query(models.CourseExercise).filter(
-        models.CourseExercise.course_id == course.id,
-        models.CourseExercise.exercise_id == exercise.id,
-        models.CourseExercise.is_deleted.is_(False)
-    ).first()
+    existing = (await db.execute(
+        select(models.CourseExercise.id).where(
+            models.CourseExercise.course_id == course.id,
+            models.CourseExercise.exercise_id == exercise.id,
+            models.CourseExercise.is_deleted.is_(False)
+        )
+    )).first()
 
     if existing:
         raise HTTPException(
@@ -89,8 +104,19 @@ async def publish_exercise_to_course(
     )
 
     db.add(course_ex)
-    db.commit()
-    db.refresh(course_ex)
+    await db.flush()
+    await db.run_sync(progress_store.refresh_course, course.id)
+    await db.commit()
+
+    # Recargar con ejercicio y categoría (en async no hay carga perezosa)
+    course_ex = (await db.execute(
+        select(models.CourseExercise).where(
+            models.CourseExercise.id == course_ex.id
+        ).options(
+            selectinload(models.CourseExercise.exercise),
+            selectinload(models.CourseExercise.category),
+        ).execution_options(populate_existing=True)
+    )).scalars().one()
     
     # Broadcast to connected clients
     course_ex_dict = schemas.CourseExerciseOut.model_validate(course_ex).model_dump(mode='json')
@@ -145,7 +171,7 @@ def list_course_exercises(
 @router.delete("/{course_exercise_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_published_exercise(
     course_exercise_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
@@ -154,10 +180,12 @@ async def delete_published_exercise(
     require_therapist(current_user)
 
     # Buscar el ejercicio publicado
-    course_exercise = db.query(models.CourseExercise).filter(
-        models.CourseExercise.id == course_exercise_id,
-        models.CourseExercise.is_deleted.is_(False)
-    ).first()
+    course_exercise = (await db.execute(
+        select(models.CourseExercise).where(
+            models.CourseExercise.id == course_exercise_id,
+            models.CourseExercise.is_deleted.is_(False)
+        ).options(selectinload(models.CourseExercise.exercise))
+    )).scalars().first()
 
     if not course_exercise:
         raise HTTPException(
@@ -166,10 +194,12 @@ async def delete_published_exercise(
         )
 
     # Verificar que el terapeuta es dueño del curso
-    course = db.query(models.Course).filter(
-        models.Course.id == course_exercise.course_id,
-        models.Course.therapist_id == current_user.id
-    ).first()
+    course = (await db.execute(
+        select(models.Course).where(
+            models.Course.id == course_exercise.course_id,
+            models.Course.therapist_id == current_user.id
+        )
+    )).scalars().first()
 
     if not course:
         raise HTTPException(
@@ -180,10 +210,13 @@ async def delete_published_exercise(
     # Marcar como eliminado
     course_exercise.is_deleted = True
     course_exercise.deleted_at = datetime.now(timezone.utc)
-    db.commit()
+    await db.flush()
+    await db.run_sync(progress_store.refresh_course, course.id)
+    await db.commit()
+    criteria_analytics.invalidate_course(course.id)
     
     # Broadcast to connected clients with extra info for notifications
-    exercise = db.query(models.Exercise).filter(models.Exercise.id == course_exercise.exercise_id).first()
+    exercise = course_exercise.exercise
     payload = {
         "course_exercise_id": course_exercise_id,
         "exercise_name": exercise.name if exercise else "Ejercicio",
@@ -1,3 +1,4 @@
+from anyio import from_thread
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func
@@ -8,7 +9,8 @@ from datetime import datetime, timezone
 from ..database import get_db
 from .. import models, schemas
 from ..deps import get_current_user
-from ..services import storage
+from ..services import progress_store, storage
+from ..websocket_manager import manager
 import secrets
 
 logger = logging.getLogger(__name__)
@@ -40,6 +42,8 @@ def create_course(
     db.add(course)
     db.commit()
     db.refresh(course)
+    # El socket /ws del terapeuta empieza a recibir eventos del curso nuevo
+    from_thread.run(manager.subscribe_user, current_user.id, course.id)
     logger.info(f"Curso creado: {course.name} (ID: {course.id}, código: {join_code}) por terapeuta {current_user.id}")
     return course
 
@@ -318,6 +322,7 @@ def decide_join_request(
         )
 
     now = datetime.now(timezone.utc)
+    joined = False
 
     if decision.accept:
         # Permitir aceptar pendientes o rechazadas
@@ -341,6 +346,9 @@ def decide_join_request(
                     student_id=req.student_id,
                 )
                 db.add(cs)
+                # Fila de progreso nueva (o recalculada si el estudiante vuelve al curso)
+                progress_store.refresh_student(db, course.id, req.student_id)
+                joined = True
     else:
         # Rechazar solo si no estaba aceptada
         if req.status == models.JoinRequestStatus.ACCEPTED:
@@ -355,6 +363,9 @@ def decide_join_request(
     db.commit()
     db.refresh(req)
 
+    if joined:
+        from_thread.run(manager.subscribe_user, req.student_id, course.id)
+
     student = db.query(models.User).filter(models.User.id == req.student_id).first()
     avatar_url = None
     try:
@@ -488,7 +499,9 @@ def remove_student_from_course(
 
     cs.is_active = False
     cs.deleted_at = datetime.now(timezone.utc)
+    progress_store.forget_student(db, course.id, cs.student_id)
     db.commit()
+    from_thread.run(manager.unsubscribe_user, cs.student_id, course.id)
     return
 
 
@@ -529,4 +542,5 @@ def delete_course(
     }, synchronize_session=False)
 
     db.commit()
+    from_thread.run(manager.close_course, course_id)
     return
\ No newline at end of file
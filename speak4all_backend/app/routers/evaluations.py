@@ -1,11 +1,15 @@
 from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import and_, insert, select
 
-from ..database import get_db
+from ..database import get_async_db, get_db
 from .. import models, schemas
+from ..config import settings
 from ..deps import get_current_user
+from ..services import criteria_analytics, progress_store
+from ..websocket_manager import manager
 
 router = APIRouter(prefix="/evaluations", tags=["evaluations"])
 
@@ -42,79 +46,85 @@ def therapist_can_access_submission(
     return sub
 
 
-# ==== CREAR EVALUACIÓN ====
+def load_rubric_trees(db: Session, rubric_ids) -> dict[int, models.RubricTemplate]:
+    """Carga rúbricas con sus criterios y niveles en una sola consulta."""
+    rubrics = db.query(models.RubricTemplate).filter(
+        models.RubricTemplate.id.in_(set(rubric_ids)),
+    ).options(
+        joinedload(models.RubricTemplate.criteria).joinedload(models.RubricCriteria.levels)
+    ).all()
+    return {rubric.id: rubric for rubric in rubrics}
 
-@router.post("/", response_model=schemas.EvaluationOut)
-def create_evaluation(
-    body: schemas.EvaluationCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
-):
-    """Crea una evaluación para una entrega usando la rúbrica"""
-    require_therapist(current_user)
-    
-    # Verificar que la entrega existe y el terapeuta puede acceder
-    sub = therapist_can_access_submission(db, current_user.id, body.submission_id)
-    
-    # Verificar que la rúbrica existe y es la correcta
-    rubric = db.query(models.RubricTemplate).filter(
-        models.RubricTemplate.id == body.rubric_template_id,
-        models.RubricTemplate.is_deleted.is_(False),
-    ).first()
-    
-    if not rubric:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Rúbrica no encontrada."
-        )
-    
-    # Calcular puntuación total
+
+def score_against_rubric(
+    rubric: models.RubricTemplate,
+    criterion_scores: list[schemas.EvaluationCriterionScoreCreate],
+) -> int:
+    """
+    Valida los puntajes contra el árbol de la rúbrica ya cargado (sin consultas)
+    y devuelve la puntuación total.
+    """
+    criteria_by_id = {c.id: c for c in rubric.criteria if not c.is_deleted}
     total_score = 0
-    criterion_scores = []
-    
-    for score_data in body.criterion_scores:
+    for score_data in criterion_scores:
         # Verificar que el criterio existe en la rúbrica
-        criteria = db.query(models.RubricCriteria).filter(
-            models.RubricCriteria.id == score_data.rubric_criteria_id,
-            models.RubricCriteria.rubric_template_id == rubric.id,
-            models.RubricCriteria.is_deleted.is_(False),
-        ).first()
-        
+        criteria = criteria_by_id.get(score_data.rubric_criteria_id)
         if not criteria:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Criterio {score_data.rubric_criteria_id} no existe en la rúbrica."
             )
-        
+
         # Verificar que el nivel existe en el criterio
-        level = db.query(models.RubricLevel).filter(
-            models.RubricLevel.id == score_data.rubric_level_id,
-            models.RubricLevel.rubric_criteria_id == score_data.rubric_criteria_id,
-            models.RubricLevel.is_deleted.is_(False),
-        ).first()
-        
-        if not level:
+        if not any(l.id == score_data.rubric_level_id and not l.is_deleted for l in criteria.levels):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Nivel {score_data.rubric_level_id} no existe en el criterio."
             )
-        
+
         # Validar que los puntos no excedan el máximo
         if score_data.points_awarded > criteria.max_points:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Los puntos {score_data.points_awarded} exceden el máximo de {criteria.max_points}."
             )
-        
+
         total_score += score_data.points_awarded
-        criterion_scores.append(score_data)
-    
+
     # Validar que la puntuación total no exceede el máximo de la rúbrica
     if total_score > rubric.max_score:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"La puntuación total {total_score} excede el máximo de {rubric.max_score}."
         )
+    return total_score
+
+
+# ==== CREAR EVALUACIÓN ====
+
+@router.post("/", response_model=schemas.EvaluationOut)
+def create_evaluation(
+    body: schemas.EvaluationCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Crea una evaluación para una entrega usando la rúbrica"""
+    require_therapist(current_user)
+    
+    # Verificar que la entrega existe y el terapeuta puede acceder
+    sub = therapist_can_access_submission(db, current_user.id, body.submission_id)
+    
+    # Verificar que la rúbrica existe y es la correcta
+    rubric = load_rubric_trees(db, [body.rubric_template_id]).get(body.rubric_template_id)
+    
+    if not rubric or rubric.is_deleted:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Rúbrica no encontrada."
+        )
+    
+    # Calcular puntuación total
+    total_score = score_against_rubric(rubric, body.criterion_scores)
     
     # Crear evaluación
     evaluation = models.Evaluation(
@@ -131,7 +141,7 @@ def create_evaluation(
     db.flush()
     
     # Crear puntajes por criterio
-    for score_data in criterion_scores:
+    for score_data in body.criterion_scores:
         crit_score = models.EvaluationCriterionScore(
             evaluation_id=evaluation.id,
             rubric_criteria_id=score_data.rubric_criteria_id,
@@ -142,11 +152,178 @@ def create_evaluation(
         )
         db.add(crit_score)
     
+    course_id = progress_store.refresh_for_submission(db, sub.id)
     db.commit()
+    criteria_analytics.invalidate_course(course_id)
     db.refresh(evaluation, ["criterion_scores"])
     return evaluation
 
 
+# ==== CREAR EVALUACIONES EN BLOQUE ====
+
+def insert_evaluations_bulk(
+    db: Session,
+    therapist_id: int,
+    items: list[schemas.EvaluationCreate],
+) -> tuple[dict[int, int], dict[int, list[dict]]]:
+    """
+    Valida e inserta un bloque de evaluaciones (sin commit) y recalcula el
+    progreso de los cursos afectados. Devuelve ({submission_id: evaluation_id},
+    {course_id: [evaluaciones creadas]}).
+    """
+    submission_ids = [item.submission_id for item in items]
+    if len(set(submission_ids)) != len(submission_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Hay entregas repetidas en la petición."
+        )
+
+    # Entregas accesibles por el terapeuta, con su curso, en una consulta
+    submissions = {
+        row.id: row
+        for row in db.execute(
+            select(
+                models.Submission.id,
+                models.Submission.student_id,
+                models.Submission.course_exercise_id,
+                models.CourseExercise.course_id,
+            ).join(
+                models.CourseExercise, models.Submission.course_exercise_id == models.CourseExercise.id
+            ).join(
+                models.Course, models.CourseExercise.course_id == models.Course.id
+            ).where(
+                models.Submission.id.in_(submission_ids),
+                models.Course.therapist_id == therapist_id,
+            )
+        )
+    }
+    missing = [sid for sid in submission_ids if sid not in submissions]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Entregas no encontradas o sin permiso: {missing}"
+        )
+
+    already_evaluated = db.execute(
+        select(models.Evaluation.submission_id).where(models.Evaluation.submission_id.in_(submission_ids))
+    ).scalars().all()
+    if already_evaluated:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Estas entregas ya tienen evaluación: {sorted(already_evaluated)}"
+        )
+
+    rubrics = load_rubric_trees(db, [item.rubric_template_id for item in items])
+
+    totals = []
+    for item in items:
+        sub = submissions[item.submission_id]
+        rubric = rubrics.get(item.rubric_template_id)
+        if not rubric or rubric.is_deleted or rubric.course_exercise_id != sub.course_exercise_id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Entrega {item.submission_id}: rúbrica no encontrada."
+            )
+        try:
+            totals.append(score_against_rubric(rubric, item.criterion_scores))
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"Entrega {item.submission_id}: {e.detail}")
+
+    now = datetime.now(timezone.utc)
+    inserted = db.execute(
+        insert(models.Evaluation).returning(
+            models.Evaluation.id, models.Evaluation.submission_id, sort_by_parameter_order=True
+        ),
+        [
+            {
+                "submission_id": item.submission_id,
+                "rubric_template_id": item.rubric_template_id,
+                "therapist_id": therapist_id,
+                "total_score": total,
+                "notes": item.notes,
+                "is_locked": True,  # Bloquear inmediatamente después de crear
+                "is_deleted": False,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for item, total in zip(items, totals)
+        ],
+    ).all()
+    evaluation_ids = {row.submission_id: row.id for row in inserted}
+
+    score_rows = [
+        {
+            "evaluation_id": evaluation_ids[item.submission_id],
+            "rubric_criteria_id": score_data.rubric_criteria_id,
+            "rubric_level_id": score_data.rubric_level_id,
+            "points_awarded": score_data.points_awarded,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for item in items
+        for score_data in item.criterion_scores
+    ]
+    if score_rows:
+        db.execute(insert(models.EvaluationCriterionScore), score_rows)
+
+    # Un evento y un recálculo por curso en lugar de uno por entrega
+    created_by_course: dict[int, list[dict]] = {}
+    for item, total in zip(items, totals):
+        sub = submissions[item.submission_id]
+        created_by_course.setdefault(sub.course_id, []).append({
+            "evaluation_id": evaluation_ids[sub.id],
+            "submission_id": sub.id,
+            "student_id": sub.student_id,
+            "course_exercise_id": sub.course_exercise_id,
+            "total_score": total,
+        })
+
+    for course_id in sorted(created_by_course):
+        progress_store.refresh_course(db, course_id)
+    return evaluation_ids, created_by_course
+
+
+@router.post("/bulk", response_model=list[schemas.EvaluationOut], status_code=status.HTTP_201_CREATED)
+async def create_evaluations_bulk(
+    body: schemas.EvaluationBulkCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Califica varias entregas en una sola petición.
+    Todas las evaluaciones se validan antes de insertar nada (todas o ninguna);
+    las rúbricas se cargan una vez y los puntajes se validan en memoria.
+    """
+    require_therapist(current_user)
+
+    if len(body.evaluations) > settings.evaluation_bulk_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {settings.evaluation_bulk_max_items} evaluaciones por petición."
+        )
+
+    evaluation_ids, created_by_course = await db.run_sync(
+        insert_evaluations_bulk, current_user.id, body.evaluations
+    )
+    await db.commit()
+
+    for course_id, created in created_by_course.items():
+        criteria_analytics.invalidate_course(course_id)
+        await manager.broadcast_evaluations_created(course_id, {
+            "course_id": course_id,
+            "count": len(created),
+            "evaluations": created,
+        })
+
+    return (await db.execute(
+        select(models.Evaluation).where(
+            models.Evaluation.id.in_(evaluation_ids.values())
+        ).options(
+            selectinload(models.Evaluation.criterion_scores)
+        ).order_by(models.Evaluation.id)
+    )).scalars().all()
+
+
 # ==== OBTENER EVALUACIÓN ====
 
 @router.get("/{evaluation_id}", response_model=schemas.EvaluationOut)
@@ -264,53 +441,24 @@ def update_evaluation(
         )
     
     # Si se proporcionan nuevas puntuaciones
+    course_id = None
     if body.criterion_scores:
+        rubric = load_rubric_trees(db, [evaluation.rubric_template_id]).get(evaluation.rubric_template_id)
+        if not rubric:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Rúbrica no encontrada."
+            )
+
         # Eliminar puntajes antiguos
         db.query(models.EvaluationCriterionScore).filter(
             models.EvaluationCriterionScore.evaluation_id == evaluation_id
         ).delete()
         
         # Calcular nuevas puntuaciones
-        total_score = 0
-        rubric = db.query(models.RubricTemplate).filter(
-            models.RubricTemplate.id == evaluation.rubric_template_id
-        ).first()
+        total_score = score_against_rubric(rubric, body.criterion_scores)
         
         for score_data in body.criterion_scores:
-            # Verificar criterio
-            criteria = db.query(models.RubricCriteria).filter(
-                models.RubricCriteria.id == score_data.rubric_criteria_id,
-                models.RubricCriteria.rubric_template_id == rubric.id,
-                models.RubricCriteria.is_deleted.is_(False),
-            ).first()
-            
-            if not criteria:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Criterio {score_data.rubric_criteria_id} no existe."
-                )
-            
-            # Verificar nivel
-            level = db.query(models.RubricLevel).filter(
-                models.RubricLevel.id == score_data.rubric_level_id,
-                models.RubricLevel.rubric_criteria_id == score_data.rubric_criteria_id,
-                models.RubricLevel.is_deleted.is_(False),
-            ).first()
-            
-            if not level:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Nivel {score_data.rubric_level_id} no existe."
-                )
-            
-            if score_data.points_awarded > criteria.max_points:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Los puntos exceden el máximo permitido."
-                )
-            
-            total_score += score_data.points_awarded
-            
             crit_score = models.EvaluationCriterionScore(
                 evaluation_id=evaluation_id,
                 rubric_criteria_id=score_data.rubric_criteria_id,
@@ -321,19 +469,15 @@ def update_evaluation(
             )
             db.add(crit_score)
         
-        if total_score > rubric.max_score:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"La puntuación total excede el máximo permitido."
-            )
-        
         evaluation.total_score = total_score
+        course_id = progress_store.refresh_for_submission(db, evaluation.submission_id)
     
     if body.notes is not None:
         evaluation.notes = body.notes
     
     evaluation.updated_at = datetime.now(timezone.utc)
     db.commit()
+    criteria_analytics.invalidate_course(course_id)
     db.refresh(evaluation, ["criterion_scores"])
     return evaluation
 
@@ -368,7 +512,9 @@ def delete_evaluation(
     
     evaluation.is_deleted = True
     evaluation.updated_at = datetime.now(timezone.utc)
+    course_id = progress_store.refresh_for_submission(db, evaluation.submission_id)
     db.commit()
+    criteria_analytics.invalidate_course(course_id)
     return {"detail": "Evaluación eliminada."}
 
 
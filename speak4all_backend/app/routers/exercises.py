@@ -1,7 +1,9 @@
 # app/routers/exercises.py
 from datetime import datetime, timezone
-from pathlib import Path
 import io
+import json
+import logging
+import time
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import StreamingResponse
@@ -11,11 +13,13 @@ from ..database import get_db
 from .. import models, schemas
 from ..deps import get_current_user
 from ..services import ai_exercises  # 👈 hay que exponer el módulo en __init__.py de services
+from ..services import audio_jobs, criteria_analytics, exercise_batches, progress_store
 from ..services.storage import generate_signed_url, download_blob
 from ..config import settings
 from ..services.pdf_generator import generate_exercise_pdf, upload_exercise_pdf_to_storage
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 def require_therapist(user: models.User):
@@ -41,22 +45,11 @@ def generate_exercise_preview(
       - text: limpio, sin [REP], para mostrar en pantalla.
     """
     require_therapist(current_user)
+    profile_description = _get_profile_description(db, current_user, body.profile_id)
 
-    profile_description = None
-    if body.profile_id is not None:
-        profile = db.query(models.Profile).filter(
-            models.Profile.id == body.profile_id,
-            models.Profile.therapist_id == current_user.id,
-            models.Profile.is_deleted.is_(False),
-        ).first()
-        if not profile:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Perfil no encontrado"
-            )
-        profile_description = profile.description
-
-    marked = ai_exercises.generate_marked_text_from_prompt(body.prompt, profile_description)
+    marked = ai_exercises.generate_marked_text_from_prompt(
+        body.prompt, profile_description, regenerate=body.regenerate
+    )
     clean = ai_exercises.strip_rep_tags(marked)
 
     return schemas.ExerciseGenerateResponse(
@@ -65,6 +58,93 @@ def generate_exercise_preview(
     )
 
 
+def _get_profile_description(db: Session, user: models.User, profile_id: int | None) -> str | None:
+    if profile_id is None:
+        return None
+    profile = db.query(models.Profile).filter(
+        models.Profile.id == profile_id,
+        models.Profile.therapist_id == user.id,
+        models.Profile.is_deleted.is_(False),
+    ).first()
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Perfil no encontrado"
+        )
+    return profile.description
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/preview/stream")
+def stream_exercise_preview(
+    body: schemas.ExerciseGenerateRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Versión en streaming (Server-Sent Events) de /preview.
+    Eventos:
+      - delta: {"text": fragmento} según llega del modelo
+      - done:  {"text": limpio, "marked_text": con [REP]} al terminar
+      - error: {"detail": ...} si la generación falla a mitad
+    La cabecera X-Time-To-First-Token-Ms indica cuánto tardó el primer fragmento.
+    """
+    require_therapist(current_user)
+    profile_description = _get_profile_description(db, current_user, body.profile_id)
+
+    started = time.perf_counter()
+    deltas = ai_exercises.stream_marked_text_from_prompt(
+        body.prompt, profile_description, regenerate=body.regenerate
+    )
+
+    # Esperamos al primer fragmento antes de responder para poder informar el TTFT en cabecera
+    try:
+        first = next(deltas, "")
+    except Exception as e:
+        logger.error(f"Error iniciando la generación en streaming: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="No se pudo generar el ejercicio con IA."
+        )
+    ttft_ms = (time.perf_counter() - started) * 1000
+
+    def event_stream():
+        parts = [first]
+        try:
+            if first:
+                yield _sse("delta", {"text": first})
+            for delta in deltas:
+                parts.append(delta)
+                yield _sse("delta", {"text": delta})
+        except Exception as e:
+            logger.error(f"Error durante la generación en streaming: {e}", exc_info=True)
+            yield _sse("error", {"detail": "La generación se interrumpió."})
+            return
+        finally:
+            deltas.close()
+
+        marked = "".join(parts).strip()
+        yield _sse("done", {
+            "text": ai_exercises.strip_rep_tags(marked),
+            "marked_text": marked,
+        })
+        logger.info(f"Preview en streaming: TTFT {ttft_ms:.0f}ms, total {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Time-To-First-Token-Ms": f"{ttft_ms:.0f}",
+            "Server-Timing": f"ttft;dur={ttft_ms:.1f}",
+        },
+    )
+
+
 # ==== 2) CREAR EJERCICIO (texto + audio) ====
 
 @router.post("/", response_model=schemas.ExerciseOut, status_code=status.HTTP_201_CREATED)
@@ -75,8 +155,9 @@ def create_exercise(
 ):
     """
     Crea un ejercicio persistente:
-      - Guarda en BD: name, prompt, texto limpio, audio_path, therapist_id.
-      - Genera el audio usando marked_text (o text si no viene marcado).
+      - Guarda en BD: name, prompt, texto limpio, therapist_id.
+      - Encola la generación del audio usando marked_text (o text si no viene marcado).
+        Responde de inmediato con audio_status=PENDING.
     """
     require_therapist(current_user)
 
@@ -96,11 +177,7 @@ def create_exercise(
     # 1) elegir texto marcado para TTS
     marked = body.marked_text or body.text
 
-    # 2) generar audio; lo guardamos relativo a la raíz del proyecto
-    base_dir = Path.cwd()
-    audio_rel_path = ai_exercises.build_audio_from_marked_text(marked, base_dir=base_dir)
-
-    # 3) texto limpio (sin [REP]) por si el front envió marked_text diferente
+    # 2) texto limpio (sin [REP]) por si el front envió marked_text diferente
     clean_text = ai_exercises.strip_rep_tags(marked)
 
     exercise = models.Exercise(
@@ -108,17 +185,155 @@ def create_exercise(
         name=body.name,
         prompt=body.prompt,
         text=clean_text,
-        audio_path=str(audio_rel_path),
+        marked_text=marked,
+        audio_path=None,
         folder_id=body.folder_id,
     )
-
     db.add(exercise)
+
+    # 3) el audio se genera en segundo plano (audio_jobs); se avisa por WebSocket
+    audio_jobs.enqueue_audio_build(db, exercise, marked)
+
     db.commit()
     db.refresh(exercise)
 
     return exercise
 
 
+# ==== 2b) ESTADO DEL AUDIO DE UN EJERCICIO ====
+
+@router.get("/{exercise_id}/audio-status", response_model=schemas.ExerciseAudioStatusOut)
+def get_exercise_audio_status(
+    exercise_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Devuelve el estado de generación del audio (PENDING, READY o FAILED).
+    Pensado para sondeo desde el front mientras llega el evento exercise_audio_ready.
+    """
+    require_therapist(current_user)
+
+    exercise = db.query(models.Exercise).filter(
+        models.Exercise.id == exercise_id,
+        models.Exercise.therapist_id == current_user.id,
+        models.Exercise.is_deleted.is_(False),
+    ).first()
+
+    if not exercise:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ejercicio no encontrado."
+        )
+
+    error = None
+    if exercise.audio_status == models.AudioStatus.FAILED:
+        last_job = db.query(models.AudioBuildJob).filter(
+            models.AudioBuildJob.exercise_id == exercise.id,
+        ).order_by(models.AudioBuildJob.created_at.desc()).first()
+        error = last_job.error if last_job else None
+
+    return schemas.ExerciseAudioStatusOut(
+        exercise_id=exercise.id,
+        audio_status=exercise.audio_status,
+        audio_path=exercise.audio_path,
+        error=error,
+    )
+
+
+# ==== 2c) CREAR EJERCICIOS POR LOTES ====
+
+@router.post("/batch", response_model=schemas.ExerciseBatchOut, status_code=status.HTTP_202_ACCEPTED)
+def create_exercise_batch(
+    body: schemas.ExerciseBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Genera varios ejercicios (guion con IA + audio) en segundo plano.
+    Responde de inmediato con el batch_id; los elementos los ejecutan los
+    workers de audio. El progreso se consulta en GET /exercises/batch/{batch_id}
+    y se notifica por WebSocket (evento exercise_batch_progress). Los
+    ejercicios se guardan juntos al final.
+    """
+    require_therapist(current_user)
+
+    prompts = [p.strip() for p in body.prompts]
+    if not prompts or any(not p for p in prompts):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Debes enviar al menos un prompt y ninguno puede estar vacío."
+        )
+    if len(prompts) > settings.exercise_batch_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {settings.exercise_batch_max_items} ejercicios por lote."
+        )
+    for field, values in (("profile_ids", body.profile_ids), ("names", body.names)):
+        if values is not None and len(values) != len(prompts):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{field} debe tener un elemento por prompt."
+            )
+
+    profile_ids = body.profile_ids or [None] * len(prompts)
+    wanted = {pid for pid in profile_ids if pid is not None}
+    if wanted:
+        found = db.query(models.Profile.id).filter(
+            models.Profile.id.in_(wanted),
+            models.Profile.therapist_id == current_user.id,
+            models.Profile.is_deleted.is_(False),
+        ).all()
+        if len(found) != len(wanted):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Perfil no encontrado"
+            )
+
+    if body.folder_id is not None:
+        folder = db.query(models.ExerciseFolder).filter(
+            models.ExerciseFolder.id == body.folder_id,
+            models.ExerciseFolder.therapist_id == current_user.id,
+            models.ExerciseFolder.is_deleted.is_(False),
+        ).first()
+        if not folder:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Carpeta no encontrada."
+            )
+
+    names = body.names or [None] * len(prompts)
+    items = [
+        {
+            "name": (names[i] or "").strip() or prompt[:80],
+            "prompt": prompt,
+            "profile_id": profile_ids[i],
+        }
+        for i, prompt in enumerate(prompts)
+    ]
+    batch = exercise_batches.create_batch(db, current_user.id, body.folder_id, items)
+    db.commit()
+    return exercise_batches.batch_to_dict(batch)
+
+
+@router.get("/batch/{batch_id}", response_model=schemas.ExerciseBatchOut)
+def get_exercise_batch(
+    batch_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Estado y progreso por elemento de un lote."""
+    require_therapist(current_user)
+
+    batch = exercise_batches.get_batch(db, batch_id)
+    if not batch or batch.therapist_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Lote no encontrado"
+        )
+    return exercise_batches.batch_to_dict(batch)
+
+
 # ==== 3) LISTAR EJERCICIOS DEL TERAPEUTA ====
 
 @router.get("/mine", response_model=schemas.PaginatedResponse[schemas.ExerciseOut])
@@ -170,6 +385,59 @@ def list_my_exercises(
     )
 
 
+# ==== 4) EDITAR UN EJERCICIO ====
+
+@router.put("/{exercise_id}", response_model=schemas.ExerciseOut)
+def update_exercise(
+    exercise_id: int,
+    body: schemas.ExerciseUpdateRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Edita nombre y/o guion de un ejercicio.
+    Si el guion cambia, el audio se vuelve a generar en segundo plano
+    re-sintetizando solo los segmentos modificados (manifiesto de segmentos).
+    """
+    require_therapist(current_user)
+
+    exercise = db.query(models.Exercise).filter(
+        models.Exercise.id == exercise_id,
+        models.Exercise.therapist_id == current_user.id,
+        models.Exercise.is_deleted.is_(False),
+    ).first()
+
+    if not exercise:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ejercicio no encontrado o ya está eliminado."
+        )
+
+    if body.name is not None:
+        if not body.name.strip():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El nombre es obligatorio."
+            )
+        exercise.name = body.name.strip()
+
+    marked = body.marked_text or body.text
+    if marked is not None and marked != exercise.marked_text:
+        if not marked.strip():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El texto del ejercicio no puede estar vacío."
+            )
+        exercise.marked_text = marked
+        exercise.text = ai_exercises.strip_rep_tags(marked)
+        audio_jobs.enqueue_audio_build(db, exercise, marked)
+
+    exercise.updated_at = datetime.now(timezone.utc)
+    db.commit()
+    db.refresh(exercise)
+    return exercise
+
+
 # ==== 5) ACTUALIZAR CARPETA DE UN EJERCICIO ====
 
 @router.patch("/{exercise_id}/folder", response_model=schemas.ExerciseOut)
@@ -249,6 +517,12 @@ def delete_exercise(
     exercise.deleted_at = datetime.now(timezone.utc)
 
     # Marcar todas las publicaciones de este ejercicio como eliminadas
+    affected_courses = {
+        course_id for (course_id,) in db.query(models.CourseExercise.course_id).filter(
+            models.CourseExercise.exercise_id == exercise_id,
+            models.CourseExercise.is_deleted.is_(False),
+        ).distinct()
+    }
     db.query(models.CourseExercise).filter(
         models.CourseExercise.exercise_id == exercise_id,
         models.CourseExercise.is_deleted.is_(False),
@@ -257,7 +531,12 @@ def delete_exercise(
         "deleted_at": datetime.now(timezone.utc)
     }, synchronize_session=False)
 
+    for course_id in sorted(affected_courses):
+        progress_store.refresh_course(db, course_id)
+
     db.commit()
+    for course_id in affected_courses:
+        criteria_analytics.invalidate_course(course_id)
     return
 
 
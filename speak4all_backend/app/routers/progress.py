@@ -1,16 +1,19 @@
 from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, and_
 
-from ..database import get_db
+from ..database import SessionLocal, get_db
 from .. import models, schemas
-from ..deps import get_current_user
+from ..deps import TokenClaims, get_current_claims, get_current_user
+from ..services import criteria_analytics, gradebook_export, progress_engine, progress_store
 
 router = APIRouter(prefix="/progress", tags=["progress"])
 
 
-def require_therapist(user: models.User):
+def require_therapist(user: models.User | TokenClaims):
     if user.role != models.UserRole.THERAPIST:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -51,6 +54,7 @@ def set_exercise_weighting(
     if existing:
         existing.weight = body.weight
         existing.updated_at = datetime.now(timezone.utc)
+        progress_store.refresh_course(db, ce.course_id)
         db.commit()
         db.refresh(existing)
         return existing
@@ -63,6 +67,7 @@ def set_exercise_weighting(
         updated_at=datetime.now(timezone.utc),
     )
     db.add(weighting)
+    progress_store.refresh_course(db, ce.course_id)
     db.commit()
     db.refresh(weighting)
     return weighting
@@ -74,7 +79,7 @@ def set_exercise_weighting(
 def get_exercise_weighting(
     course_exercise_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_current_claims),
 ):
     """Obtiene el peso de un ejercicio"""
     require_therapist(current_user)
@@ -112,7 +117,7 @@ def get_exercise_weighting(
 def get_course_weightings(
     course_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_current_claims),
 ):
     """Obtiene todas las ponderaciones de un curso"""
     require_therapist(current_user)
@@ -141,24 +146,16 @@ def get_course_weightings(
 
 # ==== CALCULATE STUDENT PROGRESS ====
 
-@router.get("/student/{student_id}/course/{course_id}", 
-            response_model=schemas.StudentProgressWithEvaluation)
-def get_student_progress(
+def get_student_for_progress(
+    db: Session,
+    current_user: models.User | TokenClaims,
     student_id: int,
     course_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
-):
+) -> models.User:
     """
-    Calcula el progreso general ponderado de un estudiante en un curso.
-    
-    Fórmula:
-    Progreso = (Suma de (Calificación_evaluación * Peso_ejercicio)) / (Suma de Pesos)
-    
-    Solo terapeutas pueden ver el progreso de todos los estudiantes.
-    Los estudiantes solo pueden ver su propio progreso.
+    Verifica el acceso al progreso de un estudiante y lo devuelve.
+    Terapeutas: solo en sus cursos. Estudiantes: solo su propio progreso.
     """
-    # Verificar acceso
     if current_user.role == models.UserRole.THERAPIST:
         # Verificar que el curso pertenece al terapeuta
         course = db.query(models.Course).filter(
@@ -179,7 +176,6 @@ def get_student_progress(
                 detail="No puedes ver el progreso de otros estudiantes."
             )
     
-    # Obtener datos del estudiante
     student = db.query(models.User).filter(
         models.User.id == student_id
     ).first()
@@ -189,14 +185,31 @@ def get_student_progress(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Estudiante no encontrado."
         )
+    return student
+
+@router.get("/student/{student_id}/course/{course_id}", 
+            response_model=schemas.StudentProgressWithEvaluation)
+def get_student_progress(
+    student_id: int,
+    course_id: int,
+    db: Session = Depends(get_db),
+    current_user: TokenClaims = Depends(get_current_claims),
+):
+    """
+    Calcula el progreso general ponderado de un estudiante en un curso.
     
-    # Obtener ejercicios del curso
-    course_exercises = db.query(models.CourseExercise).filter(
-        models.CourseExercise.course_id == course_id,
-        models.CourseExercise.is_deleted.is_(False),
-    ).all()
+    Fórmula:
+    Progreso = (Suma de (Calificación_evaluación * Peso_ejercicio)) / (Suma de Pesos)
+    
+    Solo terapeutas pueden ver el progreso de todos los estudiantes.
+    Los estudiantes solo pueden ver su propio progreso.
+    """
+    student = get_student_for_progress(db, current_user, student_id, course_id)
     
-    if not course_exercises:
+    # Pesos, evaluaciones, máximos de rúbrica y categorías en una sola consulta
+    progress = progress_engine.student_progress(db, course_id, student_id)
+
+    if progress["total_exercises"] == 0:
         return schemas.StudentProgressWithEvaluation(
             student_id=student_id,
             full_name=student.full_name,
@@ -207,84 +220,12 @@ def get_student_progress(
             evaluated_exercises=0,
             evaluations_summary="Sin ejercicios en el curso."
         )
-    
-    total_weight = 0
-    weighted_score_sum = 0
-    evaluated_count = 0
-    exercise_scores: list[schemas.ExerciseScoreProgress] = []
-    
-    for ce in course_exercises:
-        # Obtener peso del ejercicio (por defecto 1)
-        weighting = db.query(models.ExerciseWeighting).filter(
-            models.ExerciseWeighting.course_exercise_id == ce.id
-        ).first()
-        
-        weight = weighting.weight if weighting else 1
-        total_weight += weight
-        
-        # Obtener evaluación del estudiante para este ejercicio
-        evaluation = db.query(models.Evaluation).join(
-            models.Submission,
-            models.Evaluation.submission_id == models.Submission.id
-        ).filter(
-            models.Submission.course_exercise_id == ce.id,
-            models.Submission.student_id == student_id,
-            models.Evaluation.is_deleted.is_(False),
-        ).first()
 
-        exercise_name = None
-        if hasattr(ce, "exercise") and ce.exercise:
-            exercise_name = ce.exercise.name
-        if not exercise_name:
-            exercise_obj = db.query(models.Exercise).filter(
-                models.Exercise.id == ce.exercise_id
-            ).first()
-            exercise_name = exercise_obj.name if exercise_obj else f"Ejercicio {ce.id}"
-
-        # Obtener información de categoría
-        category_id = None
-        category_name = None
-        category_color = None
-        if ce.category_id:
-            category = db.query(models.ExerciseCategory).filter(
-                models.ExerciseCategory.id == ce.category_id
-            ).first()
-            if category:
-                category_id = category.id
-                category_name = category.name
-                category_color = category.color
-
-        exercise_entry = schemas.ExerciseScoreProgress(
-            course_exercise_id=ce.id,
-            exercise_name=exercise_name,
-            weight=weight,
-            category_id=category_id,
-            category_name=category_name,
-            category_color=category_color,
-        )
-        
-        if evaluation:
-            evaluated_count += 1
-            # Normalizar la puntuación a una escala de 0-100
-            rubric = db.query(models.RubricTemplate).filter(
-                models.RubricTemplate.id == evaluation.rubric_template_id
-            ).first()
-            
-            if rubric and rubric.max_score > 0:
-                normalized_score = (evaluation.total_score / rubric.max_score) * 100
-                weighted_score_sum += normalized_score * weight
-                exercise_entry.score = evaluation.total_score
-                exercise_entry.max_score = rubric.max_score
-                exercise_entry.evaluated = True
-            else:
-                exercise_entry.evaluated = True
+    weighted_score = progress["weighted_score"]
+    evaluated_count = progress["evaluated_exercises"]
+    total_exercises = progress["total_exercises"]
 
-        exercise_scores.append(exercise_entry)
-    
-    # Calcular promedio ponderado
-    weighted_score = (weighted_score_sum / total_weight) if total_weight > 0 else 0.0
-    
-    summary = f"Evaluado en {evaluated_count}/{len(course_exercises)} ejercicios. Promedio ponderado: {weighted_score:.1f}%"
+    summary = f"Evaluado en {evaluated_count}/{total_exercises} ejercicios. Promedio ponderado: {weighted_score:.1f}%"
     
     return schemas.StudentProgressWithEvaluation(
         student_id=student_id,
@@ -292,10 +233,10 @@ def get_student_progress(
         email=student.email,
         avatar_path=student.avatar_path,
         weighted_score=round(weighted_score, 2),
-        total_exercises=len(course_exercises),
+        total_exercises=total_exercises,
         evaluated_exercises=evaluated_count,
         evaluations_summary=summary,
-        exercise_scores=exercise_scores,
+        exercise_scores=[schemas.ExerciseScoreProgress(**entry) for entry in progress["exercise_scores"]],
     )
 
 
@@ -305,7 +246,7 @@ def get_student_progress(
 def get_course_students_progress(
     course_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_current_claims),
 ):
     """
     Obtiene el progreso de todos los estudiantes en un curso.
@@ -325,68 +266,24 @@ def get_course_students_progress(
             detail="Curso no encontrado."
         )
     
-    # Obtener todos los estudiantes del curso
-    course_students = db.query(models.CourseStudent).filter(
-        models.CourseStudent.course_id == course_id,
-        models.CourseStudent.is_active.is_(True),
-    ).all()
-    
+    # Lectura de la tabla materializada
     progress_list = []
-    for cs in course_students:
-        # Calcular progreso para cada estudiante
-        student = db.query(models.User).filter(
-            models.User.id == cs.student_id
-        ).first()
-        
-        # Obtener ejercicios del curso
-        course_exercises = db.query(models.CourseExercise).filter(
-            models.CourseExercise.course_id == course_id,
-            models.CourseExercise.is_deleted.is_(False),
-        ).all()
-        
-        total_weight = 0
-        weighted_score_sum = 0
-        evaluated_count = 0
-        
-        for ce in course_exercises:
-            weighting = db.query(models.ExerciseWeighting).filter(
-                models.ExerciseWeighting.course_exercise_id == ce.id
-            ).first()
-            
-            weight = weighting.weight if weighting else 1
-            total_weight += weight
-            
-            evaluation = db.query(models.Evaluation).join(
-                models.Submission,
-                models.Evaluation.submission_id == models.Submission.id
-            ).filter(
-                models.Submission.course_exercise_id == ce.id,
-                models.Submission.student_id == cs.student_id,
-                models.Evaluation.is_deleted.is_(False),
-            ).first()
-            
-            if evaluation:
-                evaluated_count += 1
-                rubric = db.query(models.RubricTemplate).filter(
-                    models.RubricTemplate.id == evaluation.rubric_template_id
-                ).first()
-                
-                if rubric and rubric.max_score > 0:
-                    normalized_score = (evaluation.total_score / rubric.max_score) * 100
-                    weighted_score_sum += normalized_score * weight
-        
-        weighted_score = (weighted_score_sum / total_weight) if total_weight > 0 else 0.0
-        summary = f"Evaluado en {evaluated_count}/{len(course_exercises)} ejercicios. Promedio: {weighted_score:.1f}%"
+    for row, progress in progress_store.course_progress(db, course_id):
+        weighted_score = (progress.weighted_sum / progress.total_weight) if progress.total_weight > 0 else 0.0
+        summary = (
+            f"Evaluado en {progress.evaluated_count}/{progress.total_exercises} ejercicios. "
+            f"Promedio: {weighted_score:.1f}%"
+        )
         
         progress_list.append(
             schemas.StudentProgressWithEvaluation(
-                student_id=cs.student_id,
-                full_name=student.full_name,
-                email=student.email,
-                avatar_path=student.avatar_path,
+                student_id=row.id,
+                full_name=row.full_name,
+                email=row.email,
+                avatar_path=row.avatar_path,
                 weighted_score=round(weighted_score, 2),
-                total_exercises=len(course_exercises),
-                evaluated_exercises=evaluated_count,
+                total_exercises=progress.total_exercises,
+                evaluated_exercises=progress.evaluated_count,
                 evaluations_summary=summary
             )
         )
@@ -394,6 +291,136 @@ def get_course_students_progress(
     return progress_list
 
 
+
+# ==== CATEGORY ROLLUPS ====
+
+@router.get("/student/{student_id}/course/{course_id}/categories",
+            response_model=schemas.StudentCategoryProgress)
+def get_student_category_progress(
+    student_id: int,
+    course_id: int,
+    db: Session = Depends(get_db),
+    current_user: TokenClaims = Depends(get_current_claims),
+):
+    """
+    Progreso ponderado del estudiante agrupado por categoría de ejercicio,
+    sin el detalle por ejercicio.
+    """
+    get_student_for_progress(db, current_user, student_id, course_id)
+    return schemas.StudentCategoryProgress(
+        student_id=student_id,
+        course_id=course_id,
+        categories=progress_engine.student_category_progress(db, course_id, student_id),
+    )
+
+
+@router.get("/course/{course_id}/categories", response_model=schemas.CourseCategoryProgress)
+def get_course_category_progress(
+    course_id: int,
+    db: Session = Depends(get_db),
+    current_user: TokenClaims = Depends(get_current_claims),
+):
+    """
+    Progreso medio del curso por categoría de ejercicio (todos los estudiantes activos).
+    Solo terapeutas pueden acceder a esto.
+    """
+    require_therapist(current_user)
+
+    course = db.query(models.Course).filter(
+        models.Course.id == course_id,
+        models.Course.therapist_id == current_user.id,
+    ).first()
+
+    if not course:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Curso no encontrado."
+        )
+
+    rollup = progress_engine.course_category_progress(db, course_id)
+    return schemas.CourseCategoryProgress(course_id=course_id, **rollup)
+
+
+# ==== CRITERIA ANALYTICS ====
+
+@router.get("/course/{course_id}/criteria-analytics", response_model=schemas.CourseCriteriaAnalytics)
+def get_course_criteria_analytics(
+    course_id: int,
+    db: Session = Depends(get_db),
+    current_user: TokenClaims = Depends(get_current_claims),
+):
+    """
+    Estadísticas por criterio de rúbrica del curso (media, mediana, desviación,
+    percentiles, histograma y tendencia semanal), en % del máximo de cada criterio.
+    """
+    require_therapist(current_user)
+
+    course = db.query(models.Course).filter(
+        models.Course.id == course_id,
+        models.Course.therapist_id == current_user.id,
+    ).first()
+
+    if not course:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Curso no encontrado."
+        )
+
+    return criteria_analytics.course_criteria_analytics(db, course_id)
+
+
+# ==== EXPORT COURSE GRADEBOOK ====
+
+@router.get("/course/{course_id}/export")
+def export_course_gradebook(
+    course_id: int,
+    format: Literal["csv", "xlsx"] = Query("csv"),
+    db: Session = Depends(get_db),
+    current_user: TokenClaims = Depends(get_current_claims),
+):
+    """
+    Descarga el libro de calificaciones del curso (CSV o XLSX):
+    una fila por estudiante, una columna por ejercicio y una por criterio de rúbrica.
+    Las filas se generan en streaming desde un cursor del servidor.
+    """
+    require_therapist(current_user)
+
+    course = db.query(models.Course).filter(
+        models.Course.id == course_id,
+        models.Course.therapist_id == current_user.id,
+    ).first()
+
+    if not course:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Curso no encontrado."
+        )
+
+    columns = gradebook_export.load_columns(db, course_id)
+
+    def _stream():
+        # Sesión propia: la del request se cierra antes de terminar el streaming
+        export_db = SessionLocal()
+        try:
+            if format == "xlsx":
+                yield from gradebook_export.stream_xlsx(export_db, course_id, columns)
+            else:
+                yield from gradebook_export.stream_csv(export_db, course_id, columns)
+        finally:
+            export_db.close()
+
+    filename = f"calificaciones_curso_{course_id}_{datetime.now(timezone.utc):%Y%m%d}.{format}"
+    media_type = (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        if format == "xlsx" else "text/csv; charset=utf-8"
+    )
+    return StreamingResponse(
+        _stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
 # ==== GET SUBMISSION WITH COMPLETE EVALUATION INFO ====
 
 @router.get("/submission/{submission_id}/complete", 
@@ -401,7 +428,7 @@ def get_course_students_progress(
 def get_submission_with_evaluation(
     submission_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_current_claims),
 ):
     """
     Obtiene una entrega con toda su información:
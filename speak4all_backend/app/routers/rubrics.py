@@ -1,16 +1,17 @@
 from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_, or_
 
 from ..database import get_db
 from .. import models, schemas
-from ..deps import get_current_user
+from ..deps import TokenClaims, get_current_claims, get_current_user
+from ..services import rubric_cache, rubric_provisioning
 
 router = APIRouter(prefix="/rubrics", tags=["rubrics"])
 
 
-def require_therapist(user: models.User):
+def require_therapist(user: models.User | TokenClaims):
     if user.role != models.UserRole.THERAPIST:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -118,91 +119,92 @@ def create_default_rubric(
             detail="Ya existe una rúbrica para este ejercicio."
         )
     
-    # Crear rúbrica base (100 puntos totales)
-    rubric = models.RubricTemplate(
-        course_exercise_id=course_exercise_id,
-        therapist_id=current_user.id,
-        max_score=100,
-        created_at=datetime.now(timezone.utc),
-        updated_at=datetime.now(timezone.utc),
+    # Rúbrica base (100 puntos totales) con los criterios por defecto
+    template_ids = rubric_provisioning.provision_rubrics(
+        db, current_user.id, [course_exercise_id], rubric_provisioning.DEFAULT_RUBRIC_CRITERIA
     )
-    db.add(rubric)
-    db.flush()  # Para obtener el ID
-    
-    # Criterios por defecto
-    default_criteria = [
-        {
-            "name": "Pronunciación",
-            "description": "Claridad y corrección de la pronunciación",
-            "max_points": 25,
-            "levels": [
-                {"name": "Excelente", "points": 25, "order": 3},
-                {"name": "Bueno", "points": 20, "order": 2},
-                {"name": "Aceptable", "points": 15, "order": 1},
-                {"name": "Insuficiente", "points": 0, "order": 0},
-            ]
-        },
-        {
-            "name": "Fluidez",
-            "description": "Continuidad y naturalidad en el habla",
-            "max_points": 25,
-            "levels": [
-                {"name": "Excelente", "points": 25, "order": 3},
-                {"name": "Bueno", "points": 20, "order": 2},
-                {"name": "Aceptable", "points": 15, "order": 1},
-                {"name": "Insuficiente", "points": 0, "order": 0},
-            ]
-        },
-        {
-            "name": "Comprensión",
-            "description": "Demostración de comprensión del contenido",
-            "max_points": 25,
-            "levels": [
-                {"name": "Excelente", "points": 25, "order": 3},
-                {"name": "Bueno", "points": 20, "order": 2},
-                {"name": "Aceptable", "points": 15, "order": 1},
-                {"name": "Insuficiente", "points": 0, "order": 0},
-            ]
-        },
-        {
-            "name": "Participación",
-            "description": "Nivel de participación y esfuerzo",
-            "max_points": 25,
-            "levels": [
-                {"name": "Excelente", "points": 25, "order": 3},
-                {"name": "Bueno", "points": 20, "order": 2},
-                {"name": "Aceptable", "points": 15, "order": 1},
-                {"name": "Insuficiente", "points": 0, "order": 0},
-            ]
-        },
-    ]
-    
-    for idx, crit_data in enumerate(default_criteria):
-        criteria = models.RubricCriteria(
-            rubric_template_id=rubric.id,
-            name=crit_data["name"],
-            description=crit_data["description"],
-            max_points=crit_data["max_points"],
-            order=idx,
-            created_at=datetime.now(timezone.utc),
-            updated_at=datetime.now(timezone.utc),
+    db.commit()
+    rubric = db.query(models.RubricTemplate).filter(
+        models.RubricTemplate.id == template_ids[course_exercise_id]
+    ).first()
+    return rubric
+
+
+# ==== CREAR RÚBRICAS EN BLOQUE ====
+
+@router.post("/provision", response_model=schemas.RubricProvisionOut)
+def provision_rubrics(
+    body: schemas.RubricProvisionRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Crea la rúbrica por defecto (o una copia de `source_rubric_template_id`) en
+    todos los ejercicios de un curso o en la lista indicada. Los ejercicios que
+    ya tienen rúbrica se omiten.
+    """
+    require_therapist(current_user)
+
+    if (body.course_id is None) == (body.course_exercise_ids is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Indica course_id o course_exercise_ids (solo uno)."
         )
-        db.add(criteria)
-        db.flush()
-        
-        for level_data in crit_data["levels"]:
-            level = models.RubricLevel(
-                rubric_criteria_id=criteria.id,
-                name=level_data["name"],
-                points=level_data["points"],
-                order=level_data["order"],
-                created_at=datetime.now(timezone.utc),
+
+    query = db.query(models.CourseExercise.id).join(
+        models.Course, models.CourseExercise.course_id == models.Course.id
+    ).filter(
+        models.Course.therapist_id == current_user.id,
+        models.CourseExercise.is_deleted.is_(False),
+    )
+    if body.course_id is not None:
+        query = query.filter(models.CourseExercise.course_id == body.course_id)
+    else:
+        query = query.filter(models.CourseExercise.id.in_(body.course_exercise_ids))
+    accessible = {row.id for row in query}
+
+    requested = body.course_exercise_ids if body.course_exercise_ids is not None else sorted(accessible)
+    missing = [ce_id for ce_id in requested if ce_id not in accessible]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Ejercicios de curso no encontrados o sin permiso: {missing}"
+        )
+
+    if body.source_rubric_template_id is not None:
+        source = db.query(models.RubricTemplate).filter(
+            models.RubricTemplate.id == body.source_rubric_template_id,
+            models.RubricTemplate.therapist_id == current_user.id,
+        ).first()
+        loaded = rubric_provisioning.criteria_from_template(db, source.id) if source else None
+        if not loaded:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Rúbrica de origen no encontrada."
             )
-            db.add(level)
-    
+        max_score, criteria = loaded
+    else:
+        max_score, criteria = rubric_provisioning.DEFAULT_RUBRIC_MAX_SCORE, rubric_provisioning.DEFAULT_RUBRIC_CRITERIA
+
+    # Solo puede haber una rúbrica por ejercicio (aunque esté eliminada)
+    existing = {
+        row.course_exercise_id
+        for row in db.query(models.RubricTemplate.course_exercise_id).filter(
+            models.RubricTemplate.course_exercise_id.in_(requested)
+        )
+    }
+    targets = list(dict.fromkeys(ce_id for ce_id in requested if ce_id not in existing))
+
+    created = rubric_provisioning.provision_rubrics(db, current_user.id, targets, criteria, max_score)
     db.commit()
-    db.refresh(rubric, ["criteria"])
-    return rubric
+
+    return schemas.RubricProvisionOut(
+        created=[
+            schemas.RubricProvisionItem(course_exercise_id=ce_id, rubric_template_id=template_id)
+            for ce_id, template_id in created.items()
+        ],
+        skipped=sorted(existing),
+    )
 
 
 # ==== OBTENER RÚBRICA ====
@@ -210,10 +212,15 @@ def create_default_rubric(
 @router.get("/{course_exercise_id}", response_model=schemas.RubricTemplateOut)
 def get_rubric(
     course_exercise_id: int,
+    if_none_match: str | None = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_current_claims),
 ):
-    """Obtiene la rúbrica de un ejercicio de curso (terapeuta o estudiante inscrito)"""
+    """
+    Obtiene la rúbrica de un ejercicio de curso (terapeuta o estudiante inscrito).
+    El árbol serializado se cachea por (id, versión); la respuesta lleva ETag
+    y devuelve 304 si el cliente ya tiene esa versión (If-None-Match).
+    """
     
     # Verificar acceso según rol
     if current_user.role == models.UserRole.THERAPIST:
@@ -249,20 +256,36 @@ def get_rubric(
             detail="No tienes permiso para ver rúbricas."
         )
     
-    rubric = db.query(models.RubricTemplate).filter(
+    # Solo id y versión: el árbol completo se carga únicamente si no está en caché
+    head = db.query(models.RubricTemplate.id, models.RubricTemplate.version).filter(
         models.RubricTemplate.course_exercise_id == course_exercise_id,
         models.RubricTemplate.is_deleted.is_(False),
-    ).options(
-        joinedload(models.RubricTemplate.criteria).joinedload(models.RubricCriteria.levels)
     ).first()
     
-    if not rubric:
+    if not head:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Rúbrica no encontrada."
         )
     
-    return rubric
+    etag = rubric_cache.etag(head.id, head.version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    body = rubric_cache.get(head.id, head.version)
+    if body is None:
+        rubric = db.query(models.RubricTemplate).filter(
+            models.RubricTemplate.id == head.id,
+        ).options(
+            joinedload(models.RubricTemplate.criteria).joinedload(models.RubricCriteria.levels)
+        ).first()
+        body = schemas.RubricTemplateOut.model_validate(rubric).model_dump_json().encode()
+        # Se guarda con la versión leída al principio: si cambió entretanto, la
+        # entrada queda huérfana y el siguiente GET verá la versión nueva
+        rubric_cache.put(head.id, head.version, body)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 # ==== VERIFICAR SI RÚBRICA TIENE EVALUACIONES ====
@@ -271,7 +294,7 @@ def get_rubric(
 def check_rubric_has_evaluations(
     course_exercise_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_current_claims),
 ):
     """Verifica si una rúbrica tiene evaluaciones asociadas"""
     require_therapist(current_user)
@@ -323,6 +346,7 @@ def update_rubric(
         rubric.max_score = body.max_score
     
     rubric.updated_at = datetime.now(timezone.utc)
+    rubric_cache.bump_version(db, rubric.id)
     db.commit()
     db.refresh(rubric, ["criteria"])
     return rubric
@@ -382,6 +406,7 @@ def add_criterion(
         )
         db.add(level)
     
+    rubric_cache.bump_version(db, rubric.id)
     db.commit()
     db.refresh(criteria, ["levels"])
     return criteria
@@ -437,6 +462,7 @@ def update_criterion(
         criteria.order = body.order
     
     criteria.updated_at = datetime.now(timezone.utc)
+    rubric_cache.bump_version(db, rubric.id)
     db.commit()
     db.refresh(criteria, ["levels"])
     return criteria
@@ -488,6 +514,7 @@ def delete_criterion(
     for level in criteria.levels:
         level.is_deleted = True
     
+    rubric_cache.bump_version(db, rubric.id)
     db.commit()
     return {"detail": "Criterio eliminado."}
 
@@ -547,6 +574,7 @@ def update_level(
     if body.order is not None:
         level.order = body.order
     
+    rubric_cache.bump_version(db, rubric.id)
     db.commit()
     db.refresh(level)
     return level
@@ -601,6 +629,7 @@ def add_level(
         created_at=datetime.now(timezone.utc),
     )
     db.add(level)
+    rubric_cache.bump_version(db, rubric.id)
     db.commit()
     db.refresh(level)
     return level
@@ -652,5 +681,6 @@ def delete_level(
         )
     
     level.is_deleted = True
+    rubric_cache.bump_version(db, rubric.id)
     db.commit()
     return {"detail": "Nivel eliminado."}
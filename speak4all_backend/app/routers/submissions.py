@@ -1,5 +1,6 @@
 from datetime import datetime, timezone
 from pathlib import Path
+import asyncio
 import logging
 
 from fastapi import (
@@ -10,15 +11,18 @@ from fastapi import (
     File,
     status,
 )
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 
-from ..database import get_db
+from ..database import get_async_db, get_db
 from .. import models, schemas
 from ..deps import get_current_user
 from ..config import settings
 from ..websocket_manager import manager
 from sqlalchemy import and_
 from app.services.storage import upload_fileobj, generate_signed_url, delete_blob
+from app.services import criteria_analytics, progress_store
 
 
 logger = logging.getLogger(__name__)
@@ -110,8 +114,8 @@ def check_due_date(course_ex: models.CourseExercise):
         )
 
 
-def get_course_exercise_for_student(
-    db: Session,
+async def get_course_exercise_for_student(
+    db: AsyncSession,
     course_exercise_id: int,
     student_id: int,
 ) -> models.CourseExercise:
@@ -120,19 +124,23 @@ def get_course_exercise_for_student(
     - que el CourseExercise existe,
     - que el curso asociado existe,
     - que el estudiante está inscrito en ese curso.
+    Carga también el ejercicio y el curso (se usan en la notificación).
     """
-    course_ex = (
-        db.query(models.CourseExercise)
+    course_ex = (await db.execute(
+        select(models.CourseExercise)
         .join(models.Course)
         .join(models.CourseStudent, models.CourseStudent.course_id == models.Course.id)
-        .filter(
+        .where(
             models.CourseExercise.id == course_exercise_id,
             models.CourseExercise.is_deleted.is_(False),
             models.CourseStudent.student_id == student_id,
             models.CourseStudent.is_active.is_(True),
         )
-        .first()
-    )
+        .options(
+            selectinload(models.CourseExercise.exercise),
+            selectinload(models.CourseExercise.course),
+        )
+    )).scalars().first()
 
     if not course_ex:
         raise HTTPException(
@@ -143,20 +151,19 @@ def get_course_exercise_for_student(
     return course_ex
 
 
-def get_or_create_submission(
-    db: Session,
+async def get_or_create_submission(
+    db: AsyncSession,
     student_id: int,
     course_exercise_id: int,
 ) -> models.Submission:
     # Solo obtener si existe; la creación se hace en submit_exercise después de subir media
-    sub = (
-        db.query(models.Submission)
-        .filter(
+    sub = (await db.execute(
+        select(models.Submission)
+        .where(
             models.Submission.student_id == student_id,
             models.Submission.course_exercise_id == course_exercise_id,
         )
-        .first()
-    )
+    )).scalars().first()
     return sub
 
 
@@ -200,7 +207,7 @@ def save_submission_media(
 async def submit_exercise(
     course_exercise_id: int,
     media: UploadFile = File(...),  # Obligatorio: foto o video
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
@@ -214,12 +221,12 @@ async def submit_exercise(
     """
     require_student(current_user)
 
-    course_ex = get_course_exercise_for_student(
+    course_ex = await get_course_exercise_for_student(
         db, course_exercise_id, current_user.id
     )
     check_due_date(course_ex)
 
-    existing_submission = get_or_create_submission(
+    existing_submission = await get_or_create_submission(
         db, current_user.id, course_exercise_id
     )
 
@@ -229,12 +236,12 @@ async def submit_exercise(
     # Si ya existía una media anterior, eliminarla del storage
     if existing_submission and existing_submission.media_path:
         try:
-            delete_blob(existing_submission.media_path)
+            await asyncio.to_thread(delete_blob, existing_submission.media_path)
             logger.info(f"Media anterior eliminada de media: {existing_submission.media_path}")
         except Exception as e:
             logger.warning(f"No se pudo eliminar la media anterior de media: {e}")
     
-    media_path = save_submission_media(media, course_ex, current_user.id)
+    media_path = await asyncio.to_thread(save_submission_media, media, course_ex, current_user.id)
 
     if existing_submission:
         submission = existing_submission
@@ -254,8 +261,7 @@ async def submit_exercise(
         db.add(submission)
         logger.info(f"Media guardada para nueva submission: {media_path}")
 
-    db.commit()
-    db.refresh(submission)
+    await db.commit()
     
     # Broadcast to connected clients con información detallada
     exercise_name = course_ex.exercise.name if course_ex.exercise else 'Ejercicio'
@@ -291,7 +297,7 @@ async def submit_exercise(
 )
 async def cancel_submission(
     course_exercise_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
@@ -302,10 +308,7 @@ async def cancel_submission(
     require_student(current_user)
 
     # Buscar la entrega
-    sub = db.query(models.Submission).filter(
-        models.Submission.course_exercise_id == course_exercise_id,
-        models.Submission.student_id == current_user.id,
-    ).first()
+    sub = await get_or_create_submission(db, current_user.id, course_exercise_id)
 
     if not sub:
         raise HTTPException(
@@ -314,10 +317,15 @@ async def cancel_submission(
         )
 
     # Verificar que el ejercicio sigue disponible
-    course_ex = db.query(models.CourseExercise).filter(
-        models.CourseExercise.id == course_exercise_id,
-        models.CourseExercise.is_deleted.is_(False),
-    ).first()
+    course_ex = (await db.execute(
+        select(models.CourseExercise).where(
+            models.CourseExercise.id == course_exercise_id,
+            models.CourseExercise.is_deleted.is_(False),
+        ).options(
+            selectinload(models.CourseExercise.exercise),
+            selectinload(models.CourseExercise.course),
+        )
+    )).scalars().first()
 
     if not course_ex:
         raise HTTPException(
@@ -331,7 +339,7 @@ async def cancel_submission(
     # Borrar el archivo de media si existe
     if sub.media_path:
         try:
-            delete_blob(sub.media_path)
+            await asyncio.to_thread(delete_blob, sub.media_path)
             logger.info(f"Media eliminada de media al cancelar submission: {sub.media_path}")
         except Exception as e:
             logger.warning(f"No se pudo eliminar la media de media: {e}")
@@ -344,8 +352,11 @@ async def cancel_submission(
     therapist_id = course_ex.course.therapist_id if course_ex.course else None
 
     # Eliminar la entrega
-    db.delete(sub)
-    db.commit()
+    await db.delete(sub)
+    await db.flush()
+    await db.run_sync(progress_store.refresh_student, course_id, student_id)
+    await db.commit()
+    criteria_analytics.invalidate_course(course_id)
 
     # Notificar vía WebSocket
     await manager.broadcast_to_course(
@@ -1,15 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
 from pathlib import Path
+import asyncio
 import secrets
 import re
 
-from ..database import get_db
+from ..database import get_async_db, get_db
 from ..deps import get_current_user, hash_password, verify_password
 from ..models import User
 from ..schemas import UserOut, UserProfileUpdate, ChangePasswordRequest
-from ..services import storage
+from ..services import password_pool, storage, user_cache
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -100,6 +102,7 @@ def update_my_profile(
         current_user.email = normalized_email
     
     db.commit()
+    user_cache.invalidate_user(current_user.id)
     db.refresh(current_user)
     return current_user
 
@@ -108,7 +111,7 @@ def update_my_profile(
 async def upload_avatar(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Subir o actualizar foto de perfil del usuario"""
     
@@ -134,7 +137,7 @@ async def upload_avatar(
     # Eliminar avatar anterior si existe en storage
     if current_user.avatar_path:
         try:
-            storage.delete_blob(current_user.avatar_path)
+            await asyncio.to_thread(storage.delete_blob, current_user.avatar_path)
         except Exception:
             # Si falla el borrado, continuamos; no bloquea la subida
             pass
@@ -144,18 +147,20 @@ async def upload_avatar(
     blob_name = f"avatars/{current_user.id}_{random_name}{file_ext}"
 
     # Subir a media
-    storage.upload_fileobj(
+    await asyncio.to_thread(
+        storage.upload_fileobj,
         file_obj=file.file,
         destination_blob_name=blob_name,
         content_type=file.content_type,
     )
 
-    # Actualizar usuario con el blob name
-    current_user.avatar_path = blob_name
-    db.commit()
-    db.refresh(current_user)
+    # Actualizar usuario con el blob name (current_user pertenece a la sesión síncrona)
+    user = await db.get(User, current_user.id)
+    user.avatar_path = blob_name
+    await db.commit()
+    user_cache.invalidate_user(user.id)
     
-    return current_user
+    return user
 
 
 @router.delete("/me/avatar", response_model=UserOut)
@@ -172,16 +177,17 @@ def delete_avatar(
             pass
         current_user.avatar_path = None
         db.commit()
+        user_cache.invalidate_user(current_user.id)
         db.refresh(current_user)
     
     return current_user
 
 
 @router.post("/me/change-password")
-def change_password(
+async def change_password(
     password_data: ChangePasswordRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cambiar o establecer contraseña del usuario"""
     
@@ -192,10 +198,14 @@ def change_password(
             detail=f"La contraseña debe tener entre {PASSWORD_MIN_LENGTH} y {PASSWORD_MAX_LENGTH} caracteres"
         )
 
-    if not current_user.password_hash:
+    # current_user pertenece a la sesión síncrona; se escribe con la async
+    user = await db.get(User, current_user.id)
+
+    if not user.password_hash:
         # Establecer contraseña por primera vez
-        current_user.password_hash = hash_password(password_data.new_password)
-        db.commit()
+        user.password_hash = await password_pool.run(hash_password, password_data.new_password)
+        await db.commit()
+        user_cache.invalidate_user(user.id)
         return {"message": "Password set successfully"}
     
     # Si el usuario YA tiene contraseña, validar la actual
@@ -205,16 +215,17 @@ def change_password(
             detail="Current password is required to change password"
         )
     
-    # Verificar contraseña actual
-    if not verify_password(password_data.current_password, current_user.password_hash):
+    # Verificar contraseña actual (bcrypt en el pool de procesos)
+    if not await password_pool.run(verify_password, password_data.current_password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect current password"
         )
     
     # Actualizar contraseña
-    current_user.password_hash = hash_password(password_data.new_password)
-    db.commit()
+    user.password_hash = await password_pool.run(hash_password, password_data.new_password)
+    await db.commit()
+    user_cache.invalidate_user(user.id)
     
     return {"message": "Password changed successfully"}
 
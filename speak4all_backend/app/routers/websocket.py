@@ -1,12 +1,16 @@
 """
 WebSocket router for real-time course updates
+- /ws: one socket per user, subscribed to all of the user's courses
+- /ws/courses/{course_id}: legacy socket for a single course
 """
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import json
 import logging
 
-from ..database import get_db
+from ..database import get_async_db
 from ..websocket_manager import manager
 from .. import models
 from ..deps import get_current_user_ws
@@ -16,12 +20,75 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+async def _receive_loop(websocket: WebSocket):
+    """Keep the connection open and answer pings until the client leaves"""
+    while True:
+        data = await websocket.receive_text()
+        if data == "ping":
+            await manager.send_personal_message('{"type":"pong"}', websocket)
+
+
+@router.websocket("/ws")
+async def websocket_user_endpoint(
+    websocket: WebSocket,
+    token: str = Query(...),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Single WebSocket per user for all of the user's courses.
+    Clients connect with: ws://localhost:8000/ws?token={jwt_token}
+    Course events carry "course_id"; "subscribed" / "unsubscribed" events
+    report when the user joins or leaves a course while connected.
+    """
+    try:
+        user = await get_current_user_ws(token, db)
+    except Exception as e:
+        logger.error(f"WebSocket authentication failed: {e}")
+        await db.close()
+        await websocket.close(code=1008)  # Policy violation
+        return
+
+    # Todos los cursos del usuario en una consulta
+    if user.role == models.UserRole.THERAPIST:
+        stmt = select(models.Course.id).where(
+            models.Course.therapist_id == user.id,
+            models.Course.deleted_at.is_(None),
+        )
+    else:
+        stmt = select(models.CourseStudent.course_id).join(
+            models.Course, models.Course.id == models.CourseStudent.course_id
+        ).where(
+            models.CourseStudent.student_id == user.id,
+            models.CourseStudent.deleted_at.is_(None),
+            models.Course.deleted_at.is_(None),
+        )
+    course_ids = sorted(set((await db.execute(stmt)).scalars().all()))
+
+    # Cerrar la DB session después de validación, no la necesitamos en el loop
+    await db.close()
+
+    await manager.connect_user(websocket, user.id, course_ids)
+
+    try:
+        await manager.send_personal_message(
+            json.dumps({"type": "connected", "message": "Connected to user updates", "course_ids": course_ids}),
+            websocket
+        )
+        await _receive_loop(websocket)
+    except WebSocketDisconnect:
+        manager.disconnect(websocket)
+        logger.info(f"User {user.id} disconnected")
+    except Exception as e:
+        logger.error(f"WebSocket error for user {user.id}: {e}")
+        manager.disconnect(websocket)
+
+
 @router.websocket("/ws/courses/{course_id}")
 async def websocket_course_endpoint(
     websocket: WebSocket,
     course_id: int,
     token: str = Query(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     WebSocket endpoint for real-time course updates.
@@ -32,19 +99,21 @@ async def websocket_course_endpoint(
         user = await get_current_user_ws(token, db)
     except Exception as e:
         logger.error(f"WebSocket authentication failed: {e}")
-        db.close()  # Asegurar que se cierre la conexión
+        await db.close()  # Asegurar que se cierre la conexión
         await websocket.close(code=1008)  # Policy violation
         return
 
     # Verify user has access to this course
-    course = db.query(models.Course).filter(
-        models.Course.id == course_id,
-        models.Course.deleted_at.is_(None)
-    ).first()
+    course = (await db.execute(
+        select(models.Course).where(
+            models.Course.id == course_id,
+            models.Course.deleted_at.is_(None)
+        )
+    )).scalars().first()
 
     if not course:
         logger.warning(f"Course {course_id} not found")
-        db.close()  # Asegurar que se cierre la conexión
+        await db.close()  # Asegurar que se cierre la conexión
         await websocket.close(code=1008)
         return
 
@@ -54,25 +123,27 @@ async def websocket_course_endpoint(
         has_access = True
     elif user.role == models.UserRole.STUDENT:
         # Check if student is enrolled
-        enrollment = db.query(models.CourseStudent).filter(
-            models.CourseStudent.course_id == course_id,
-            models.CourseStudent.student_id == user.id,
-            models.CourseStudent.deleted_at.is_(None)
-        ).first()
+        enrollment = (await db.execute(
+            select(models.CourseStudent.id).where(
+                models.CourseStudent.course_id == course_id,
+                models.CourseStudent.student_id == user.id,
+                models.CourseStudent.deleted_at.is_(None)
+            )
+        )).first()
         if enrollment:
             has_access = True
 
     if not has_access:
         logger.warning(f"User {user.id} has no access to course {course_id}")
-        db.close()  # Asegurar que se cierre la conexión
+        await db.close()  # Asegurar que se cierre la conexión
         await websocket.close(code=1008)
         return
 
     # Cerrar la DB session después de validación, no la necesitamos en el loop
-    db.close()
+    await db.close()
 
     # Connect client
-    await manager.connect(websocket, course_id)
+    await manager.connect(websocket, course_id, user.id)
 
     try:
         # Send initial connection confirmation
@@ -82,15 +153,11 @@ async def websocket_course_endpoint(
         )
 
         # Keep connection alive and handle incoming messages
-        while True:
-            data = await websocket.receive_text()
-            # Echo back for ping/pong if needed
-            if data == "ping":
-                await manager.send_personal_message('{"type":"pong"}', websocket)
+        await _receive_loop(websocket)
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket, course_id)
+        manager.disconnect(websocket, course_id, user.id)
         logger.info(f"Client disconnected from course {course_id}")
     except Exception as e:
         logger.error(f"WebSocket error in course {course_id}: {e}")
-        manager.disconnect(websocket, course_id)
+        manager.disconnect(websocket, course_id, user.id)
@@ -1,7 +1,7 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, Generic, TypeVar
 from pydantic import BaseModel, ConfigDict, Field
-from .models import UserRole, JoinRequestStatus, SubmissionStatus  
+from .models import UserRole, JoinRequestStatus, SubmissionStatus, AudioStatus
 
 
 # ==== PAGINATION ====
@@ -154,6 +154,7 @@ class StudentProgressOut(BaseModel):
 class ExerciseGenerateRequest(BaseModel):
     prompt: str
     profile_id: int | None = None  # Perfil opcional para personalizar IA
+    regenerate: bool = False       # True = ignorar la caché y pedir un guion nuevo
 
 
 class ExerciseGenerateResponse(BaseModel):
@@ -172,18 +173,61 @@ class ExerciseCreateRequest(BaseModel):
     profile_id: int | None = None  # Perfil opcional seleccionado al generar
 
 
+class ExerciseUpdateRequest(BaseModel):
+    name: str | None = None
+    text: str | None = None         # texto limpio editado
+    marked_text: str | None = None  # guion con [REP] editado (prioridad sobre text para TTS)
+
+
 class ExerciseOut(BaseModel):
     id: int
     name: str
     prompt: str | None = None
     text: str
-    audio_path: str
+    marked_text: str | None = None
+    audio_path: str | None = None  # None mientras el audio se genera
+    audio_status: AudioStatus = AudioStatus.READY
     created_at: datetime
     folder_id: int | None = None
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class ExerciseBatchRequest(BaseModel):
+    prompts: list[str]
+    profile_ids: list[int | None] | None = None  # si viene, uno por prompt
+    names: list[str] | None = None               # si viene, uno por prompt
+    folder_id: int | None = None
+
+
+class ExerciseBatchItemOut(BaseModel):
+    index: int
+    name: str
+    prompt: str
+    profile_id: int | None = None
+    status: str  # QUEUED | GENERATING | RENDERING | DONE | FAILED
+    error: str | None = None
+    exercise_id: int | None = None
+
+
+class ExerciseBatchOut(BaseModel):
+    batch_id: str
+    status: str  # RUNNING | DONE | FAILED
+    total: int
+    done: int
+    failed: int
+    created_at: datetime
+    finished_at: datetime | None = None
+    items: list[ExerciseBatchItemOut]
+
+
+class ExerciseAudioStatusOut(BaseModel):
+    exercise_id: int
+    audio_status: AudioStatus
+    audio_path: str | None = None
+    error: str | None = None  # último error del job si falló
+
+
 
 
 # ==== EXERCISE CATEGORY ====
@@ -487,6 +531,23 @@ class RubricTemplateOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class RubricProvisionRequest(BaseModel):
+    """Crea rúbricas en varios ejercicios: indicar course_id o course_exercise_ids"""
+    course_id: Optional[int] = None
+    course_exercise_ids: Optional[list[int]] = None
+    source_rubric_template_id: Optional[int] = None  # clonar esta rúbrica en vez de la por defecto
+
+
+class RubricProvisionItem(BaseModel):
+    course_exercise_id: int
+    rubric_template_id: int
+
+
+class RubricProvisionOut(BaseModel):
+    created: list[RubricProvisionItem] = Field(default_factory=list)
+    skipped: list[int] = Field(default_factory=list)  # ejercicios que ya tenían rúbrica
+
+
 # ==== EVALUATION (EVALUACIÓN) ====
 
 class EvaluationCriterionScoreCreate(BaseModel):
@@ -512,6 +573,11 @@ class EvaluationCreate(BaseModel):
     notes: Optional[str] = None
 
 
+class EvaluationBulkCreate(BaseModel):
+    """Varias evaluaciones en una sola petición (todas o ninguna)"""
+    evaluations: list[EvaluationCreate] = Field(min_length=1)
+
+
 class EvaluationUpdate(BaseModel):
     criterion_scores: Optional[list[EvaluationCriterionScoreCreate]] = None
     notes: Optional[str] = None
@@ -584,6 +650,56 @@ class StudentProgressWithEvaluation(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class CategoryProgress(BaseModel):
+    """Subtotal ponderado de una categoría (category_id None = sin categoría)"""
+    category_id: Optional[int] = None
+    category_name: Optional[str] = None
+    category_color: Optional[str] = None
+    weighted_score: float  # % ponderado dentro de la categoría
+    total_weight: int
+    total_exercises: int
+    evaluated_exercises: int
+
+
+class StudentCategoryProgress(BaseModel):
+    student_id: int
+    course_id: int
+    categories: list[CategoryProgress] = Field(default_factory=list)
+
+
+class CourseCategoryProgress(BaseModel):
+    """Media de los subtotales por categoría de los estudiantes activos del curso"""
+    course_id: int
+    student_count: int
+    categories: list[CategoryProgress] = Field(default_factory=list)
+
+
+class CriterionTrendPoint(BaseModel):
+    week_start: date  # lunes de la semana
+    count: int
+    mean: float  # media en % del máximo del criterio
+
+
+class CriterionAnalytics(BaseModel):
+    """Estadísticas de un criterio (agrupado por nombre) en % de su puntuación máxima"""
+    criterion_name: str
+    count: int
+    mean_points: float
+    mean: Optional[float] = None
+    median: Optional[float] = None
+    std: Optional[float] = None
+    percentiles: dict[str, float] = Field(default_factory=dict)  # p10, p25, p75, p90
+    histogram: list[int]  # conteos por tramo de histogram_edges
+    trend: list[CriterionTrendPoint] = Field(default_factory=list)
+
+
+class CourseCriteriaAnalytics(BaseModel):
+    course_id: int
+    total_scores: int
+    histogram_edges: list[float]
+    criteria: list[CriterionAnalytics]
+
+
 class SubmissionWithEvaluation(BaseModel):
     """Entrega con su evaluación y observaciones"""
     submission: SubmissionOut
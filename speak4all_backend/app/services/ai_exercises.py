@@ -1,17 +1,23 @@
 # app/services/ai_exercises.py
-import os, re, subprocess, tempfile
+import os, re, time, uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 from dotenv import load_dotenv
-from openai import OpenAI
 import logging
 import shutil
 
+from . import audio_assembly
+from .ai_providers import get_provider
+from .prompt_cache import PromptCache, generation_key
+from .tts_cache import TTSSegmentCache, segment_key
+
 logger = logging.getLogger(__name__)
 load_dotenv()
 
 # === CONFIG (todas desde .env si quieres) ===
 OPENAI_MODEL      = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE", "0.6"))
 OPENAI_TTS_MODEL  = os.getenv("OPENAI_TTS_MODEL", "gpt-4o-mini-tts")
 VOICE_NAME        = os.getenv("TTS_VOICE_NAME", "verse")  # alloy, coral, shimmer, fable, verse, etc.
 SAMPLE_RATE       = int(os.getenv("AUDIO_RATE", "44100"))
@@ -25,7 +31,33 @@ REP_BASE_S        = float(os.getenv("REP_BASE_S", "0.8"))       # base
 REP_POR_PAL_S     = float(os.getenv("REP_POR_PAL_S", "0.45"))   # por palabra (~sílabas)
 REP_MAX_S         = float(os.getenv("REP_MAX_S", "3.5"))        # límite superior
 
-client = OpenAI()
+# Síntesis concurrente de segmentos TTS
+TTS_MAX_CONCURRENCY = max(1, int(os.getenv("TTS_MAX_CONCURRENCY", "4")))  # peticiones TTS simultáneas
+TTS_MAX_RETRIES     = max(0, int(os.getenv("TTS_MAX_RETRIES", "3")))      # reintentos por segmento
+TTS_RETRY_BACKOFF_S = float(os.getenv("TTS_RETRY_BACKOFF_S", "1.0"))      # espera base (se duplica)
+
+# Caché de segmentos TTS en media/tts_cache
+TTS_CACHE_ENABLED   = os.getenv("TTS_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+TTS_CACHE_MAX_MB    = int(os.getenv("TTS_CACHE_MAX_MB", "512"))
+
+# Caché de guiones generados (mismo prompt + perfil -> misma respuesta durante el TTL)
+GEN_CACHE_TTL_S       = float(os.getenv("GEN_CACHE_TTL_S", "3600"))  # 0 desactiva la caché
+GEN_CACHE_MAX_ENTRIES = int(os.getenv("GEN_CACHE_MAX_ENTRIES", "1000"))
+
+TTS_INSTRUCTIONS  = "Español neutro latino, cálido y pausado; dicción clara y amable."
+
+# Fragmentos TTS de este tamaño o menos (WAV mono 16 bits a AUDIO_RATE, ~22 ms)
+# se consideran vacíos o truncados y se descartan, como hacía el concat de ffmpeg
+SEGMENT_MIN_BYTES = 2000
+
+provider = get_provider()
+
+tts_cache = TTSSegmentCache(
+    Path.cwd() / "media" / "tts_cache",
+    max_bytes=TTS_CACHE_MAX_MB * 1024 * 1024,
+) if TTS_CACHE_ENABLED else None
+
+generation_cache = PromptCache(ttl_s=GEN_CACHE_TTL_S, max_entries=GEN_CACHE_MAX_ENTRIES)
 
 # ========= 1) Generar texto con marcadores [REP]...[/REP] =========
 
@@ -39,34 +71,93 @@ SYSTEM_RULES = (
     "Sugiere que puede pausar el audio si necesita más tiempo. No pidas feedback."
 )
 
-def generate_marked_text_from_prompt(therapist_prompt: str, profile_description: str | None = None) -> str:
+def _build_user_prompt(therapist_prompt: str, profile_description: str | None) -> str:
+    if not profile_description:
+        return therapist_prompt
+    logger.info("Usando perfil personalizado para generación")
+    return (
+        "Genera un ejercicio personalizado para el siguiente perfil de estudiante:\n\n"
+        f"{profile_description}\n\n"
+        f"Requisitos del ejercicio:\n{therapist_prompt}"
+    )
+
+
+def _chat_messages(therapist_prompt: str, profile_description: str | None) -> list[dict]:
+    return [
+        {"role": "system", "content": SYSTEM_RULES},
+        {"role": "user", "content": _build_user_prompt(therapist_prompt, profile_description)},
+    ]
+
+
+def _provider_model(model: str) -> str:
+    """Modelo para las claves de caché: las respuestas de otros proveedores no se mezclan con OpenAI."""
+    return model if provider.name == "openai" else f"{provider.name}:{model}"
+
+
+def _generation_key(therapist_prompt: str, profile_description: str | None) -> str:
+    return generation_key(therapist_prompt, profile_description, _provider_model(OPENAI_MODEL), OPENAI_TEMPERATURE)
+
+
+def generate_marked_text_from_prompt(
+    therapist_prompt: str,
+    profile_description: str | None = None,
+    regenerate: bool = False,
+) -> str:
     """
     Usa IA para generar el guion con marcadores [REP]...[/REP].
     Si hay profile_description, personaliza el ejercicio para ese perfil.
+    Las respuestas se cachean por prompt/perfil; regenerate=True fuerza una nueva.
     """
-    logger.info(f"Generando texto con IA para prompt: {therapist_prompt[:100]}...")
-
-    user_prompt = therapist_prompt
-    if profile_description:
-        user_prompt = (
-            "Genera un ejercicio personalizado para el siguiente perfil de estudiante:\n\n"
-            f"{profile_description}\n\n"
-            f"Requisitos del ejercicio:\n{therapist_prompt}"
+    def _call() -> str:
+        logger.info(f"Generando texto con IA para prompt: {therapist_prompt[:100]}...")
+        result = provider.complete(
+            OPENAI_MODEL,
+            _chat_messages(therapist_prompt, profile_description),
+            temperature=OPENAI_TEMPERATURE,
+            max_tokens=700,
         )
-        logger.info("Usando perfil personalizado para generación")
-
-    r = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=[
-            {"role": "system", "content": SYSTEM_RULES},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=0.6,
-        max_tokens=700,
+        logger.info(f"Texto generado exitosamente ({len(result)} caracteres)")
+        return result
+
+    return generation_cache.get_or_compute(
+        _generation_key(therapist_prompt, profile_description),
+        _call,
+        refresh=regenerate,
     )
-    result = r.choices[0].message.content.strip()
-    logger.info(f"Texto generado exitosamente ({len(result)} caracteres)")
-    return result
+
+
+def stream_marked_text_from_prompt(
+    therapist_prompt: str,
+    profile_description: str | None = None,
+    regenerate: bool = False,
+):
+    """
+    Igual que generate_marked_text_from_prompt pero va devolviendo (yield)
+    los fragmentos de texto según llegan del modelo.
+    Si el guion está en caché se devuelve de una vez como único fragmento.
+    """
+    key = _generation_key(therapist_prompt, profile_description)
+    if not regenerate:
+        cached = generation_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    logger.info(f"Generando texto con IA (streaming) para prompt: {therapist_prompt[:100]}...")
+
+    parts: list[str] = []
+    for delta in provider.stream(
+        OPENAI_MODEL,
+        _chat_messages(therapist_prompt, profile_description),
+        temperature=OPENAI_TEMPERATURE,
+        max_tokens=700,
+    ):
+        parts.append(delta)
+        yield delta
+
+    result = "".join(parts).strip()
+    if result:
+        generation_cache.put(key, result)
 
 
 # ========= 2) Eliminar [REP] para mostrar texto limpio al usuario =========
@@ -178,114 +269,194 @@ def split_into_segments(marked_text: str):
 # ========= 4) Utilidades TTS =========
 
 def tts_to_wav(text: str, out_wav: Path):
-    with client.audio.speech.with_streaming_response.create(
+    provider.synthesize_wav(
+        text,
+        out_wav,
         model=OPENAI_TTS_MODEL,
         voice=VOICE_NAME,
-        input=text,
-        response_format="wav",
-        instructions="Español neutro latino, cálido y pausado; dicción clara y amable.",
-    ) as resp:
-        resp.stream_to_file(str(out_wav))
-
-
-def gen_silence(seconds: float, out_wav: Path):
-    cmd = [
-        "ffmpeg","-y",
-        "-f","lavfi","-t", f"{seconds}",
-        "-i", f"anullsrc=r={SAMPLE_RATE}:cl=mono",
-        "-ar", str(SAMPLE_RATE), "-ac","1",
-        str(out_wav)
-    ]
-    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        instructions=TTS_INSTRUCTIONS,
+        sample_rate=SAMPLE_RATE,
+    )
+
+
+def tts_to_wav_with_retry(text: str, out_wav: Path):
+    """
+    Llama a tts_to_wav reintentando con backoff exponencial si falla
+    (timeouts, 429, errores 5xx...). Relanza el último error si se agotan los intentos.
+    """
+    for attempt in range(TTS_MAX_RETRIES + 1):
+        try:
+            tts_to_wav(text, out_wav)
+            return
+        except Exception as e:
+            if attempt >= TTS_MAX_RETRIES:
+                logger.error(f"TTS falló definitivamente para {out_wav.name}: {e}")
+                raise
+            delay = TTS_RETRY_BACKOFF_S * (2 ** attempt)
+            logger.warning(
+                f"TTS falló para {out_wav.name} (intento {attempt + 1}/{TTS_MAX_RETRIES + 1}): {e}. "
+                f"Reintentando en {delay:.1f}s"
+            )
+            time.sleep(delay)
+
 
+def tts_segment_key(text: str) -> str:
+    """Clave de caché del segmento con la configuración TTS actual."""
+    return segment_key(text, VOICE_NAME, _provider_model(OPENAI_TTS_MODEL), TTS_INSTRUCTIONS, SAMPLE_RATE)
 
-def ensure_wav(src: Path, out_wav: Path):
-    cmd = ["ffmpeg","-y","-i",str(src), "-ar", str(SAMPLE_RATE), "-ac","1", str(out_wav)]
-    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
+def tts_to_wav_cached(text: str, out_wav: Path):
+    """
+    Sirve el segmento desde la caché si ya se sintetizó con la misma voz/modelo;
+    si no, lo pide a la API y lo guarda en caché.
+    """
+    if tts_cache is None:
+        tts_to_wav_with_retry(text, out_wav)
+        return
 
-def concat_to_mp3(wavs: list[Path], out_mp3: Path):
-    valid = [w for w in wavs if w.exists() and w.stat().st_size > 2000]
-    if not valid:
+    key = tts_segment_key(text)
+    if tts_cache.get(key, out_wav):
+        return
+    tts_to_wav_with_retry(text, out_wav)
+    tts_cache.put(key, out_wav)
+
+
+def synthesize_segments(items: list[tuple[str, Path]]):
+    """
+    Sintetiza los pares (texto, wav_destino) en paralelo con un pool acotado a
+    TTS_MAX_CONCURRENCY. Los segmentos ya presentes en la caché no llegan a la API.
+    """
+    if not items:
+        return
+
+    workers = min(TTS_MAX_CONCURRENCY, len(items))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts") as pool:
+        # list() fuerza la espera y propaga la primera excepción
+        list(pool.map(lambda item: tts_to_wav_cached(*item), items))
+
+
+def assemble_to_mp3(segments: list[dict], seg_wavs: list[Path], out_mp3: Path):
+    """
+    Decodifica los WAV de cada segmento en memoria (mono, SAMPLE_RATE), añade la
+    pausa de cada uno como ceros y codifica todo con una sola llamada a ffmpeg.
+
+    Los segmentos que no existen o que, pasados a WAV mono de 16 bits, no
+    superan SEGMENT_MIN_BYTES se descartan (su pausa se mantiene).
+    """
+    parts: list[tuple] = []
+    for seg, wav in zip(segments, seg_wavs):
+        samples = audio_assembly.decode_to_mono(wav, SAMPLE_RATE) if wav.exists() else None
+        if samples is None or audio_assembly.WAV_HEADER_BYTES + samples.size * 2 <= SEGMENT_MIN_BYTES:
+            logger.warning(f"Segmento vacío descartado: {wav.name}")
+            samples = audio_assembly.EMPTY
+        parts.append((samples, float(seg["pause"])))
+
+    if not any(samples.size for samples, _ in parts):
         raise RuntimeError("No hay fragmentos válidos para concatenar.")
 
-    with tempfile.NamedTemporaryFile("w", delete=False, suffix=".txt", encoding="utf-8") as lst:
-        for w in valid:
-            lst.write(f"file '{w.as_posix()}'\n")
-        lst_path = lst.name.replace("\\", "/")
-
-    cmd = [
-        "ffmpeg","-y",
-        "-f","concat","-safe","0",
-        "-i", lst_path,
-        "-ar", str(SAMPLE_RATE), "-ac","1",
-        "-af","loudnorm,highpass=f=120,lowpass=f=9000",
-        "-c:a","libmp3lame","-b:a", BITRATE,
-        str(out_mp3)
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        print("❌ FFmpeg:", result.stderr[:800])
-        raise RuntimeError("Fallo en la concatenación de audio.")
+    pcm = audio_assembly.assemble(parts, SAMPLE_RATE)
+    audio_assembly.encode_mp3(pcm, out_mp3, SAMPLE_RATE, BITRATE)
 
 
 # ========= 5) Construcción del audio =========
 
-def build_audio_from_marked_text(marked_text: str, base_dir: Path | None = None) -> str:
+def render_exercise_audio(
+    marked_text: str,
+    chunk_dir: str,
+    previous_manifest: list[dict] | None = None,
+    base_dir: Path | None = None,
+) -> tuple[str, list[dict]]:
     """
-    Genera el mp3 a partir del guion marcado con [REP].
+    Genera el mp3 reutilizando los fragmentos ya renderizados del ejercicio.
 
-    Ahora:
-    - Genera el audio en una carpeta temporal dentro de media/exercises.
-    - Guarda el MP3 final en media.
-    - Devuelve la ruta relativa (ej: "exercises/tts_build_YYYYMMDD_HHMMSS/exercise_....mp3").
+    - `chunk_dir` es la carpeta (relativa a media) donde viven los WAV del ejercicio.
+    - `previous_manifest` es el manifiesto de la versión anterior:
+      [{"type", "text_hash", "pause", "chunk_path"}, ...].
+    - Solo se sintetizan los segmentos cuyo hash de texto no estaba en el manifiesto;
+      un cambio de pausa nunca llama a TTS (la pausa se aplica al ensamblar).
+
+    Devuelve (ruta relativa del mp3, manifiesto nuevo). El mp3 se guarda junto a
+    `chunk_dir` y los WAV que ya no se usan se borran.
     """
     if base_dir is None:
         base_dir = Path.cwd()
+    media_root = base_dir / "media"
 
     logger.info(f"Iniciando generación de audio desde texto marcado ({len(marked_text)} caracteres)")
     segments = split_into_segments(marked_text)
     logger.info(f"Texto dividido en {len(segments)} segmentos")
 
-    ts = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    chunks = media_root / chunk_dir
+    chunks.mkdir(parents=True, exist_ok=True)
+
+    reusable = {
+        entry["text_hash"]: entry["chunk_path"]
+        for entry in (previous_manifest or [])
+        if (media_root / entry["chunk_path"]).exists()
+    }
+
+    manifest: list[dict] = []
+    to_render: dict[str, tuple[str, Path]] = {}
+    for seg in segments:
+        text_hash = tts_segment_key(seg["text"])
+        chunk_path = reusable.get(text_hash)
+        if chunk_path is None:
+            chunk_path = f"{chunk_dir}/{text_hash}.wav"
+            # un mismo texto repetido en el guion se sintetiza una sola vez
+            to_render.setdefault(text_hash, (seg["text"], media_root / chunk_path))
+        manifest.append({
+            "type": seg["type"],
+            "text_hash": text_hash,
+            "pause": seg["pause"],
+            "chunk_path": chunk_path,
+        })
 
-    # Carpeta de trabajo local temporal (sigue siendo media/exercises)
-    media_dir = base_dir / "media" / "exercises"
-    media_dir.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Segmentos a sintetizar: {len(to_render)} de {len(segments)} (resto reutilizado)")
 
-    workdir = media_dir / f"tts_build_{ts}"
-    tmp = workdir / "tmp"
-    tmp.mkdir(parents=True, exist_ok=True)
+    # TTS concurrente solo de lo nuevo
+    synthesize_segments(list(to_render.values()))
 
-    chain: list[Path] = []
+    # Pausas y normalización en memoria; ffmpeg solo para loudnorm + MP3
+    ts = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    out_rel = f"{chunk_dir.rsplit('/', 1)[0]}/exercise_{ts}_{uuid.uuid4().hex[:8]}.mp3"
+    assemble_to_mp3(
+        segments,
+        [media_root / entry["chunk_path"] for entry in manifest],
+        media_root / out_rel,
+    )
 
-    for i, seg in enumerate(segments, start=1):
-        seg_wav = tmp / f"seg_{i:03d}.wav"
-        tts_to_wav(seg['text'], seg_wav)
-        chain.append(seg_wav)
+    # Borrar fragmentos de esta carpeta que ya no forman parte del guion
+    in_use = {entry["chunk_path"] for entry in manifest}
+    for wav in chunks.glob("*.wav"):
+        if f"{chunk_dir}/{wav.name}" not in in_use:
+            wav.unlink(missing_ok=True)
 
-        pause = max(0.0, float(seg['pause']))
-        if pause > 0:
-            sil = tmp / f"sil_{i:03d}.wav"
-            gen_silence(pause, sil)
-            chain.append(sil)
+    logger.info(f"Audio generado y guardado en media: {out_rel}")
+    if tts_cache is not None:
+        logger.info(f"Caché TTS: {tts_cache.stats()}")
+    return out_rel, manifest
 
-    # normalizar a wav mono
-    norm: list[Path] = []
-    for i, wav in enumerate(chain):
-        n = tmp / f"n_{i:03d}.wav"
-        ensure_wav(wav, n)
-        norm.append(n)
 
-    out_mp3 = workdir / f"exercise_{ts}_marcado_con_pausas.mp3"
-    concat_to_mp3(norm, out_mp3)
+def build_audio_from_marked_text(marked_text: str, base_dir: Path | None = None) -> str:
+    """
+    Genera el mp3 a partir del guion marcado con [REP], sin manifiesto previo.
+
+    - Genera el audio en una carpeta temporal dentro de media/exercises.
+    - Guarda el MP3 final en media.
+    - Devuelve la ruta relativa (ej: "exercises/tts_build_YYYYMMDD_HHMMSS_xxxxxx/exercise_....mp3").
+    """
+    if base_dir is None:
+        base_dir = Path.cwd()
+
+    ts = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    build_dir = f"exercises/tts_build_{ts}_{uuid.uuid4().hex[:6]}"
+    relative_path, _ = render_exercise_audio(marked_text, f"{build_dir}/tmp", base_dir=base_dir)
 
     # Limpiar temporales (wav) pero conservar el mp3 final
+    tmp = base_dir / "media" / build_dir / "tmp"
     try:
         shutil.rmtree(tmp)
     except Exception as e:
         logger.warning(f"No se pudo borrar carpeta temporal {tmp}: {e}")
 
-    relative_path = f"exercises/tts_build_{ts}/{out_mp3.name}"
-    logger.info(f"Audio generado y guardado en media: {relative_path}")
     return relative_path
@@ -0,0 +1,199 @@
+"""
+Proveedores de IA (generación de texto y síntesis de voz).
+
+`ai_exercises` solo habla con la interfaz `AIProvider`; la implementación se
+elige con AI_PROVIDER:
+  - openai (por defecto): API de OpenAI.
+  - local: respuestas deterministas sin red (guiones con [REP] de plantilla y
+    tonos WAV sintéticos), con latencia y tasa de error configurables.
+    Pensado para pruebas de carga sin coste.
+"""
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator
+import hashlib
+import logging
+import os
+import random
+import re
+import threading
+import time
+import wave
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class AIProviderError(RuntimeError):
+    """Fallo (simulado o real) del proveedor de IA."""
+
+
+class AIProvider(ABC):
+    """Interfaz común de los proveedores."""
+
+    name = "base"
+
+    @abstractmethod
+    def complete(self, model: str, messages: list[dict], temperature: float, max_tokens: int) -> str:
+        """Respuesta completa del chat."""
+
+    @abstractmethod
+    def stream(self, model: str, messages: list[dict], temperature: float, max_tokens: int) -> Iterator[str]:
+        """Respuesta del chat en fragmentos de texto."""
+
+    @abstractmethod
+    def synthesize_wav(self, text: str, out_wav: Path, model: str, voice: str, instructions: str, sample_rate: int):
+        """Sintetiza `text` y lo guarda como WAV en `out_wav`."""
+
+
+class OpenAIProvider(AIProvider):
+    name = "openai"
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # El cliente se crea al primer uso: importar el módulo no exige credenciales
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI()
+        return self._client
+
+    def complete(self, model, messages, temperature, max_tokens):
+        r = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        return r.choices[0].message.content.strip()
+
+    def stream(self, model, messages, temperature, max_tokens):
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            stream.close()
+
+    def synthesize_wav(self, text, out_wav, model, voice, instructions, sample_rate):
+        with self.client.audio.speech.with_streaming_response.create(
+            model=model,
+            voice=voice,
+            input=text,
+            response_format="wav",
+            instructions=instructions,
+        ) as resp:
+            resp.stream_to_file(str(out_wav))
+
+
+class LocalProvider(AIProvider):
+    """
+    Proveedor local determinista. Misma entrada -> mismo guion y mismo audio.
+    - LOCAL_AI_LATENCY_MS: latencia simulada por llamada (texto y TTS).
+    - LOCAL_AI_TOKEN_DELAY_MS: espera entre fragmentos en streaming.
+    - LOCAL_AI_ERROR_RATE: probabilidad (0-1) de fallar cada llamada.
+    - LOCAL_AI_SEED: semilla de la secuencia de errores simulados.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        token_delay_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency_s = max(0.0, latency_ms) / 1000
+        self.token_delay_s = max(0.0, token_delay_ms) / 1000
+        self.error_rate = min(max(error_rate, 0.0), 1.0)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _simulate_call(self, what: str):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        with self._lock:
+            failed = self._rng.random() < self.error_rate
+        if failed:
+            raise AIProviderError(f"Fallo simulado del proveedor local ({what})")
+
+    @staticmethod
+    def _script(messages: list[dict]) -> str:
+        prompt = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        prompt = prompt.split("Requisitos del ejercicio:")[-1]  # ignora el perfil si lo hay
+        words = [w for w in re.findall(r"\w+", prompt.lower()) if len(w) > 3][:6] or ["sol", "casa", "mesa"]
+        lines = [
+            "¡Hola! Hoy vamos a practicar algunas palabras juntos.",
+            "Escucha con atención y repite después de mí. Si necesitas más tiempo, puedes pausar el audio.",
+            "",
+        ]
+        for word in words:
+            lines.append(f"[REP]{word}[/REP]")
+        lines += [
+            "",
+            f"Ahora una frase completa: [REP 2.0]Me gusta decir {words[0]}.[/REP]",
+            "",
+            "¡Muy bien! Hasta la próxima.",
+        ]
+        return "\n".join(lines)
+
+    def complete(self, model, messages, temperature, max_tokens):
+        self._simulate_call("chat")
+        return self._script(messages)
+
+    def stream(self, model, messages, temperature, max_tokens):
+        self._simulate_call("chat")
+        for piece in re.findall(r"\S+\s*|\s+", self._script(messages)):
+            if self.token_delay_s:
+                time.sleep(self.token_delay_s)
+            yield piece
+
+    def synthesize_wav(self, text, out_wav, model, voice, instructions, sample_rate):
+        self._simulate_call("tts")
+        digest = hashlib.sha256(f"{voice}\x00{text}".encode("utf-8")).digest()
+        freq = 180 + digest[0] * 2  # 180-690 Hz según el texto
+        duration = min(max(0.3, 0.06 * len(text)), 20.0)
+
+        t = np.arange(int(duration * sample_rate), dtype=np.float32) / sample_rate
+        fade = np.minimum(1.0, np.minimum(t, duration - t) / 0.02)  # evita clics al inicio/fin
+        tone = 0.3 * np.sin(2 * np.pi * freq * t) * fade
+
+        with wave.open(str(out_wav), "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(sample_rate)
+            wf.writeframes((tone * 32767).astype("<i2").tobytes())
+
+
+def get_provider() -> AIProvider:
+    """Instancia el proveedor configurado en AI_PROVIDER."""
+    name = os.getenv("AI_PROVIDER", "openai").strip().lower()
+    if name == "local":
+        logger.warning("AI_PROVIDER=local: usando respuestas sintéticas (sin OpenAI)")
+        return LocalProvider(
+            latency_ms=float(os.getenv("LOCAL_AI_LATENCY_MS", "0")),
+            token_delay_ms=float(os.getenv("LOCAL_AI_TOKEN_DELAY_MS", "0")),
+            error_rate=float(os.getenv("LOCAL_AI_ERROR_RATE", "0")),
+            seed=int(os.getenv("LOCAL_AI_SEED", "0")),
+        )
+    if name != "openai":
+        raise ValueError(f"AI_PROVIDER desconocido: {name!r} (usa 'openai' o 'local')")
+    return OpenAIProvider()
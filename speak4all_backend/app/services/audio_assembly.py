@@ -0,0 +1,161 @@
+"""Ensamblado de audio en memoria (PCM con NumPy) y codificación final con una sola llamada a ffmpeg."""
+
+from pathlib import Path
+import logging
+import struct
+import subprocess
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_IEEE_FLOAT = 0x0003
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+WAV_HEADER_BYTES = 44  # cabecera RIFF mínima de un WAV PCM
+EMPTY = np.zeros(0, dtype=np.float32)
+
+
+def _parse_wav(data: bytes) -> tuple[np.ndarray, int] | None:
+    """
+    Decodifica un WAV PCM/float a float32 con forma (frames, canales).
+    Tolera cabeceras de WAV en streaming (tamaño del chunk data a 0 o 0xFFFFFFFF).
+    Devuelve None si el formato no está soportado.
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+
+    fmt = None
+    pcm = None
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size = struct.unpack_from("<I", data, pos + 4)[0]
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            fmt_tag, channels, rate = struct.unpack_from("<HHI", data, body)
+            bits = struct.unpack_from("<H", data, body + 14)[0]
+            if fmt_tag == _WAVE_FORMAT_EXTENSIBLE and size >= 40:
+                fmt_tag = struct.unpack_from("<H", data, body + 24)[0]
+            fmt = (fmt_tag, channels, rate, bits)
+        elif chunk_id == b"data":
+            end = body + size
+            if size in (0, 0xFFFFFFFF) or end > len(data):
+                end = len(data)
+            pcm = data[body:end]
+            break
+        pos = body + size + (size & 1)
+
+    if fmt is None or pcm is None:
+        return None
+
+    fmt_tag, channels, rate, bits = fmt
+    if channels < 1 or bits < 8 or bits % 8:
+        return None
+    width = bits // 8
+    usable = len(pcm) - len(pcm) % (width * channels)
+    pcm = pcm[:usable]
+
+    if fmt_tag == _WAVE_FORMAT_PCM and bits == 8:
+        samples = (np.frombuffer(pcm, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif fmt_tag == _WAVE_FORMAT_PCM and bits == 16:
+        samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+    elif fmt_tag == _WAVE_FORMAT_PCM and bits == 24:
+        raw = np.frombuffer(pcm, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        samples = ints.astype(np.float32) / 8388608.0
+    elif fmt_tag == _WAVE_FORMAT_PCM and bits == 32:
+        samples = np.frombuffer(pcm, dtype="<i4").astype(np.float32) / 2147483648.0
+    elif fmt_tag == _WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        samples = np.frombuffer(pcm, dtype="<f4").astype(np.float32)
+    elif fmt_tag == _WAVE_FORMAT_IEEE_FLOAT and bits == 64:
+        samples = np.frombuffer(pcm, dtype="<f8").astype(np.float32)
+    else:
+        return None
+
+    return samples.reshape(-1, channels), rate
+
+
+def _ffmpeg_decode(path: Path, sample_rate: int) -> np.ndarray:
+    """Fallback para formatos que no sabemos leer: ffmpeg -> float32 mono por stdout."""
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-i", str(path),
+        "-f", "f32le", "-ac", "1", "-ar", str(sample_rate),
+        "pipe:1",
+    ]
+    result = subprocess.run(cmd, capture_output=True, check=True)
+    return np.frombuffer(result.stdout, dtype="<f4").copy()
+
+
+def resample(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Remuestreo por interpolación lineal (suficiente para voz TTS)."""
+    if src_rate == dst_rate or samples.size == 0:
+        return samples
+    n_out = int(round(samples.size * dst_rate / src_rate))
+    src_t = np.arange(samples.size, dtype=np.float64) / src_rate
+    dst_t = np.arange(n_out, dtype=np.float64) / dst_rate
+    return np.interp(dst_t, src_t, samples).astype(np.float32)
+
+
+def decode_to_mono(path: Path, sample_rate: int) -> np.ndarray:
+    """
+    Lee un fichero de audio como float32 mono a `sample_rate`.
+    Los WAV se decodifican en proceso; el resto pasa por ffmpeg.
+    """
+    parsed = _parse_wav(path.read_bytes())
+    if parsed is None:
+        logger.debug(f"{path.name}: formato no soportado en proceso, usando ffmpeg")
+        return _ffmpeg_decode(path, sample_rate)
+
+    frames, rate = parsed
+    mono = frames.mean(axis=1, dtype=np.float32) if frames.shape[1] > 1 else frames[:, 0]
+    return resample(mono, rate, sample_rate)
+
+
+def assemble(parts: list[tuple[np.ndarray, float]], sample_rate: int) -> np.ndarray:
+    """
+    Une (muestras, pausa_en_segundos) en un único buffer preasignado.
+    La pausa se deja como ceros tras cada fragmento.
+    """
+    pause_lens = [int(round(max(0.0, pause) * sample_rate)) for _, pause in parts]
+    total = sum(samples.size for samples, _ in parts) + sum(pause_lens)
+
+    out = np.zeros(total, dtype=np.float32)
+    pos = 0
+    for (samples, _), pause_len in zip(parts, pause_lens):
+        out[pos:pos + samples.size] = samples
+        pos += samples.size + pause_len
+    return out
+
+
+def encode_mp3(
+    samples: np.ndarray,
+    out_mp3: Path,
+    sample_rate: int,
+    bitrate: str,
+    filters: str = "loudnorm,highpass=f=120,lowpass=f=9000",
+):
+    """Normaliza y codifica a MP3 con una única invocación de ffmpeg (PCM por stdin)."""
+    if samples.size == 0:
+        raise RuntimeError("No hay audio para codificar.")
+
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "f32le", "-ar", str(sample_rate), "-ac", "1",
+        "-i", "pipe:0",
+        "-af", filters,
+        "-ar", str(sample_rate), "-ac", "1",
+        "-c:a", "libmp3lame", "-b:a", bitrate,
+        str(out_mp3),
+    ]
+    result = subprocess.run(
+        cmd,
+        input=np.ascontiguousarray(samples, dtype="<f4").tobytes(),
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        logger.error(f"FFmpeg: {result.stderr[:800].decode('utf-8', 'replace')}")
+        raise RuntimeError("Fallo en la codificación de audio.")
@@ -0,0 +1,233 @@
+"""
+Cola de trabajos de generación de audio respaldada por la tabla audio_build_jobs.
+
+Cada réplica de la API arranca `settings.audio_job_workers` bucles que reclaman
+trabajos con SELECT ... FOR UPDATE SKIP LOCKED, generan el MP3 fuera de la
+transacción y avisan al terapeuta por WebSocket al terminar. Cuando no hay
+trabajos de audio pendientes, los mismos bucles ejecutan elementos de los
+lotes de ejercicios (ver exercise_batches).
+"""
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import asyncio
+import logging
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, aliased
+
+from .. import models
+from ..config import settings
+from ..database import SessionLocal
+from ..websocket_manager import manager
+from . import ai_exercises, exercise_batches, storage
+
+logger = logging.getLogger(__name__)
+
+_worker_tasks: list[asyncio.Task] = []
+_stop_event: asyncio.Event | None = None
+
+
+def exercise_chunk_dir(exercise_id: int) -> str:
+    """Carpeta (relativa a media) con los fragmentos WAV renderizados del ejercicio."""
+    return f"exercises/ex_{exercise_id}/chunks"
+
+
+def enqueue_audio_build(db: Session, exercise: models.Exercise, marked_text: str) -> models.AudioBuildJob:
+    """
+    Marca el audio del ejercicio como pendiente y encola el trabajo.
+    Los trabajos aún no reclamados del mismo ejercicio quedan reemplazados.
+    No hace commit: el llamador lo confirma junto con el ejercicio.
+    """
+    if exercise.id is not None:
+        db.query(models.AudioBuildJob).filter(
+            models.AudioBuildJob.exercise_id == exercise.id,
+            models.AudioBuildJob.status == models.AudioJobStatus.PENDING,
+        ).delete(synchronize_session=False)
+
+    exercise.audio_status = models.AudioStatus.PENDING
+    job = models.AudioBuildJob(
+        exercise=exercise,
+        marked_text=marked_text,
+        status=models.AudioJobStatus.PENDING,
+        attempts=0,
+    )
+    db.add(job)
+    return job
+
+
+def claim_next_job(db: Session) -> models.AudioBuildJob | None:
+    """
+    Reclama el trabajo pendiente más antiguo (o uno RUNNING abandonado) sin
+    bloquear a otras réplicas, y lo marca como RUNNING.
+    """
+    now = datetime.now(timezone.utc)
+    stale_before = now - timedelta(seconds=settings.audio_job_timeout_s)
+
+    # No reclamar un ejercicio que otro worker está renderizando (comparten carpeta de fragmentos)
+    running = aliased(models.AudioBuildJob)
+    busy_exercise = db.query(running.id).filter(
+        running.exercise_id == models.AudioBuildJob.exercise_id,
+        running.id != models.AudioBuildJob.id,
+        running.status == models.AudioJobStatus.RUNNING,
+        running.locked_at >= stale_before,
+    ).exists()
+
+    job = db.query(models.AudioBuildJob).filter(
+        or_(
+            models.AudioBuildJob.status == models.AudioJobStatus.PENDING,
+            and_(
+                models.AudioBuildJob.status == models.AudioJobStatus.RUNNING,
+                models.AudioBuildJob.locked_at < stale_before,
+            ),
+        ),
+        ~busy_exercise,
+    ).order_by(
+        models.AudioBuildJob.created_at.asc()
+    ).with_for_update(skip_locked=True).first()
+
+    if not job:
+        db.rollback()
+        return None
+
+    job.status = models.AudioJobStatus.RUNNING
+    job.locked_at = now
+    job.attempts += 1
+    job.updated_at = now
+    db.commit()
+    return job
+
+
+def _process_one() -> dict | None:
+    """
+    Reclama y ejecuta un trabajo. Devuelve el evento a notificar al terapeuta
+    (o None si no había trabajo o si se reintentará más tarde).
+    """
+    db = SessionLocal()
+    try:
+        job = claim_next_job(db)
+        if not job:
+            return None
+
+        job_id, exercise_id, marked_text = job.id, job.exercise_id, job.marked_text
+        previous_manifest = job.exercise.audio_manifest
+        logger.info(f"Job de audio {job_id} reclamado para ejercicio {exercise_id} (intento {job.attempts})")
+        db.commit()  # no mantener la transacción abierta durante el render
+
+        try:
+            audio_rel_path, manifest = ai_exercises.render_exercise_audio(
+                marked_text,
+                exercise_chunk_dir(exercise_id),
+                previous_manifest=previous_manifest,
+                base_dir=Path.cwd(),
+            )
+        except Exception as e:
+            logger.error(f"Job de audio {job_id} falló: {e}", exc_info=True)
+            db.rollback()
+            job = db.get(models.AudioBuildJob, job_id)
+            exercise = db.get(models.Exercise, exercise_id)
+            job.error = str(e)[:2000]
+            job.updated_at = datetime.now(timezone.utc)
+
+            if job.attempts < settings.audio_job_max_attempts:
+                job.status = models.AudioJobStatus.PENDING
+                job.locked_at = None
+                db.commit()
+                return None
+
+            job.status = models.AudioJobStatus.FAILED
+            exercise.audio_status = models.AudioStatus.FAILED
+            db.commit()
+            return {
+                "therapist_id": exercise.therapist_id,
+                "exercise_id": exercise.id,
+                "audio_status": exercise.audio_status.value,
+                "audio_path": exercise.audio_path,
+                "error": job.error,
+            }
+
+        job = db.get(models.AudioBuildJob, job_id)
+        exercise = db.get(models.Exercise, exercise_id)
+        now = datetime.now(timezone.utc)
+        job.status = models.AudioJobStatus.DONE
+        job.error = None
+        job.updated_at = now
+
+        previous_audio = exercise.audio_path
+        exercise.audio_path = audio_rel_path
+        exercise.audio_manifest = manifest
+        exercise.updated_at = now
+
+        # Si el guion se editó mientras renderizábamos, sigue pendiente hasta el siguiente job
+        newer_pending = db.query(models.AudioBuildJob.id).filter(
+            models.AudioBuildJob.exercise_id == exercise_id,
+            models.AudioBuildJob.status == models.AudioJobStatus.PENDING,
+        ).first()
+        if not newer_pending:
+            exercise.audio_status = models.AudioStatus.READY
+        db.commit()
+        logger.info(f"Job de audio {job_id} completado: {audio_rel_path}")
+
+        if previous_audio and previous_audio != audio_rel_path:
+            try:
+                storage.delete_blob(previous_audio)
+            except Exception as e:
+                logger.warning(f"No se pudo borrar el audio anterior {previous_audio}: {e}")
+
+        if newer_pending:
+            return None
+
+        return {
+            "therapist_id": exercise.therapist_id,
+            "exercise_id": exercise.id,
+            "audio_status": exercise.audio_status.value,
+            "audio_path": exercise.audio_path,
+            "error": None,
+        }
+    finally:
+        db.close()
+
+
+async def _worker_loop(worker_no: int, stop_event: asyncio.Event):
+    logger.info(f"Worker de audio {worker_no} iniciado")
+    loop = asyncio.get_running_loop()
+    while not stop_event.is_set():
+        batch_work = False
+        try:
+            event = await asyncio.to_thread(_process_one)
+            if event is None:
+                batch_work = await asyncio.to_thread(exercise_batches.process_next_item, loop)
+        except Exception as e:
+            logger.error(f"Error en worker de audio {worker_no}: {e}", exc_info=True)
+            event = None
+
+        if event:
+            therapist_id = event.pop("therapist_id")
+            await manager.broadcast_exercise_audio_ready(therapist_id, event)
+            continue  # puede haber más trabajo en cola
+        if batch_work:
+            continue
+
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=settings.audio_job_poll_interval_s)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_workers():
+    """Arranca los bucles de trabajo en el event loop actual."""
+    global _stop_event
+    if settings.audio_job_workers <= 0 or _worker_tasks:
+        return
+    _stop_event = asyncio.Event()
+    for n in range(settings.audio_job_workers):
+        _worker_tasks.append(asyncio.create_task(_worker_loop(n, _stop_event)))
+
+
+async def stop_workers():
+    """Detiene los bucles; el trabajo en curso termina antes de salir."""
+    if _stop_event is not None:
+        _stop_event.set()
+    if _worker_tasks:
+        await asyncio.gather(*_worker_tasks, return_exceptions=True)
+        _worker_tasks.clear()
@@ -0,0 +1,157 @@
+"""
+Estadísticas por criterio de rúbrica para un curso (Pronunciación, Fluidez...).
+
+Los criterios se agrupan por nombre: cada ejercicio tiene su propia rúbrica,
+pero "Pronunciación" de un ejercicio y de otro se comparan juntos. Los puntos
+se normalizan a % del máximo del criterio para poder compararlos.
+
+El resultado se cachea por curso; las escrituras de evaluaciones llaman a
+`invalidate_course`. El TTL cubre a las demás réplicas de la API.
+"""
+
+from datetime import datetime, timezone
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import models
+
+CACHE_TTL_S = 300
+HISTOGRAM_EDGES = np.linspace(0.0, 100.0, 11)  # 10 tramos de 10%
+PERCENTILES = (10, 25, 75, 90)
+_WEEK_S = 7 * 24 * 3600
+# Los trends se agrupan en semanas que empiezan en lunes (1970-01-05 fue lunes)
+_MONDAY_OFFSET_S = 4 * 24 * 3600
+
+_cache: dict[int, tuple[float, dict]] = {}
+_generations: dict[int, int] = {}  # evita guardar un cálculo que empezó antes de invalidar
+_lock = threading.Lock()
+
+
+def invalidate_course(course_id: int | None):
+    if course_id is None:
+        return
+    with _lock:
+        _cache.pop(course_id, None)
+        _generations[course_id] = _generations.get(course_id, 0) + 1
+
+
+def _load_scores(db: Session, course_id: int):
+    """Todos los puntajes por criterio del curso en una sola consulta."""
+    return db.execute(
+        select(
+            models.RubricCriteria.name,
+            models.RubricCriteria.max_points,
+            models.EvaluationCriterionScore.points_awarded,
+            models.Evaluation.created_at,
+        ).join(
+            models.Evaluation, models.Evaluation.id == models.EvaluationCriterionScore.evaluation_id
+        ).join(
+            models.Submission, models.Submission.id == models.Evaluation.submission_id
+        ).join(
+            models.CourseExercise, models.CourseExercise.id == models.Submission.course_exercise_id
+        ).join(
+            models.RubricCriteria, models.RubricCriteria.id == models.EvaluationCriterionScore.rubric_criteria_id
+        ).where(
+            models.CourseExercise.course_id == course_id,
+            models.CourseExercise.is_deleted.is_(False),
+            models.Evaluation.is_deleted.is_(False),
+        )
+    ).all()
+
+
+def _compute(course_id: int, rows) -> dict:
+    result = {
+        "course_id": course_id,
+        "total_scores": len(rows),
+        "histogram_edges": HISTOGRAM_EDGES.tolist(),
+        "criteria": [],
+    }
+    if not rows:
+        return result
+
+    names = np.array([r.name.strip() for r in rows], dtype=object)
+    max_points = np.array([r.max_points for r in rows], dtype=np.float64)
+    points = np.array([r.points_awarded for r in rows], dtype=np.float64)
+    timestamps = np.array(
+        [(r.created_at or datetime.now(timezone.utc)).timestamp() for r in rows],
+        dtype=np.float64,
+    )
+
+    valid = max_points > 0
+    percent = np.where(valid, points / np.where(valid, max_points, 1) * 100, np.nan)
+    weeks = ((timestamps - _MONDAY_OFFSET_S) // _WEEK_S).astype(np.int64)
+
+    labels, group = np.unique(names, return_inverse=True)
+    n_groups = len(labels)
+
+    counts = np.bincount(group, minlength=n_groups)
+    mean_points = np.bincount(group, weights=points, minlength=n_groups) / counts
+
+    # Orden por (criterio, %) para medianas/percentiles por grupo sin bucles sobre filas
+    order = np.lexsort((percent, group))
+    sorted_pct = percent[order]
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+
+    # Histograma 2D criterio × tramo
+    bins = np.clip(np.digitize(np.nan_to_num(percent, nan=0.0), HISTOGRAM_EDGES[1:-1]), 0, len(HISTOGRAM_EDGES) - 2)
+    hist = np.zeros((n_groups, len(HISTOGRAM_EDGES) - 1), dtype=np.int64)
+    np.add.at(hist, (group[valid], bins[valid]), 1)
+
+    # Tendencia semanal: media por (criterio, semana)
+    week_labels, week_idx = np.unique(weeks, return_inverse=True)
+    cell = group * len(week_labels) + week_idx
+    cell_count = np.bincount(cell[valid], minlength=n_groups * len(week_labels)).reshape(n_groups, -1)
+    cell_sum = np.bincount(cell[valid], weights=percent[valid], minlength=n_groups * len(week_labels)).reshape(n_groups, -1)
+
+    for g, label in enumerate(labels):
+        pct = sorted_pct[bounds[g]:bounds[g + 1]]
+        pct = pct[~np.isnan(pct)]
+        stats = {
+            "criterion_name": label,
+            "count": int(counts[g]),
+            "mean_points": round(float(mean_points[g]), 2),
+            "mean": None,
+            "median": None,
+            "std": None,
+            "percentiles": {},
+            "histogram": hist[g].tolist(),
+            "trend": [],
+        }
+        if pct.size:
+            stats["mean"] = round(float(pct.mean()), 2)
+            stats["median"] = round(float(np.median(pct)), 2)
+            stats["std"] = round(float(pct.std()), 2)
+            stats["percentiles"] = {
+                f"p{p}": round(float(v), 2)
+                for p, v in zip(PERCENTILES, np.percentile(pct, PERCENTILES))
+            }
+        for w in np.nonzero(cell_count[g])[0]:
+            week_start = datetime.fromtimestamp(int(week_labels[w]) * _WEEK_S + _MONDAY_OFFSET_S, tz=timezone.utc)
+            stats["trend"].append({
+                "week_start": week_start.date(),
+                "count": int(cell_count[g, w]),
+                "mean": round(float(cell_sum[g, w] / cell_count[g, w]), 2),
+            })
+        result["criteria"].append(stats)
+
+    result["criteria"].sort(key=lambda c: -c["count"])
+    return result
+
+
+def course_criteria_analytics(db: Session, course_id: int) -> dict:
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(course_id)
+        if cached and cached[0] > now:
+            return cached[1]
+        generation = _generations.get(course_id, 0)
+
+    result = _compute(course_id, _load_scores(db, course_id))
+    with _lock:
+        if _generations.get(course_id, 0) == generation:
+            _cache[course_id] = (now + CACHE_TTL_S, result)
+    return result
@@ -0,0 +1,343 @@
+"""
+Generación de ejercicios por lotes.
+
+El lote y sus elementos se guardan en exercise_batches / exercise_batch_items.
+Cada elemento pasa por: generar guion con IA -> renderizar audio, y lo ejecuta
+cualquiera de los workers de audio_jobs (de cualquier réplica), que lo
+reclaman con SELECT ... FOR UPDATE SKIP LOCKED cuando no tienen
+audio_build_jobs pendientes.
+
+Entre todas las réplicas se ejecutan como mucho
+`settings.exercise_batch_concurrency` elementos a la vez: el recuento de
+elementos en curso y el reclamo se hacen bajo un advisory lock de Postgres.
+El progreso se notifica al terapeuta por WebSocket; al terminar el último
+elemento, los ejercicios correctos se insertan en una única transacción.
+"""
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import asyncio
+import logging
+import shutil
+import uuid
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..config import settings
+from ..database import SessionLocal
+from ..websocket_manager import manager
+from . import ai_exercises
+
+logger = logging.getLogger(__name__)
+
+CLAIM_LOCK_KEY = 0x5EA4B47C  # pg_advisory_xact_lock que serializa los reclamos
+NOTIFY_TIMEOUT_S = 5
+
+Item = models.ExerciseBatchItem
+ItemStatus = models.ExerciseBatchItemStatus
+ACTIVE = (ItemStatus.GENERATING, ItemStatus.RENDERING)
+FINISHED = (ItemStatus.DONE, ItemStatus.FAILED)
+
+
+def batch_dir(batch_id: str) -> str:
+    """Carpeta (relativa a media) con el audio de todos los elementos del lote."""
+    return f"exercises/batch_{batch_id}"
+
+
+def item_dir(batch_id: str, index: int) -> str:
+    """Carpeta (relativa a media) con el audio renderizado de un elemento."""
+    return f"{batch_dir(batch_id)}/item_{index}"
+
+
+def item_chunk_dir(batch_id: str, index: int) -> str:
+    """Fragmentos WAV del elemento; al guardar pasan a la carpeta del ejercicio."""
+    return f"{item_dir(batch_id, index)}/chunks"
+
+
+def _remove_dir(relative_dir: str):
+    shutil.rmtree(Path.cwd() / "media" / relative_dir, ignore_errors=True)
+
+
+def create_batch(db: Session, therapist_id: int, folder_id: int | None, items: list[dict]) -> models.ExerciseBatch:
+    """
+    Crea el lote con sus elementos en cola (`items`: name, prompt, profile_id).
+    No hace commit: los workers lo ven cuando el llamador lo confirma.
+    """
+    batch = models.ExerciseBatch(
+        id=uuid.uuid4().hex,
+        therapist_id=therapist_id,
+        folder_id=folder_id,
+        status=models.ExerciseBatchStatus.RUNNING,
+    )
+    batch.items = [
+        Item(index=i, status=ItemStatus.QUEUED, attempts=0, **item)
+        for i, item in enumerate(items)
+    ]
+    db.add(batch)
+    return batch
+
+
+def get_batch(db: Session, batch_id: str) -> models.ExerciseBatch | None:
+    return db.get(models.ExerciseBatch, batch_id)
+
+
+def _item_to_dict(item: models.ExerciseBatchItem) -> dict:
+    return {
+        "index": item.index,
+        "name": item.name,
+        "prompt": item.prompt,
+        "profile_id": item.profile_id,
+        "status": item.status.value,
+        "error": item.error,
+        "exercise_id": item.exercise_id,
+    }
+
+
+def batch_to_dict(batch: models.ExerciseBatch) -> dict:
+    items = batch.items
+    return {
+        "batch_id": batch.id,
+        "status": batch.status.value,
+        "total": len(items),
+        "done": sum(1 for item in items if item.status == ItemStatus.DONE),
+        "failed": sum(1 for item in items if item.status == ItemStatus.FAILED),
+        "created_at": batch.created_at,
+        "finished_at": batch.finished_at,
+        "items": [_item_to_dict(item) for item in items],
+    }
+
+
+def _notify(loop: asyncio.AbstractEventLoop, db: Session, item_id: int):
+    """Envía el progreso del lote al terapeuta desde el hilo del worker."""
+    item = db.get(Item, item_id)
+    batch = item.batch
+    counts = dict(
+        db.query(Item.status, func.count(Item.id))
+        .filter(Item.batch_id == batch.id)
+        .group_by(Item.status)
+        .all()
+    )
+    therapist_id = batch.therapist_id
+    message = {
+        "type": "exercise_batch_progress",
+        "data": {
+            "batch_id": batch.id,
+            "status": batch.status.value,
+            "total": sum(counts.values()),
+            "done": counts.get(ItemStatus.DONE, 0),
+            "failed": counts.get(ItemStatus.FAILED, 0),
+            "item": _item_to_dict(item),
+        },
+    }
+    db.commit()  # no dejar la transacción de lectura abierta durante el trabajo
+
+    future = asyncio.run_coroutine_threadsafe(manager.send_to_user(therapist_id, message), loop)
+    try:
+        future.result(timeout=NOTIFY_TIMEOUT_S)
+    except Exception as e:
+        logger.warning(f"No se pudo notificar el progreso del lote {batch.id}: {e}")
+
+
+def claim_next_item(db: Session) -> models.ExerciseBatchItem | None:
+    """
+    Reclama el elemento en cola más antiguo (o uno en curso abandonado) si hay
+    hueco en el límite global de concurrencia, y lo marca como en curso.
+    """
+    now = datetime.now(timezone.utc)
+    stale_before = now - timedelta(seconds=settings.audio_job_timeout_s)
+
+    if db.get_bind().dialect.name == "postgresql":
+        # Sin el lock, dos réplicas podrían contar el mismo hueco libre a la vez
+        db.execute(select(func.pg_advisory_xact_lock(CLAIM_LOCK_KEY)))
+
+    in_flight = db.query(func.count(Item.id)).filter(
+        Item.status.in_(ACTIVE),
+        Item.locked_at >= stale_before,
+    ).scalar()
+    if in_flight >= max(1, settings.exercise_batch_concurrency):
+        db.rollback()
+        return None
+
+    item = db.query(Item).filter(
+        or_(
+            Item.status == ItemStatus.QUEUED,
+            and_(Item.status.in_(ACTIVE), Item.locked_at < stale_before),
+        ),
+    ).order_by(Item.id.asc()).with_for_update(skip_locked=True).first()
+
+    if not item:
+        db.rollback()
+        return None
+
+    # En un reintento el guion ya generado se conserva
+    item.status = ItemStatus.GENERATING if item.marked_text is None else ItemStatus.RENDERING
+    item.locked_at = now
+    item.attempts += 1
+    item.updated_at = now
+    db.commit()
+    return item
+
+
+def _persist(db: Session, batch: models.ExerciseBatch) -> list[tuple[str, str]]:
+    """
+    Añade a la sesión los ejercicios de los elementos correctos del lote.
+    El manifiesto de cada ejercicio apunta ya a su carpeta de fragmentos
+    (la de audio_jobs, para que editar reutilice los WAV); devuelve los
+    traslados (origen, destino) que hay que hacer tras el commit.
+    """
+    from .audio_jobs import exercise_chunk_dir
+
+    now = datetime.now(timezone.utc)
+    ready = [item for item in batch.items if item.status == ItemStatus.DONE]
+    exercises = []
+    for item in ready:
+        exercise = models.Exercise(
+            therapist_id=batch.therapist_id,
+            name=item.name,
+            prompt=item.prompt,
+            text=ai_exercises.strip_rep_tags(item.marked_text),
+            marked_text=item.marked_text,
+            audio_path=item.audio_path,
+            audio_status=models.AudioStatus.READY,
+            folder_id=batch.folder_id,
+            created_at=now,
+            updated_at=now,
+        )
+        db.add(exercise)
+        exercises.append(exercise)
+    db.flush()
+    moves = []
+    for item, exercise in zip(ready, exercises):
+        item.exercise_id = exercise.id
+        source, target = item_chunk_dir(batch.id, item.index), exercise_chunk_dir(exercise.id)
+        exercise.audio_manifest = [
+            {**entry, "chunk_path": entry["chunk_path"].replace(source, target, 1)}
+            for entry in item.audio_manifest or []
+        ]
+        moves.append((source, target))
+    return moves
+
+
+def _move_chunks(moves: list[tuple[str, str]]):
+    """Traslada los fragmentos a la carpeta de cada ejercicio (si falla, editar los vuelve a sintetizar)."""
+    media_root = Path.cwd() / "media"
+    for source, target in moves:
+        try:
+            (media_root / target).parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(media_root / source, media_root / target)
+        except OSError as e:
+            logger.warning(f"No se pudieron mover los fragmentos {source} -> {target}: {e}")
+
+
+def _close_item(db: Session, item_id: int, values: dict) -> models.ExerciseBatch:
+    """Aplica el resultado del elemento con el lote bloqueado (un solo worker lo cierra)."""
+    item = db.get(Item, item_id)
+    batch = db.query(models.ExerciseBatch).filter(
+        models.ExerciseBatch.id == item.batch_id,
+    ).with_for_update().one()
+    for key, value in values.items():
+        setattr(item, key, value)
+    item.updated_at = datetime.now(timezone.utc)
+    db.flush()
+    return batch
+
+
+def _complete_item(loop: asyncio.AbstractEventLoop, db: Session, item_id: int, **values):
+    """Cierra el elemento; si era el último del lote, guarda todos los ejercicios."""
+    batch = _close_item(db, item_id, values)
+    pending = db.query(func.count(Item.id)).filter(
+        Item.batch_id == batch.id,
+        Item.status.notin_(FINISHED),
+    ).scalar()
+    if pending:
+        db.commit()
+        _notify(loop, db, item_id)
+        return
+
+    batch_id = batch.id
+    try:
+        moves = _persist(db, batch)
+        batch.status = models.ExerciseBatchStatus.DONE
+        batch.finished_at = datetime.now(timezone.utc)
+        db.commit()
+    except Exception as e:
+        logger.error(f"Lote {batch_id}: no se pudieron guardar los ejercicios: {e}", exc_info=True)
+        db.rollback()
+        batch = _close_item(db, item_id, values)
+        for item in batch.items:
+            if item.status == ItemStatus.DONE:
+                item.status = ItemStatus.FAILED
+                item.error = "No se pudo guardar el ejercicio."
+        batch.status = models.ExerciseBatchStatus.FAILED
+        batch.finished_at = datetime.now(timezone.utc)
+        db.commit()
+
+    if batch.status == models.ExerciseBatchStatus.DONE:
+        _move_chunks(moves)
+    if not any(item.status == ItemStatus.DONE for item in batch.items):
+        # Ningún ejercicio apunta a estos MP3
+        _remove_dir(batch_dir(batch_id))
+
+    logger.info(f"Lote {batch_id} terminado: {batch_to_dict(batch)['done']}/{len(batch.items)} correctos")
+    _notify(loop, db, item_id)
+
+
+def process_next_item(loop: asyncio.AbstractEventLoop) -> bool:
+    """
+    Reclama y ejecuta un elemento de lote (en el hilo de un worker de audio).
+    Devuelve False si no había ninguno disponible.
+    """
+    db = SessionLocal()
+    try:
+        item = claim_next_item(db)
+        if not item:
+            return False
+
+        item_id, batch_id, index = item.id, item.batch_id, item.index
+        prompt, marked_text = item.prompt, item.marked_text
+        profile = db.get(models.Profile, item.profile_id) if item.profile_id is not None else None
+        profile_description = profile.description if profile else None
+        logger.info(f"Lote {batch_id}, elemento {index} reclamado (intento {item.attempts})")
+        _notify(loop, db, item_id)
+
+        try:
+            if marked_text is None:
+                marked_text = ai_exercises.generate_marked_text_from_prompt(prompt, profile_description)
+                item = db.get(Item, item_id)
+                item.marked_text = marked_text
+                item.status = ItemStatus.RENDERING
+                item.updated_at = datetime.now(timezone.utc)
+                db.commit()
+                _notify(loop, db, item_id)
+
+            audio_path, manifest = ai_exercises.render_exercise_audio(
+                marked_text, item_chunk_dir(batch_id, index), None, Path.cwd(),
+            )
+        except Exception as e:
+            logger.error(f"Lote {batch_id}, elemento {index} falló: {e}", exc_info=True)
+            _remove_dir(item_dir(batch_id, index))
+            db.rollback()
+            item = db.get(Item, item_id)
+            if item.attempts < settings.audio_job_max_attempts:
+                item.status = ItemStatus.QUEUED
+                item.error = str(e)[:500]
+                item.locked_at = None
+                item.updated_at = datetime.now(timezone.utc)
+                db.commit()
+                _notify(loop, db, item_id)
+                return True
+            _complete_item(loop, db, item_id, status=ItemStatus.FAILED, error=str(e)[:500])
+            return True
+
+        _complete_item(
+            loop, db, item_id,
+            status=ItemStatus.DONE,
+            error=None,
+            audio_path=audio_path,
+            audio_manifest=manifest,
+        )
+        return True
+    finally:
+        db.close()
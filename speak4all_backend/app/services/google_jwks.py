@@ -0,0 +1,216 @@
+"""
+Verificación local de los id_token de Google (login con Google).
+
+Las claves públicas de Google (JWKS) se guardan en memoria y en disco, y se
+respeta el max-age de su Cache-Control. Cuando faltan menos de
+REFRESH_BEFORE_S para que caduquen se renuevan en un hilo aparte: el login
+solo espera a la red si no hay ninguna caché (primer arranque) o si el token
+trae un `kid` desconocido (Google rotó las claves). Si la descarga falla se
+siguen usando las claves caducadas, que Google mantiene válidas varios días,
+y se reintenta en segundo plano como mucho cada MIN_FETCH_INTERVAL_S.
+
+Con GOOGLE_JWKS_FILE se usa un JWKS local fijo y nunca se accede a la red
+(pruebas sin conexión; ver scripts/google_jwks_fixture.py).
+"""
+
+from pathlib import Path
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from jose import jwt, JWTError
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+DEFAULT_MAX_AGE_S = 3600
+REFRESH_BEFORE_S = 300
+MIN_FETCH_INTERVAL_S = 30  # kid desconocido: como mucho una descarga cada 30 s
+FETCH_TIMEOUT_S = 5
+CLOCK_SKEW_S = 10
+
+_keys: dict[str, dict] = {}  # kid -> JWK
+_expires_at = 0.0  # time.time(): se guarda en disco, no vale monotonic
+_last_fetch = float("-inf")
+_disk_loaded = False
+_refreshing = False
+_lock = threading.Lock()
+_fetch_lock = threading.Lock()  # una sola descarga a la vez
+_stats = {"fetches": 0, "fetch_errors": 0, "background_refreshes": 0, "disk_loads": 0, "unknown_kid": 0}
+
+
+class GoogleTokenError(Exception):
+    """El id_token no es válido (firma, audiencia, emisor, expiración o clave)."""
+
+
+def _cache_path() -> Path:
+    if settings.google_jwks_cache_file:
+        return Path(settings.google_jwks_cache_file)
+    return Path(tempfile.gettempdir()) / "speak4all_google_jwks.json"
+
+
+def _max_age(cache_control: str | None, age: str | None) -> int:
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    max_age = int(match.group(1)) if match else DEFAULT_MAX_AGE_S
+    if age and age.isdigit():
+        max_age -= int(age)
+    return max(max_age, 0)
+
+
+def _set_keys(keys: dict[str, dict], expires_at: float):
+    global _keys, _expires_at
+    with _lock:
+        _keys, _expires_at = keys, expires_at
+
+
+def _write_disk(keys: dict[str, dict], expires_at: float):
+    path = _cache_path()
+    tmp = path.with_suffix(".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps({"expires_at": expires_at, "keys": list(keys.values())}))
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"No se pudo guardar el JWKS de Google en {path}: {e}")
+
+
+def _load_disk():
+    """Carga la copia en disco (aunque esté caducada: sirve de respaldo)."""
+    global _disk_loaded
+    _disk_loaded = True
+    path = _cache_path()
+    try:
+        data = json.loads(path.read_text())
+        keys = {k["kid"]: k for k in data["keys"]}
+        expires_at = float(data["expires_at"])
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"JWKS de Google en disco ilegible ({path}): {e}")
+        return
+    _set_keys(keys, expires_at)
+    _stats["disk_loads"] += 1
+
+
+def _load_fixture():
+    """JWKS fijo de GOOGLE_JWKS_FILE: no caduca ni se descarga."""
+    data = json.loads(Path(settings.google_jwks_file).read_text())
+    _set_keys({k["kid"]: k for k in data["keys"]}, float("inf"))
+
+
+def _fetch() -> tuple[dict[str, dict], float]:
+    req = urllib.request.Request(settings.google_jwks_url, headers={"Accept": "application/json"})
+    with urllib.request.urlopen(req, timeout=FETCH_TIMEOUT_S) as resp:
+        body = json.loads(resp.read())
+        max_age = _max_age(resp.headers.get("Cache-Control"), resp.headers.get("Age"))
+    return {k["kid"]: k for k in body["keys"]}, time.time() + max_age
+
+
+def _refresh(background: bool = False) -> bool:
+    """Descarga el JWKS. En segundo plano no espera si ya hay otra descarga en curso."""
+    global _last_fetch, _refreshing
+    try:
+        # Si una descarga del login tiene el lock, esta se omite (y _refreshing se libera igual)
+        if not _fetch_lock.acquire(blocking=not background):
+            return False
+        try:
+            _last_fetch = time.monotonic()
+            try:
+                keys, expires_at = _fetch()
+            except (urllib.error.URLError, OSError, ValueError, KeyError) as e:
+                _stats["fetch_errors"] += 1
+                logger.warning(f"No se pudo descargar el JWKS de Google: {e}")
+                return False
+            _set_keys(keys, expires_at)
+            _write_disk(keys, expires_at)
+            _stats["fetches"] += 1
+            return True
+        finally:
+            _fetch_lock.release()
+    finally:
+        if background:
+            _refreshing = False
+
+
+def _refresh_in_background():
+    """Renueva en un hilo; con Google caído, como mucho un intento cada MIN_FETCH_INTERVAL_S."""
+    global _refreshing
+    with _lock:
+        if _refreshing or time.monotonic() - _last_fetch < MIN_FETCH_INTERVAL_S:
+            return
+        _refreshing = True
+    _stats["background_refreshes"] += 1
+    threading.Thread(target=_refresh, kwargs={"background": True}, daemon=True).start()
+
+
+def _get_key(kid: str | None) -> dict | None:
+    if settings.google_jwks_file:
+        if not _keys:
+            _load_fixture()
+        return _keys.get(kid)
+
+    if not _disk_loaded:
+        _load_disk()
+
+    if not _keys:
+        _refresh()
+    elif time.time() >= _expires_at - REFRESH_BEFORE_S:
+        # A punto de caducar o caducadas: se sirven las que hay mientras se renuevan
+        _refresh_in_background()
+
+    key = _keys.get(kid)
+    if key is None and time.monotonic() - _last_fetch >= MIN_FETCH_INTERVAL_S:
+        _stats["unknown_kid"] += 1
+        _refresh()
+        key = _keys.get(kid)
+    return key
+
+
+def prefetch():
+    """Al arrancar: deja las claves listas sin bloquear el arranque."""
+    if settings.google_jwks_file or not settings.google_client_id:
+        return
+    _load_disk()
+    if time.time() >= _expires_at - REFRESH_BEFORE_S:
+        _refresh_in_background()
+
+
+def verify_id_token(token: str, audience: str) -> dict:
+    """Verifica firma, audiencia, emisor y expiración. Devuelve los claims."""
+    try:
+        header = jwt.get_unverified_header(token)
+    except JWTError as e:
+        raise GoogleTokenError(f"Cabecera inválida: {e}")
+
+    key = _get_key(header.get("kid"))
+    if key is None:
+        raise GoogleTokenError(f"Clave de firma desconocida: {header.get('kid')}")
+
+    try:
+        return jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            audience=audience,
+            issuer=GOOGLE_ISSUERS,
+            options={"verify_at_hash": False, "leeway": CLOCK_SKEW_S},
+        )
+    except JWTError as e:
+        raise GoogleTokenError(str(e))
+
+
+def stats() -> dict:
+    with _lock:
+        return {
+            "keys": len(_keys),
+            "expires_in_s": round(_expires_at - time.time()) if _keys and _expires_at != float("inf") else None,
+            **_stats,
+        }
@@ -0,0 +1,208 @@
+"""
+Exportación del libro de calificaciones de un curso (CSV / XLSX) en streaming.
+
+Una fila por estudiante; por cada ejercicio publicado una columna con la nota
+total y una por cada criterio de su rúbrica. Las filas se leen con un cursor
+del lado del servidor (stream_results + yield_per) ordenadas por estudiante y
+se escriben de una en una, así la memoria no depende del tamaño del curso.
+"""
+
+from dataclasses import dataclass
+from itertools import groupby
+import csv
+import io
+import os
+import tempfile
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .. import models
+
+STREAM_BATCH_ROWS = 1000
+_FILE_CHUNK = 64 * 1024
+
+
+@dataclass
+class ExportColumns:
+    """Columnas dinámicas: ejercicios (con peso) y criterios de cada rúbrica."""
+    exercises: list      # (course_exercise_id, name, weight)
+    criteria: dict       # course_exercise_id -> [(criteria_id, name)]
+
+    def header(self) -> list[str]:
+        row = ["student_id", "Estudiante", "Email", "Evaluados", "Promedio ponderado (%)"]
+        for ce_id, name, weight in self.exercises:
+            row.append(f"{name} (peso {weight})")
+            row.extend(f"{name} · {crit_name}" for _, crit_name in self.criteria.get(ce_id, []))
+        return row
+
+
+def load_columns(db: Session, course_id: int) -> ExportColumns:
+    exercises = db.execute(
+        select(
+            models.CourseExercise.id,
+            func.coalesce(models.Exercise.name, "Ejercicio").label("name"),
+            func.coalesce(models.ExerciseWeighting.weight, 1).label("weight"),
+        ).outerjoin(
+            models.Exercise, models.Exercise.id == models.CourseExercise.exercise_id
+        ).outerjoin(
+            models.ExerciseWeighting, models.ExerciseWeighting.course_exercise_id == models.CourseExercise.id
+        ).where(
+            models.CourseExercise.course_id == course_id,
+            models.CourseExercise.is_deleted.is_(False),
+        ).order_by(models.CourseExercise.id)
+    ).all()
+
+    criteria: dict[int, list] = {}
+    for ce_id, crit_id, crit_name in db.execute(
+        select(
+            models.RubricTemplate.course_exercise_id,
+            models.RubricCriteria.id,
+            models.RubricCriteria.name,
+        ).join(
+            models.RubricCriteria, models.RubricCriteria.rubric_template_id == models.RubricTemplate.id
+        ).join(
+            models.CourseExercise, models.CourseExercise.id == models.RubricTemplate.course_exercise_id
+        ).where(
+            models.CourseExercise.course_id == course_id,
+            models.CourseExercise.is_deleted.is_(False),
+            models.RubricTemplate.is_deleted.is_(False),
+            models.RubricCriteria.is_deleted.is_(False),
+        ).order_by(models.RubricTemplate.course_exercise_id, models.RubricCriteria.order, models.RubricCriteria.id)
+    ):
+        criteria.setdefault(ce_id, []).append((crit_id, crit_name))
+
+    return ExportColumns(
+        exercises=[(e.id, e.name, e.weight) for e in exercises],
+        criteria=criteria,
+    )
+
+
+def _score_rows_stmt(course_id: int):
+    """
+    Filas (estudiante, evaluación, puntaje de criterio) ordenadas por estudiante.
+    Un estudiante sin evaluaciones aparece una vez con columnas de evaluación a NULL.
+    """
+    rn = func.row_number().over(
+        partition_by=(models.Submission.student_id, models.Submission.course_exercise_id),
+        order_by=models.Evaluation.id,
+    )
+    ev = select(
+        models.Submission.student_id,
+        models.Submission.course_exercise_id,
+        models.Evaluation.id.label("evaluation_id"),
+        models.Evaluation.total_score,
+        models.RubricTemplate.max_score,
+        rn.label("rn"),
+    ).join(
+        models.Evaluation, models.Evaluation.submission_id == models.Submission.id
+    ).join(
+        models.CourseExercise, models.CourseExercise.id == models.Submission.course_exercise_id
+    ).outerjoin(
+        models.RubricTemplate, models.RubricTemplate.id == models.Evaluation.rubric_template_id
+    ).where(
+        models.CourseExercise.course_id == course_id,
+        models.CourseExercise.is_deleted.is_(False),
+        models.Evaluation.is_deleted.is_(False),
+    ).subquery("ev")
+
+    return select(
+        models.CourseStudent.id.label("enrollment_id"),
+        models.User.id.label("student_id"),
+        models.User.full_name,
+        models.User.email,
+        ev.c.course_exercise_id,
+        ev.c.total_score,
+        ev.c.max_score,
+        models.EvaluationCriterionScore.rubric_criteria_id,
+        models.EvaluationCriterionScore.points_awarded,
+    ).join(
+        models.User, models.User.id == models.CourseStudent.student_id
+    ).outerjoin(
+        ev, (ev.c.student_id == models.User.id) & (ev.c.rn == 1)
+    ).outerjoin(
+        models.EvaluationCriterionScore, models.EvaluationCriterionScore.evaluation_id == ev.c.evaluation_id
+    ).where(
+        models.CourseStudent.course_id == course_id,
+        models.CourseStudent.is_active.is_(True),
+    ).order_by(models.CourseStudent.id, ev.c.course_exercise_id)
+
+
+def iter_student_rows(db: Session, course_id: int, columns: ExportColumns):
+    """Genera una lista de valores por estudiante, en el orden de `columns.header()`."""
+    weights = {ce_id: weight for ce_id, _, weight in columns.exercises}
+    total_weight = sum(weights.values())
+
+    result = db.execute(
+        _score_rows_stmt(course_id).execution_options(stream_results=True, yield_per=STREAM_BATCH_ROWS)
+    )
+    try:
+        for _, rows in groupby(result, key=lambda r: r.enrollment_id):
+            totals: dict[int, int] = {}
+            points: dict[tuple[int, int], int] = {}
+            first = None
+            weighted_sum = 0.0
+            for row in rows:
+                first = first or row
+                ce_id = row.course_exercise_id
+                if ce_id is None or ce_id not in weights:
+                    continue
+                if ce_id not in totals:
+                    totals[ce_id] = row.total_score
+                    if row.max_score:
+                        weighted_sum += row.total_score / row.max_score * 100 * weights[ce_id]
+                if row.rubric_criteria_id is not None:
+                    points[(ce_id, row.rubric_criteria_id)] = row.points_awarded
+
+            weighted = weighted_sum / total_weight if total_weight > 0 else 0.0
+            values = [first.student_id, first.full_name, first.email, len(totals), round(weighted, 2)]
+            for ce_id, _, _ in columns.exercises:
+                values.append(totals.get(ce_id))
+                values.extend(points.get((ce_id, crit_id)) for crit_id, _ in columns.criteria.get(ce_id, []))
+            yield values
+    finally:
+        result.close()
+
+
+def stream_csv(db: Session, course_id: int, columns: ExportColumns):
+    """Genera el CSV por trozos (una línea por estudiante)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def _flush() -> str:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return chunk
+
+    buffer.write("\ufeff")  # BOM para que Excel detecte UTF-8
+    writer.writerow(columns.header())
+    yield _flush()
+    for values in iter_student_rows(db, course_id, columns):
+        writer.writerow(["" if v is None else v for v in values])
+        yield _flush()
+
+
+def stream_xlsx(db: Session, course_id: int, columns: ExportColumns):
+    """
+    Escribe el XLSX en modo constant_memory (cada fila se vuelca a disco al
+    escribir la siguiente) en un fichero temporal y lo devuelve por trozos.
+    """
+    import xlsxwriter
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "tmpdir": tempfile.gettempdir()})
+        sheet = workbook.add_worksheet("Calificaciones")
+        bold = workbook.add_format({"bold": True})
+        sheet.write_row(0, 0, columns.header(), bold)
+        for r, values in enumerate(iter_student_rows(db, course_id, columns), start=1):
+            sheet.write_row(r, 0, values)
+        workbook.close()
+
+        with open(path, "rb") as f:
+            while chunk := f.read(_FILE_CHUNK):
+                yield chunk
+    finally:
+        os.unlink(path)
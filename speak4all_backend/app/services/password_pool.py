@@ -0,0 +1,129 @@
+"""
+Pool de procesos para el trabajo de contraseñas (bcrypt).
+
+`deps.hash_password` / `deps.verify_password` consumen ~250 ms de CPU cada una.
+Las rutas de login, registro y cambio de contraseña las ejecutan aquí, en
+`settings.password_pool_workers` procesos aparte, para no ocupar el event loop
+ni el threadpool de la API.
+
+La cola está acotada: con `settings.password_pool_max_pending` trabajos en
+espera o en curso, los nuevos se rechazan con `PasswordPoolBusy` (la app
+responde 503 con Retry-After) en vez de acumular logins que llegarían tarde.
+"""
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+_pool: ProcessPoolExecutor | None = None
+_lock = threading.Lock()
+_pending = 0
+_stats = {"submitted": 0, "completed": 0, "rejected": 0, "peak_pending": 0, "latency_s": 0.0}
+
+
+class PasswordPoolBusy(Exception):
+    """La cola del pool de contraseñas está llena."""
+
+    def __init__(self, retry_after_s: int):
+        super().__init__("Pool de contraseñas saturado")
+        self.retry_after_s = retry_after_s
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Crea el pool si no existe (se llama con el lock tomado)."""
+    global _pool
+    if _pool is None:
+        # forkserver: los procesos no heredan hilos ni conexiones del proceso de la API
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.password_pool_workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return _pool
+
+
+def start():
+    """Arranca el pool y precalienta los procesos (el primer login no paga el arranque)."""
+    if settings.password_pool_workers <= 0:
+        return
+    with _lock:
+        pool = _get_pool()
+    for future in [pool.submit(time.sleep, 0) for _ in range(settings.password_pool_workers)]:
+        future.result()
+
+
+def shutdown():
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _retry_after_s() -> int:
+    """Latencia media de un trabajo (espera + bcrypt): lo que tarda en liberarse un hueco."""
+    if not _stats["completed"]:
+        return 1
+    return max(1, round(_stats["latency_s"] / _stats["completed"]))
+
+
+def _submit(fn, *args) -> Future:
+    global _pending, _pool
+    with _lock:
+        if _pending >= settings.password_pool_max_pending:
+            _stats["rejected"] += 1
+            raise PasswordPoolBusy(_retry_after_s())
+        try:
+            future = _get_pool().submit(fn, *args)
+        except BrokenProcessPool:
+            # Un proceso murió (p. ej. OOM): se descarta el pool y se crea otro
+            logger.error("Pool de contraseñas roto; se recrea")
+            _pool = None
+            future = _get_pool().submit(fn, *args)
+        _pending += 1
+        _stats["submitted"] += 1
+        _stats["peak_pending"] = max(_stats["peak_pending"], _pending)
+
+    started = time.monotonic()
+
+    def _done(_):
+        global _pending
+        with _lock:
+            _pending -= 1
+            _stats["completed"] += 1
+            _stats["latency_s"] += time.monotonic() - started
+
+    future.add_done_callback(_done)
+    return future
+
+
+async def run(fn, *args):
+    """Ejecuta `fn(*args)` en el pool y espera el resultado sin bloquear el event loop."""
+    if settings.password_pool_workers <= 0:
+        return await asyncio.to_thread(fn, *args)
+    return await asyncio.wrap_future(_submit(fn, *args))
+
+
+def run_blocking(fn, *args):
+    """Igual que `run`, para rutas síncronas (que ya corren en el threadpool)."""
+    if settings.password_pool_workers <= 0:
+        return fn(*args)
+    return _submit(fn, *args).result()
+
+
+def stats() -> dict:
+    with _lock:
+        return {
+            "workers": settings.password_pool_workers,
+            "pending": _pending,
+            "max_pending": settings.password_pool_max_pending,
+            **{k: v for k, v in _stats.items() if k != "latency_s"},
+            "avg_latency_ms": round(_stats["latency_s"] / _stats["completed"] * 1000, 1) if _stats["completed"] else 0.0,
+        }
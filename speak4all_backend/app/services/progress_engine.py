@@ -0,0 +1,414 @@
+"""
+Cálculo del progreso ponderado de estudiantes con consultas agregadas.
+
+Fórmula (igual que antes de mover el cálculo aquí):
+    progreso = Σ(calificación_normalizada_0_100 · peso) / Σ(pesos)
+donde el peso por defecto es 1 y los ejercicios sin evaluar suman peso pero no puntos.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy import and_, case, func, literal, select
+from sqlalchemy.orm import Session
+
+from .. import models
+
+
+def _weight_expr():
+    return func.coalesce(models.ExerciseWeighting.weight, 1)
+
+
+def _student_evaluations_subquery(course_id: int, student_id: int):
+    """
+    Una evaluación (la más antigua no borrada) por ejercicio del curso para el estudiante.
+    """
+    rn = func.row_number().over(
+        partition_by=models.Submission.course_exercise_id,
+        order_by=models.Evaluation.id,
+    )
+    return select(
+        models.Submission.course_exercise_id.label("course_exercise_id"),
+        models.Evaluation.total_score.label("total_score"),
+        models.Evaluation.rubric_template_id.label("rubric_template_id"),
+        rn.label("rn"),
+    ).join(
+        models.Evaluation, models.Evaluation.submission_id == models.Submission.id
+    ).join(
+        models.CourseExercise, models.CourseExercise.id == models.Submission.course_exercise_id
+    ).where(
+        models.CourseExercise.course_id == course_id,
+        models.Submission.student_id == student_id,
+        models.Evaluation.is_deleted.is_(False),
+    ).subquery("ev")
+
+
+def student_progress(db: Session, course_id: int, student_id: int) -> dict:
+    """
+    Progreso de un estudiante en un curso en una sola sentencia SQL.
+
+    Devuelve {"weighted_score", "weighted_sum", "total_weight", "total_exercises",
+    "evaluated_exercises", "exercise_scores"}
+    donde exercise_scores es una lista de dicts compatibles con schemas.ExerciseScoreProgress.
+    """
+    ev = _student_evaluations_subquery(course_id, student_id)
+    weight = _weight_expr()
+    evaluated = ev.c.course_exercise_id.isnot(None)
+    normalized = case(
+        (models.RubricTemplate.max_score > 0,
+         ev.c.total_score * literal(100.0) / models.RubricTemplate.max_score),
+        else_=None,
+    )
+    weight_total = func.sum(weight).over()
+    weighted_sum = func.coalesce(func.sum(normalized * weight).over(), 0)
+
+    stmt = select(
+        models.CourseExercise.id.label("course_exercise_id"),
+        models.Exercise.name.label("exercise_name"),
+        models.CourseExercise.category_id,
+        models.ExerciseCategory.name.label("category_name"),
+        models.ExerciseCategory.color.label("category_color"),
+        weight.label("weight"),
+        evaluated.label("evaluated"),
+        ev.c.total_score,
+        models.RubricTemplate.max_score,
+        weighted_sum.label("weighted_sum"),
+        weight_total.label("total_weight"),
+        case((weight_total > 0, weighted_sum / weight_total), else_=0.0).label("weighted_score"),
+        func.count(ev.c.course_exercise_id).over().label("evaluated_count"),
+    ).select_from(
+        models.CourseExercise
+    ).outerjoin(
+        models.Exercise, models.Exercise.id == models.CourseExercise.exercise_id
+    ).outerjoin(
+        models.ExerciseCategory, models.ExerciseCategory.id == models.CourseExercise.category_id
+    ).outerjoin(
+        models.ExerciseWeighting, models.ExerciseWeighting.course_exercise_id == models.CourseExercise.id
+    ).outerjoin(
+        ev, and_(ev.c.course_exercise_id == models.CourseExercise.id, ev.c.rn == 1)
+    ).outerjoin(
+        models.RubricTemplate, models.RubricTemplate.id == ev.c.rubric_template_id
+    ).where(
+        models.CourseExercise.course_id == course_id,
+        models.CourseExercise.is_deleted.is_(False),
+    ).order_by(models.CourseExercise.id)
+
+    rows = db.execute(stmt).all()
+    if not rows:
+        return {
+            "weighted_score": 0.0,
+            "weighted_sum": 0.0,
+            "total_weight": 0,
+            "total_exercises": 0,
+            "evaluated_exercises": 0,
+            "exercise_scores": [],
+        }
+
+    exercise_scores = []
+    for row in rows:
+        has_score = row.evaluated and row.max_score is not None and row.max_score > 0
+        exercise_scores.append({
+            "course_exercise_id": row.course_exercise_id,
+            "exercise_name": row.exercise_name or f"Ejercicio {row.course_exercise_id}",
+            "weight": row.weight,
+            "evaluated": bool(row.evaluated),
+            "score": row.total_score if has_score else None,
+            "max_score": row.max_score if has_score else None,
+            "category_id": row.category_id if row.category_name is not None else None,
+            "category_name": row.category_name,
+            "category_color": row.category_color,
+        })
+
+    return {
+        "weighted_score": float(rows[0].weighted_score or 0.0),
+        "weighted_sum": float(rows[0].weighted_sum or 0.0),
+        "total_weight": int(rows[0].total_weight or 0),
+        "total_exercises": len(rows),
+        "evaluated_exercises": int(rows[0].evaluated_count),
+        "exercise_scores": exercise_scores,
+    }
+
+
+@dataclass
+class Gradebook:
+    """
+    Libro de calificaciones de un curso.
+    - students: filas (id, full_name, email, avatar_path) en el orden de la matriz.
+    - course_exercise_ids / weights: columnas de la matriz (ejercicios no borrados).
+    - scores: matriz estudiantes × ejercicios con la nota normalizada 0-100 (NaN = sin nota).
+    - evaluated: matriz booleana; True si hay evaluación (aunque la rúbrica no dé nota).
+    """
+    students: list
+    course_exercise_ids: np.ndarray
+    weights: np.ndarray
+    scores: np.ndarray
+    evaluated: np.ndarray
+
+    @property
+    def weighted_sums(self) -> np.ndarray:
+        return np.nansum(self.scores * self.weights, axis=1)
+
+    @property
+    def weighted_scores(self) -> np.ndarray:
+        total_weight = self.weights.sum()
+        if total_weight <= 0:
+            return np.zeros(len(self.students))
+        return self.weighted_sums / total_weight
+
+    @property
+    def evaluated_counts(self) -> np.ndarray:
+        return self.evaluated.sum(axis=1)
+
+
+def course_gradebook(db: Session, course_id: int) -> Gradebook:
+    """
+    Carga el curso completo en tres consultas (estudiantes, ejercicios con peso,
+    evaluaciones con máximo de rúbrica) y arma la matriz de notas con NumPy.
+    El número de consultas no depende del tamaño de la clase.
+    """
+    students = db.execute(
+        select(
+            models.User.id,
+            models.User.full_name,
+            models.User.email,
+            models.User.avatar_path,
+        ).join(
+            models.CourseStudent, models.CourseStudent.student_id == models.User.id
+        ).where(
+            models.CourseStudent.course_id == course_id,
+            models.CourseStudent.is_active.is_(True),
+        ).order_by(models.CourseStudent.id)
+    ).all()
+
+    exercises = db.execute(
+        select(
+            models.CourseExercise.id,
+            _weight_expr().label("weight"),
+        ).outerjoin(
+            models.ExerciseWeighting, models.ExerciseWeighting.course_exercise_id == models.CourseExercise.id
+        ).where(
+            models.CourseExercise.course_id == course_id,
+            models.CourseExercise.is_deleted.is_(False),
+        ).order_by(models.CourseExercise.id)
+    ).all()
+
+    rn = func.row_number().over(
+        partition_by=(models.Submission.student_id, models.Submission.course_exercise_id),
+        order_by=models.Evaluation.id,
+    )
+    ev = select(
+        models.Submission.student_id,
+        models.Submission.course_exercise_id,
+        models.Evaluation.total_score,
+        models.Evaluation.rubric_template_id,
+        rn.label("rn"),
+    ).join(
+        models.Evaluation, models.Evaluation.submission_id == models.Submission.id
+    ).join(
+        models.CourseExercise, models.CourseExercise.id == models.Submission.course_exercise_id
+    ).where(
+        models.CourseExercise.course_id == course_id,
+        models.CourseExercise.is_deleted.is_(False),
+        models.Evaluation.is_deleted.is_(False),
+    ).subquery("ev")
+
+    evaluations = db.execute(
+        select(
+            ev.c.student_id,
+            ev.c.course_exercise_id,
+            ev.c.total_score,
+            models.RubricTemplate.max_score,
+        ).outerjoin(
+            models.RubricTemplate, models.RubricTemplate.id == ev.c.rubric_template_id
+        ).where(ev.c.rn == 1)
+    ).all()
+
+    ce_ids = np.array([e.id for e in exercises], dtype=np.int64)
+    weights = np.array([e.weight for e in exercises], dtype=np.float64)
+    scores = np.full((len(students), len(exercises)), np.nan)
+    evaluated = np.zeros((len(students), len(exercises)), dtype=bool)
+
+    row_of = {s.id: i for i, s in enumerate(students)}
+    col_of = {ce_id: j for j, ce_id in enumerate(ce_ids.tolist())}
+    if evaluations:
+        rows = np.array([row_of.get(e.student_id, -1) for e in evaluations])
+        cols = np.array([col_of.get(e.course_exercise_id, -1) for e in evaluations])
+        totals = np.array([e.total_score for e in evaluations], dtype=np.float64)
+        maxima = np.array([e.max_score if e.max_score is not None else 0 for e in evaluations], dtype=np.float64)
+
+        keep = (rows >= 0) & (cols >= 0)  # ignora estudiantes inactivos
+        rows, cols, totals, maxima = rows[keep], cols[keep], totals[keep], maxima[keep]
+        evaluated[rows, cols] = True
+        scored = maxima > 0
+        scores[rows[scored], cols[scored]] = totals[scored] / maxima[scored] * 100
+
+    return Gradebook(
+        students=students,
+        course_exercise_ids=ce_ids,
+        weights=weights,
+        scores=scores,
+        evaluated=evaluated,
+    )
+
+
+def _category_columns():
+    return (
+        models.ExerciseCategory.id.label("category_id"),
+        models.ExerciseCategory.name.label("category_name"),
+        models.ExerciseCategory.color.label("category_color"),
+    )
+
+
+def _category_entry(row, weighted_sum: float, total_weight: float, evaluated: int) -> dict:
+    return {
+        "category_id": row.category_id,
+        "category_name": row.category_name,
+        "category_color": row.category_color,
+        "total_weight": int(row.total_weight or 0),
+        "total_exercises": int(row.total_exercises),
+        "evaluated_exercises": int(evaluated),
+        "weighted_score": round(weighted_sum / total_weight, 2) if total_weight > 0 else 0.0,
+    }
+
+
+def student_category_progress(db: Session, course_id: int, student_id: int) -> list[dict]:
+    """
+    Subtotales ponderados por categoría de un estudiante (una sentencia con GROUP BY).
+    Misma fórmula que `student_progress`, restringida a los ejercicios de cada
+    categoría; los ejercicios sin categoría forman el grupo category_id=None.
+    """
+    ev = _student_evaluations_subquery(course_id, student_id)
+    weight = _weight_expr()
+    normalized = case(
+        (models.RubricTemplate.max_score > 0,
+         ev.c.total_score * literal(100.0) / models.RubricTemplate.max_score),
+        else_=None,
+    )
+    category = _category_columns()
+
+    rows = db.execute(
+        select(
+            *category,
+            func.sum(weight).label("total_weight"),
+            func.count(models.CourseExercise.id).label("total_exercises"),
+            func.count(ev.c.course_exercise_id).label("evaluated_exercises"),
+            func.coalesce(func.sum(normalized * weight), 0).label("weighted_sum"),
+        ).select_from(
+            models.CourseExercise
+        ).outerjoin(
+            models.ExerciseCategory, models.ExerciseCategory.id == models.CourseExercise.category_id
+        ).outerjoin(
+            models.ExerciseWeighting, models.ExerciseWeighting.course_exercise_id == models.CourseExercise.id
+        ).outerjoin(
+            ev, and_(ev.c.course_exercise_id == models.CourseExercise.id, ev.c.rn == 1)
+        ).outerjoin(
+            models.RubricTemplate, models.RubricTemplate.id == ev.c.rubric_template_id
+        ).where(
+            models.CourseExercise.course_id == course_id,
+            models.CourseExercise.is_deleted.is_(False),
+        ).group_by(*category).order_by(models.ExerciseCategory.name.nulls_last())
+    ).all()
+
+    return [
+        _category_entry(row, float(row.weighted_sum or 0.0), float(row.total_weight or 0), row.evaluated_exercises)
+        for row in rows
+    ]
+
+
+def course_category_progress(db: Session, course_id: int) -> dict:
+    """
+    Subtotales por categoría de todo el curso: media de los subtotales de los
+    estudiantes activos. Tres consultas con GROUP BY (ejercicios por categoría,
+    evaluaciones por categoría y número de estudiantes), independientes del
+    tamaño de la clase.
+
+    Devuelve {"student_count", "categories"}; en cada categoría
+    evaluated_exercises es el total de evaluaciones de todos los estudiantes.
+    """
+    weight = _weight_expr()
+    category = _category_columns()
+
+    student_count = db.execute(
+        select(func.count(models.CourseStudent.id)).where(
+            models.CourseStudent.course_id == course_id,
+            models.CourseStudent.is_active.is_(True),
+        )
+    ).scalar_one()
+
+    exercise_rows = db.execute(
+        select(
+            *category,
+            func.sum(weight).label("total_weight"),
+            func.count(models.CourseExercise.id).label("total_exercises"),
+        ).select_from(
+            models.CourseExercise
+        ).outerjoin(
+            models.ExerciseCategory, models.ExerciseCategory.id == models.CourseExercise.category_id
+        ).outerjoin(
+            models.ExerciseWeighting, models.ExerciseWeighting.course_exercise_id == models.CourseExercise.id
+        ).where(
+            models.CourseExercise.course_id == course_id,
+            models.CourseExercise.is_deleted.is_(False),
+        ).group_by(*category).order_by(models.ExerciseCategory.name.nulls_last())
+    ).all()
+
+    rn = func.row_number().over(
+        partition_by=(models.Submission.student_id, models.Submission.course_exercise_id),
+        order_by=models.Evaluation.id,
+    )
+    ev = select(
+        models.Submission.course_exercise_id,
+        models.Evaluation.total_score,
+        models.Evaluation.rubric_template_id,
+        rn.label("rn"),
+    ).join(
+        models.Evaluation, models.Evaluation.submission_id == models.Submission.id
+    ).join(
+        models.CourseExercise, models.CourseExercise.id == models.Submission.course_exercise_id
+    ).join(
+        models.CourseStudent,
+        and_(
+            models.CourseStudent.course_id == models.CourseExercise.course_id,
+            models.CourseStudent.student_id == models.Submission.student_id,
+            models.CourseStudent.is_active.is_(True),
+        ),
+    ).where(
+        models.CourseExercise.course_id == course_id,
+        models.CourseExercise.is_deleted.is_(False),
+        models.Evaluation.is_deleted.is_(False),
+    ).subquery("ev")
+
+    normalized = case(
+        (models.RubricTemplate.max_score > 0,
+         ev.c.total_score * literal(100.0) / models.RubricTemplate.max_score),
+        else_=None,
+    )
+    evaluation_rows = db.execute(
+        select(
+            models.ExerciseCategory.id.label("category_id"),
+            func.count().label("evaluated"),
+            func.coalesce(func.sum(normalized * weight), 0).label("weighted_sum"),
+        ).select_from(
+            ev
+        ).join(
+            models.CourseExercise, models.CourseExercise.id == ev.c.course_exercise_id
+        ).outerjoin(
+            models.ExerciseCategory, models.ExerciseCategory.id == models.CourseExercise.category_id
+        ).outerjoin(
+            models.ExerciseWeighting, models.ExerciseWeighting.course_exercise_id == models.CourseExercise.id
+        ).outerjoin(
+            models.RubricTemplate, models.RubricTemplate.id == ev.c.rubric_template_id
+        ).where(ev.c.rn == 1).group_by(models.ExerciseCategory.id)
+    ).all()
+
+    evaluated_by_category = {
+        row.category_id: (row.evaluated, float(row.weighted_sum or 0.0)) for row in evaluation_rows
+    }
+
+    categories = []
+    for row in exercise_rows:
+        evaluated, weighted_sum = evaluated_by_category.get(row.category_id, (0, 0.0))
+        categories.append(_category_entry(
+            row, weighted_sum, float(row.total_weight or 0) * student_count, evaluated
+        ))
+    return {"student_count": student_count, "categories": categories}
@@ -0,0 +1,271 @@
+"""
+Mantenimiento de la tabla student_course_progress.
+
+Las rutas que cambian notas o pesos llaman a `refresh_student` / `refresh_course`
+antes de su commit, así la fila queda actualizada en la misma transacción.
+Antes de recalcular se bloquean las filas afectadas (FOR UPDATE) para que dos
+escrituras concurrentes sobre el mismo estudiante no se pisen. Al aceptar a un
+estudiante en un curso se crea su fila y al sacarlo se borra. Las lecturas
+nunca escriben.
+
+Cada escritura recalcula la fila completa del estudiante (o las del curso) en
+vez de sumar deltas a los totales. La nota que cuenta por ejercicio es la
+evaluación no borrada más antigua y las rúbricas con nota máxima 0 suman
+evaluado pero no puntos. Con deltas, cada ruta tendría que repetir esas
+reglas sabiendo qué evaluación contaba antes y cuál cuenta después, y un
+error dejaría la fila desviada hasta el siguiente `rebuild`. Recalcular un
+estudiante es una única consulta acotada por los ejercicios del curso
+(progress_engine.student_progress). La lectura sigue siendo una búsqueda por
+clave primaria.
+
+Reconstrucción / verificación desde los datos de origen:
+    python -m app.services.progress_store rebuild [--course ID]
+    python -m app.services.progress_store verify [--course ID]
+"""
+
+from datetime import datetime, timezone
+import argparse
+import logging
+import sys
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import progress_engine
+
+logger = logging.getLogger(__name__)
+
+_TOLERANCE = 1e-6
+
+
+def _lock_rows(db: Session, course_id: int, student_ids: list[int]):
+    """Crea las filas que falten y las bloquea hasta el commit del llamador."""
+    if not student_ids:
+        return
+    table = models.StudentCourseProgress.__table__
+    db.execute(
+        pg_insert(table).values([
+            {
+                "course_id": course_id,
+                "student_id": sid,
+                "weighted_sum": 0.0,
+                "total_weight": 0,
+                "evaluated_count": 0,
+                "total_exercises": 0,
+            }
+            for sid in student_ids
+        ]).on_conflict_do_nothing(index_elements=["course_id", "student_id"])
+    )
+    db.execute(
+        select(table.c.student_id).where(
+            table.c.course_id == course_id,
+            table.c.student_id.in_(student_ids),
+        ).order_by(table.c.student_id).with_for_update()
+    )
+
+
+def _upsert(db: Session, rows: list[dict]):
+    if not rows:
+        return
+    table = models.StudentCourseProgress.__table__
+    stmt = pg_insert(table).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["course_id", "student_id"],
+        set_={
+            "weighted_sum": stmt.excluded.weighted_sum,
+            "total_weight": stmt.excluded.total_weight,
+            "evaluated_count": stmt.excluded.evaluated_count,
+            "total_exercises": stmt.excluded.total_exercises,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    ))
+
+
+def refresh_student(db: Session, course_id: int, student_id: int):
+    """Recalcula la fila de un estudiante (tras crear/editar/borrar una evaluación)."""
+    db.flush()
+    _lock_rows(db, course_id, [student_id])
+    progress = progress_engine.student_progress(db, course_id, student_id)
+    _upsert(db, [{
+        "course_id": course_id,
+        "student_id": student_id,
+        "weighted_sum": progress["weighted_sum"],
+        "total_weight": progress["total_weight"],
+        "evaluated_count": progress["evaluated_exercises"],
+        "total_exercises": progress["total_exercises"],
+        "updated_at": datetime.now(timezone.utc),
+    }])
+
+
+def forget_student(db: Session, course_id: int, student_id: int):
+    """
+    Borra la fila al sacar al estudiante del curso: mientras está fuera no se
+    mantiene, y si vuelve `refresh_student` la crea de nuevo.
+    """
+    db.query(models.StudentCourseProgress).filter(
+        models.StudentCourseProgress.course_id == course_id,
+        models.StudentCourseProgress.student_id == student_id,
+    ).delete(synchronize_session=False)
+
+
+def refresh_for_submission(db: Session, submission_id: int) -> int | None:
+    """
+    Atajo para las rutas de evaluaciones, que solo conocen la entrega.
+    Devuelve el curso afectado (o None si la entrega no existe).
+    """
+    row = db.execute(
+        select(models.CourseExercise.course_id, models.Submission.student_id).join(
+            models.CourseExercise, models.CourseExercise.id == models.Submission.course_exercise_id
+        ).where(models.Submission.id == submission_id)
+    ).first()
+    if not row:
+        return None
+    refresh_student(db, row.course_id, row.student_id)
+    return row.course_id
+
+
+def _gradebook_rows(gradebook: progress_engine.Gradebook, course_id: int) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    total_weight = int(gradebook.weights.sum())
+    total_exercises = len(gradebook.course_exercise_ids)
+    weighted_sums = gradebook.weighted_sums
+    evaluated_counts = gradebook.evaluated_counts
+    return [
+        {
+            "course_id": course_id,
+            "student_id": student.id,
+            "weighted_sum": float(weighted_sums[i]),
+            "total_weight": total_weight,
+            "evaluated_count": int(evaluated_counts[i]),
+            "total_exercises": total_exercises,
+            "updated_at": now,
+        }
+        for i, student in enumerate(gradebook.students)
+    ]
+
+
+def refresh_course(db: Session, course_id: int):
+    """
+    Recalcula todas las filas del curso (cambio de peso, ejercicio publicado o
+    eliminado): afecta al peso total de todos los estudiantes.
+    """
+    db.flush()
+    student_ids = db.execute(
+        select(models.CourseStudent.student_id).where(
+            models.CourseStudent.course_id == course_id,
+            models.CourseStudent.is_active.is_(True),
+        )
+    ).scalars().all()
+    _lock_rows(db, course_id, sorted(set(student_ids)))
+    gradebook = progress_engine.course_gradebook(db, course_id)
+    _upsert(db, _gradebook_rows(gradebook, course_id))
+
+
+def course_progress(db: Session, course_id: int) -> list[tuple]:
+    """
+    Lectura para /progress/course/{id}/all: (estudiante, fila) de cada
+    estudiante activo. No escribe: si falta alguna fila (datos anteriores a la
+    tabla sin `rebuild`) se calcula en memoria para esta respuesta.
+    """
+    rows = db.execute(
+        select(
+            models.User.id,
+            models.User.full_name,
+            models.User.email,
+            models.User.avatar_path,
+            models.StudentCourseProgress,
+        ).join(
+            models.CourseStudent, models.CourseStudent.student_id == models.User.id
+        ).outerjoin(
+            models.StudentCourseProgress,
+            (models.StudentCourseProgress.course_id == models.CourseStudent.course_id)
+            & (models.StudentCourseProgress.student_id == models.User.id),
+        ).where(
+            models.CourseStudent.course_id == course_id,
+            models.CourseStudent.is_active.is_(True),
+        ).order_by(models.CourseStudent.id)
+    ).all()
+
+    computed = {}
+    if any(row.StudentCourseProgress is None for row in rows):
+        logger.warning(
+            f"Faltan filas de progreso en el curso {course_id}; "
+            f"ejecutar: python -m app.services.progress_store rebuild --course {course_id}"
+        )
+        gradebook = progress_engine.course_gradebook(db, course_id)
+        computed = {
+            row["student_id"]: models.StudentCourseProgress(**row)
+            for row in _gradebook_rows(gradebook, course_id)
+        }
+    return [(row, row.StudentCourseProgress or computed[row.id]) for row in rows]
+
+
+def _compare(db: Session, course_id: int) -> list[str]:
+    expected = {
+        row["student_id"]: row
+        for row in _gradebook_rows(progress_engine.course_gradebook(db, course_id), course_id)
+    }
+    stored = {
+        row.student_id: row
+        for row in db.query(models.StudentCourseProgress).filter(
+            models.StudentCourseProgress.course_id == course_id
+        )
+    }
+
+    problems = []
+    for student_id, exp in expected.items():
+        got = stored.get(student_id)
+        if got is None:
+            problems.append(f"curso {course_id}, estudiante {student_id}: falta la fila")
+            continue
+        if (
+            abs(got.weighted_sum - exp["weighted_sum"]) > _TOLERANCE
+            or got.total_weight != exp["total_weight"]
+            or got.evaluated_count != exp["evaluated_count"]
+            or got.total_exercises != exp["total_exercises"]
+        ):
+            problems.append(
+                f"curso {course_id}, estudiante {student_id}: "
+                f"guardado=({got.weighted_sum:.4f}, {got.total_weight}, {got.evaluated_count}, {got.total_exercises}) "
+                f"esperado=({exp['weighted_sum']:.4f}, {exp['total_weight']}, "
+                f"{exp['evaluated_count']}, {exp['total_exercises']})"
+            )
+    return problems
+
+
+def _course_ids(db: Session, course_id: int | None) -> list[int]:
+    if course_id is not None:
+        return [course_id]
+    return db.execute(select(models.Course.id).order_by(models.Course.id)).scalars().all()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Reconstruye o verifica student_course_progress.")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    parser.add_argument("--course", type=int, default=None, help="solo este curso")
+    args = parser.parse_args(argv)
+
+    from ..database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        problems: list[str] = []
+        for course_id in _course_ids(db, args.course):
+            if args.command == "rebuild":
+                refresh_course(db, course_id)
+                db.commit()
+            problems.extend(_compare(db, course_id))
+            db.rollback()  # libera el snapshot entre cursos
+
+        for problem in problems:
+            print(problem)
+        print(f"{args.command}: {len(problems)} diferencias")
+        return 1 if problems else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
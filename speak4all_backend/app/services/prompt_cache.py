@@ -0,0 +1,123 @@
+"""Caché en memoria de generaciones de IA con TTL y deduplicación de llamadas en curso."""
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable
+import hashlib
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Colapsa espacios/saltos de línea y pasa a minúsculas (casefold)."""
+    return re.sub(r"\s+", " ", prompt).strip().casefold()
+
+
+def generation_key(prompt: str, profile_description: str | None, model: str, temperature: float) -> str:
+    """Clave de caché: prompt normalizado + hash del perfil + modelo + temperatura."""
+    profile_hash = hashlib.sha256((profile_description or "").encode("utf-8")).hexdigest()
+    h = hashlib.sha256()
+    for part in (normalize_prompt(prompt), profile_hash, model, f"{temperature:.3f}"):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class PromptCache:
+    """
+    Guarda respuestas por clave durante `ttl_s` segundos (LRU acotado a `max_entries`).
+    `get_or_compute` comparte una única llamada en curso entre peticiones
+    concurrentes con la misma clave (single-flight). Los errores no se cachean.
+    """
+
+    def __init__(self, ttl_s: float, max_entries: int):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._inflight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _get_locked(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            value = self._get_locked(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        if self.ttl_s <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_s, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key: str, compute: Callable[[], str], refresh: bool = False) -> str:
+        """
+        Devuelve el valor cacheado o lo calcula con `compute`.
+        Con refresh=True se ignora lo cacheado (pero se sigue compartiendo la
+        llamada en curso si ya hay una) y el resultado nuevo reemplaza al anterior.
+        """
+        with self._lock:
+            if not refresh:
+                value = self._get_locked(key)
+                if value is not None:
+                    self.hits += 1
+                    return value
+            future = self._inflight.get(key)
+            if future is not None:
+                self.shared += 1
+                leader = False
+            else:
+                self.misses += 1
+                future = Future()
+                self._inflight[key] = future
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared_inflight": self.shared,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,60 @@
+"""
+Caché en proceso de rúbricas serializadas (RubricTemplateOut en JSON).
+
+La clave es (id de plantilla, versión). Cada endpoint que modifica la rúbrica
+llama a `bump_version` dentro de su transacción, así una versión nueva nunca
+coincide con una entrada vieja y no hace falta invalidar entre réplicas: las
+entradas viejas salen solas por LRU.
+"""
+
+from collections import OrderedDict
+import threading
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..config import settings
+
+_entries: "OrderedDict[tuple[int, int], bytes]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def etag(template_id: int, version: int) -> str:
+    return f'"rubric-{template_id}-v{version}"'
+
+
+def get(template_id: int, version: int) -> bytes | None:
+    key = (template_id, version)
+    with _lock:
+        body = _entries.get(key)
+        if body is None:
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return body
+
+
+def put(template_id: int, version: int, body: bytes):
+    with _lock:
+        _entries[(template_id, version)] = body
+        _entries.move_to_end((template_id, version))
+        while len(_entries) > max(1, settings.rubric_cache_max_entries):
+            _entries.popitem(last=False)
+
+
+def bump_version(db: Session, template_id: int):
+    """Incrementa la versión de la rúbrica (se confirma con el commit del llamador)."""
+    db.execute(
+        update(models.RubricTemplate)
+        .where(models.RubricTemplate.id == template_id)
+        .values(version=models.RubricTemplate.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def stats() -> dict:
+    with _lock:
+        return {"entries": len(_entries), **_stats}
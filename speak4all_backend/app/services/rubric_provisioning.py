@@ -0,0 +1,155 @@
+"""
+Creación de rúbricas en bloque (por defecto o clonadas de otra rúbrica).
+
+Las plantillas, criterios y niveles se insertan con tres INSERT ... RETURNING
+(uno por tabla) sin importar cuántos ejercicios se provisionen; los ids
+devueltos se usan para enlazar cada nivel con su criterio.
+"""
+
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, joinedload
+
+from .. import models
+
+_DEFAULT_LEVELS = [
+    {"name": "Excelente", "points": 25, "order": 3},
+    {"name": "Bueno", "points": 20, "order": 2},
+    {"name": "Aceptable", "points": 15, "order": 1},
+    {"name": "Insuficiente", "points": 0, "order": 0},
+]
+
+# Criterios base de la rúbrica por defecto (100 puntos totales)
+DEFAULT_RUBRIC_MAX_SCORE = 100
+DEFAULT_RUBRIC_CRITERIA = [
+    {
+        "name": "Pronunciación",
+        "description": "Claridad y corrección de la pronunciación",
+        "max_points": 25,
+        "levels": _DEFAULT_LEVELS,
+    },
+    {
+        "name": "Fluidez",
+        "description": "Continuidad y naturalidad en el habla",
+        "max_points": 25,
+        "levels": _DEFAULT_LEVELS,
+    },
+    {
+        "name": "Comprensión",
+        "description": "Demostración de comprensión del contenido",
+        "max_points": 25,
+        "levels": _DEFAULT_LEVELS,
+    },
+    {
+        "name": "Participación",
+        "description": "Nivel de participación y esfuerzo",
+        "max_points": 25,
+        "levels": _DEFAULT_LEVELS,
+    },
+]
+
+
+def criteria_from_template(db: Session, template_id: int) -> tuple[int, list[dict]] | None:
+    """
+    Lee una rúbrica existente (criterios y niveles no eliminados) con el mismo
+    formato que DEFAULT_RUBRIC_CRITERIA. Devuelve (max_score, criterios).
+    """
+    template = db.query(models.RubricTemplate).filter(
+        models.RubricTemplate.id == template_id,
+        models.RubricTemplate.is_deleted.is_(False),
+    ).options(
+        joinedload(models.RubricTemplate.criteria).joinedload(models.RubricCriteria.levels)
+    ).first()
+    if not template:
+        return None
+
+    criteria = []
+    for crit in sorted(template.criteria, key=lambda c: (c.order, c.id)):
+        if crit.is_deleted:
+            continue
+        criteria.append({
+            "name": crit.name,
+            "description": crit.description,
+            "max_points": crit.max_points,
+            "levels": [
+                {"name": l.name, "description": l.description, "points": l.points, "order": l.order}
+                for l in sorted(crit.levels, key=lambda l: (l.order, l.id))
+                if not l.is_deleted
+            ],
+        })
+    return template.max_score, criteria
+
+
+def provision_rubrics(
+    db: Session,
+    therapist_id: int,
+    course_exercise_ids: list[int],
+    criteria: list[dict],
+    max_score: int = DEFAULT_RUBRIC_MAX_SCORE,
+) -> dict[int, int]:
+    """
+    Crea la misma rúbrica en cada ejercicio de curso (sin commit).
+    Devuelve {course_exercise_id: rubric_template_id}.
+    """
+    if not course_exercise_ids:
+        return {}
+    now = datetime.now(timezone.utc)
+
+    templates = db.execute(
+        insert(models.RubricTemplate).returning(
+            models.RubricTemplate.id, models.RubricTemplate.course_exercise_id, sort_by_parameter_order=True
+        ),
+        [
+            {
+                "course_exercise_id": ce_id,
+                "therapist_id": therapist_id,
+                "max_score": max_score,
+                "version": 1,
+                "is_deleted": False,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for ce_id in course_exercise_ids
+        ],
+    ).all()
+    if not criteria:
+        return {row.course_exercise_id: row.id for row in templates}
+
+    criteria_rows = [
+        {
+            "rubric_template_id": template.id,
+            "name": crit["name"],
+            "description": crit.get("description"),
+            "max_points": crit["max_points"],
+            "order": idx,
+            "is_deleted": False,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for template in templates
+        for idx, crit in enumerate(criteria)
+    ]
+    criteria_ids = db.execute(
+        insert(models.RubricCriteria).returning(models.RubricCriteria.id, sort_by_parameter_order=True),
+        criteria_rows,
+    ).scalars().all()
+
+    # criteria_ids sigue el orden de criteria_rows: plantilla × criterio
+    level_rows = [
+        {
+            "rubric_criteria_id": criteria_id,
+            "name": level["name"],
+            "description": level.get("description"),
+            "points": level["points"],
+            "order": level["order"],
+            "is_deleted": False,
+            "created_at": now,
+        }
+        for criteria_id, crit in zip(criteria_ids, criteria * len(templates))
+        for level in crit["levels"]
+    ]
+    if level_rows:
+        db.execute(insert(models.RubricLevel), level_rows)
+
+    return {row.course_exercise_id: row.id for row in templates}
@@ -0,0 +1,118 @@
+"""Caché en disco de segmentos TTS direccionada por contenido."""
+
+from pathlib import Path
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def segment_key(text: str, voice: str, model: str, instructions: str, sample_rate: int) -> str:
+    """
+    Clave estable de un segmento: hash de todo lo que influye en el audio generado.
+    """
+    h = hashlib.sha256()
+    for part in (text, voice, model, instructions, str(sample_rate)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class TTSSegmentCache:
+    """
+    Guarda los WAV ya sintetizados en `root/<kk>/<clave>.wav`.
+    La expulsión es LRU por tamaño total: al superar `max_bytes` se borran
+    los ficheros con mtime más antiguo (cada acierto actualiza el mtime)
+    hasta bajar al 90% del límite.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        # tamaño aproximado en disco; evita recorrer el directorio en cada put
+        self._bytes = sum(f.stat().st_size for f in self.root.glob("*/*.wav"))
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.wav"
+
+    def get(self, key: str, dest: Path) -> bool:
+        """Copia el segmento cacheado a `dest`. Devuelve False si no está."""
+        src = self._path(key)
+        try:
+            shutil.copyfile(src, dest)
+            os.utime(src, None)  # marca como usado recientemente
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put(self, key: str, src: Path) -> None:
+        """Guarda `src` en la caché (escritura atómica) y aplica la expulsión."""
+        target = self._path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            shutil.copyfile(src, tmp)
+            try:
+                replaced = target.stat().st_size  # sobrescribir no debe contar dos veces
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp, target)
+            size = target.stat().st_size
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el segmento {key[:12]} en caché: {e}")
+            tmp.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            self._bytes += size - replaced
+            over_limit = self._bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def evict(self) -> None:
+        """Borra los segmentos menos usados hasta quedar por debajo de max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for f in self.root.glob("*/*.wav"):
+                try:
+                    st = f.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, f))
+                total += st.st_size
+
+            if total <= self.max_bytes:
+                self._bytes = total
+                return
+
+            low_watermark = int(self.max_bytes * 0.9)
+            entries.sort()
+            for _, size, f in entries:
+                if total <= low_watermark:
+                    break
+                f.unlink(missing_ok=True)
+                total -= size
+            self._bytes = total
+            logger.info(f"Caché TTS recortada a {total / (1024 * 1024):.1f}MB")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "bytes": self._bytes,
+            }
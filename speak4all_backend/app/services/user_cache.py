@@ -0,0 +1,97 @@
+"""
+Caché en proceso del usuario autenticado (usado por deps.get_current_user).
+
+La clave es (user_id, iat del token). Se guarda una copia desacoplada de la
+fila de `users`; en cada acierto se une a la sesión del request con
+`merge(load=False)`, sin SELECT, así los endpoints pueden seguir modificando
+`current_user` y hacer commit como antes.
+
+Las rutas que cambian al usuario llaman a `invalidate_user`. La invalidación
+es local a la réplica: el TTL corto acota lo que puede tardar en verse un
+cambio hecho en otra réplica.
+"""
+
+import threading
+import time
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .. import models
+from ..config import settings
+
+_entries: dict[int, dict[int, tuple[float, models.User]]] = {}  # user_id -> iat -> (expira, copia)
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_size = 0
+
+
+def _snapshot(user: models.User) -> models.User:
+    """Copia solo las columnas en un objeto nuevo, desacoplado de cualquier sesión."""
+    copy = models.User(**{
+        attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs
+    })
+    make_transient_to_detached(copy)
+    return copy
+
+
+def get(db: Session, user_id: int, iat: int) -> models.User | None:
+    """Devuelve el usuario unido a `db` si está en caché y no ha expirado."""
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(user_id, {}).get(iat)
+        if entry is None or entry[0] <= now:
+            _stats["misses"] += 1
+            return None
+        _stats["hits"] += 1
+        snapshot = entry[1]
+    return db.merge(snapshot, load=False)
+
+
+def put(user_id: int, iat: int, user: models.User):
+    global _size
+    if settings.user_cache_ttl_s <= 0:
+        return
+    snapshot = _snapshot(user)
+    now = time.monotonic()
+    with _lock:
+        if _size >= settings.user_cache_max_entries:
+            _prune(now)
+        if _size >= settings.user_cache_max_entries:
+            return
+        tokens = _entries.setdefault(user_id, {})
+        if iat not in tokens:
+            _size += 1
+        tokens[iat] = (now + settings.user_cache_ttl_s, snapshot)
+
+
+def _prune(now: float):
+    """Quita entradas expiradas (se llama con el lock tomado)."""
+    global _size
+    for user_id in list(_entries):
+        tokens = _entries[user_id]
+        for iat in [iat for iat, (expires, _) in tokens.items() if expires <= now]:
+            del tokens[iat]
+            _size -= 1
+        if not tokens:
+            del _entries[user_id]
+
+
+def invalidate_user(user_id: int):
+    """Olvida todas las entradas del usuario (perfil, avatar, contraseña, baja)."""
+    global _size
+    with _lock:
+        tokens = _entries.pop(user_id, None)
+        if tokens:
+            _size -= len(tokens)
+        _stats["invalidations"] += 1
+
+
+def stats() -> dict:
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "entries": _size,
+            **_stats,
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
@@ -1,65 +1,301 @@
 """
 WebSocket Connection Manager for real-time updates in courses
-Manages connections per course and broadcasts updates to connected clients
+Manages connections per course and broadcasts updates to connected clients.
+A connection is either a legacy per-course socket (/ws/courses/{id}) or a
+per-user socket (/ws) subscribed to all of the user's courses; both are kept
+in the course index (`active_connections`).
+With several workers/replicas, broadcasts are relayed to the other processes
+through the Postgres LISTEN/NOTIFY backplane (see ws_backplane).
 """
 
-from typing import Dict, Set
+from typing import Dict, Iterable, Optional, Set
 from fastapi import WebSocket
+import asyncio
 import logging
 import json
 
+from . import ws_backplane
+from .config import settings
+from .ws_backplane import PostgresBackplane
+
 logger = logging.getLogger(__name__)
 
 
+class ClientConnection:
+    """One socket with its bounded send queue, drained by its own writer task"""
+
+    def __init__(self, websocket: WebSocket, course_ids: Set[int], user_id: Optional[int], multiplexed: bool = False):
+        self.websocket = websocket
+        self.course_ids = course_ids
+        self.user_id = user_id
+        # True for per-user sockets: course subscriptions follow membership changes
+        self.multiplexed = multiplexed
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=settings.ws_send_queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.closing = False
+
+
 class ConnectionManager:
     """Manages WebSocket connections organized by course ID"""
 
     def __init__(self):
-        # course_id -> set of WebSocket connections
+        # Course index: course_id -> set of WebSocket connections subscribed to it
         self.active_connections: Dict[int, Set[WebSocket]] = {}
+        # user_id -> set of WebSocket connections (for user-targeted events)
+        self.user_connections: Dict[int, Set[WebSocket]] = {}
+        # WebSocket -> its send queue and writer task
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.stats_counters = {
+            "sent_messages": 0,
+            "dropped_messages": 0,
+            "overflow_disconnects": 0,
+            "send_timeouts": 0,
+            "peak_queue_depth": 0,
+        }
+        self._closing: Set[asyncio.Task] = set()
+        # Relay to other workers; None = single process / local delivery only
+        self.backplane: Optional[PostgresBackplane] = None
+
+    async def start_backplane(self):
+        """Start relaying broadcasts between workers (no-op without Postgres)"""
+        self.backplane = ws_backplane.from_settings(self._relay)
+        if self.backplane is not None:
+            await self.backplane.start()
+
+    async def stop_backplane(self):
+        if self.backplane is not None:
+            await self.backplane.stop()
+            self.backplane = None
 
-    async def connect(self, websocket: WebSocket, course_id: int):
+    def stats(self) -> dict:
+        """Local connection counts, send queue depth, drops and backplane counters (for /metrics)"""
+        backplane = None
+        if self.backplane is not None:
+            backplane = {
+                "connected": self.backplane.connected,
+                "pending_publishes": self.backplane.pending,
+                **self.backplane.stats,
+            }
+        depths = [client.queue.qsize() for client in self.clients.values()]
+        return {
+            "courses": len(self.active_connections),
+            "connections": len(self.clients),
+            "user_sockets": sum(1 for client in self.clients.values() if client.multiplexed),
+            "queued_messages": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            **self.stats_counters,
+            "backplane": backplane,
+        }
+
+    def _publish(self, target: str, target_id: int, message: dict):
+        """Hand the event to the backplane; publishing runs in the background"""
+        if self.backplane is not None:
+            self.backplane.publish({"target": target, "id": target_id, "message": message})
+
+    async def _relay(self, event: dict):
+        """Deliver a broadcast published by another worker to the local sockets"""
+        if event.get("target") == "course":
+            await self._deliver_to_course(event["id"], event["message"])
+        elif event.get("target") == "user":
+            await self._deliver_to_user(event["id"], event["message"])
+        elif event.get("target") == "subscribe":
+            self._subscribe_local(event["id"], event["message"]["course_id"])
+        elif event.get("target") == "unsubscribe":
+            self._unsubscribe_local(event["id"], event["message"]["course_id"])
+        elif event.get("target") == "course_closed":
+            self._close_course_local(event["id"])
+
+    async def connect(self, websocket: WebSocket, course_id: int, user_id: Optional[int] = None):
         """Accept and register a new WebSocket connection for a course"""
         await websocket.accept()
-        if course_id not in self.active_connections:
-            self.active_connections[course_id] = set()
-        self.active_connections[course_id].add(websocket)
+        self._register(ClientConnection(websocket, {course_id}, user_id))
         logger.info(f"Client connected to course {course_id}. Total: {len(self.active_connections[course_id])}")
 
-    def disconnect(self, websocket: WebSocket, course_id: int):
-        """Remove a WebSocket connection from a course"""
-        if course_id in self.active_connections:
-            self.active_connections[course_id].discard(websocket)
-            if not self.active_connections[course_id]:
+    async def connect_user(self, websocket: WebSocket, user_id: int, course_ids: Iterable[int]):
+        """Accept a per-user connection subscribed to all of the user's courses"""
+        await websocket.accept()
+        client = ClientConnection(websocket, set(course_ids), user_id, multiplexed=True)
+        self._register(client)
+        logger.info(f"User {user_id} connected, subscribed to {len(client.course_ids)} courses")
+
+    def _register(self, client: ClientConnection):
+        client.writer = asyncio.create_task(self._writer(client))
+        self.clients[client.websocket] = client
+        for course_id in client.course_ids:
+            self.active_connections.setdefault(course_id, set()).add(client.websocket)
+        if client.user_id is not None:
+            self.user_connections.setdefault(client.user_id, set()).add(client.websocket)
+
+    def _unindex(self, course_id: int, websocket: WebSocket):
+        connections = self.active_connections.get(course_id)
+        if connections is not None:
+            connections.discard(websocket)
+            if not connections:
                 del self.active_connections[course_id]
-            logger.info(f"Client disconnected from course {course_id}")
+
+    def disconnect(self, websocket: WebSocket, course_id: Optional[int] = None, user_id: Optional[int] = None):
+        """Remove a WebSocket connection from every course it is subscribed to"""
+        client = self.clients.pop(websocket, None)
+        if client is not None:
+            if client.writer is not None:
+                client.writer.cancel()
+            course_ids, user_id = client.course_ids, client.user_id
+        else:
+            course_ids = {course_id} if course_id is not None else set()
+        for cid in course_ids:
+            self._unindex(cid, websocket)
+        if course_ids:
+            logger.info(f"Client disconnected from courses {sorted(course_ids)}")
+        if user_id is not None and user_id in self.user_connections:
+            self.user_connections[user_id].discard(websocket)
+            if not self.user_connections[user_id]:
+                del self.user_connections[user_id]
+
+    async def subscribe_user(self, user_id: int, course_id: int):
+        """Add a course to the user's per-user connections, on every worker (joined a course)"""
+        self._subscribe_local(user_id, course_id)
+        self._publish("subscribe", user_id, {"course_id": course_id})
+
+    async def unsubscribe_user(self, user_id: int, course_id: int):
+        """Remove a course from the user's connections, on every worker (left or removed)"""
+        self._unsubscribe_local(user_id, course_id)
+        self._publish("unsubscribe", user_id, {"course_id": course_id})
+
+    async def close_course(self, course_id: int):
+        """Unsubscribe every connection from a deleted course, on every worker"""
+        self._close_course_local(course_id)
+        self._publish("course_closed", course_id, {})
+
+    def _subscribe_local(self, user_id: int, course_id: int):
+        for websocket in list(self.user_connections.get(user_id, ())):
+            client = self.clients.get(websocket)
+            if client is None or not client.multiplexed or course_id in client.course_ids:
+                continue
+            client.course_ids.add(course_id)
+            self.active_connections.setdefault(course_id, set()).add(websocket)
+            self._enqueue(client, json.dumps({"type": "subscribed", "course_id": course_id}))
+
+    def _unsubscribe_client(self, client: ClientConnection, course_id: int):
+        if not client.multiplexed:
+            # A legacy socket only serves this course: close it
+            self._drop(client, code=1008)
+            return
+        client.course_ids.discard(course_id)
+        self._unindex(course_id, client.websocket)
+        self._enqueue(client, json.dumps({"type": "unsubscribed", "course_id": course_id}))
+
+    def _unsubscribe_local(self, user_id: int, course_id: int):
+        for websocket in list(self.user_connections.get(user_id, ())):
+            client = self.clients.get(websocket)
+            if client is not None and course_id in client.course_ids:
+                self._unsubscribe_client(client, course_id)
+
+    def _close_course_local(self, course_id: int):
+        for websocket in list(self.active_connections.get(course_id, ())):
+            client = self.clients.get(websocket)
+            if client is not None:
+                self._unsubscribe_client(client, course_id)
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
-        """Send a message to a specific WebSocket connection"""
+        """Send a message to a specific WebSocket connection (queued behind pending broadcasts)"""
+        client = self.clients.get(websocket)
+        if client is not None:
+            self._enqueue(client, message)
+            return
         try:
             await websocket.send_text(message)
         except Exception as e:
             logger.error(f"Error sending personal message: {e}")
 
+    def _enqueue(self, client: "ClientConnection", message_str: str):
+        """Queue a message for the connection's writer; never waits on the socket"""
+        if client.closing:
+            return
+        try:
+            client.queue.put_nowait(message_str)
+        except asyncio.QueueFull:
+            self.stats_counters["dropped_messages"] += 1
+            if settings.ws_overflow_policy == "drop_oldest":
+                client.queue.get_nowait()
+                client.queue.put_nowait(message_str)
+                return
+            self.stats_counters["overflow_disconnects"] += 1
+            logger.warning(f"WebSocket send queue full for user {client.user_id}; disconnecting")
+            self._drop(client, code=1013)  # Try again later
+            return
+        depth = client.queue.qsize()
+        if depth > self.stats_counters["peak_queue_depth"]:
+            self.stats_counters["peak_queue_depth"] = depth
+
+    async def _writer(self, client: "ClientConnection"):
+        """Drain one connection's queue; a slow or dead socket only delays itself"""
+        while True:
+            message_str = await client.queue.get()
+            try:
+                await asyncio.wait_for(client.websocket.send_text(message_str), timeout=settings.ws_send_timeout_s)
+            except asyncio.TimeoutError:
+                self.stats_counters["send_timeouts"] += 1
+                logger.warning(f"WebSocket send timed out for user {client.user_id}; disconnecting")
+                self._drop(client, code=1013)
+                return
+            except Exception as e:
+                logger.error(f"Error sending to user {client.user_id}: {e}")
+                self._drop(client, code=1011)
+                return
+            self.stats_counters["sent_messages"] += 1
+
+    def _drop(self, client: "ClientConnection", code: int):
+        """Unregister a connection and close it in the background"""
+        if client.closing:
+            return
+        client.closing = True
+        self.disconnect(client.websocket)
+        task = asyncio.create_task(self._close(client.websocket, code))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await asyncio.wait_for(websocket.close(code=code), timeout=settings.ws_send_timeout_s)
+        except Exception:
+            pass  # The receive loop in the router sees the disconnect and exits
+
     async def broadcast_to_course(self, course_id: int, message: dict):
-        """Broadcast a message to all connections in a specific course"""
+        """Broadcast a message to all connections in a specific course, on every worker"""
+        # Per-user sockets receive several courses: tag each event with its course
+        message = {**message, "course_id": course_id}
+        await self._deliver_to_course(course_id, message)
+        self._publish("course", course_id, message)
+
+    async def _deliver_to_course(self, course_id: int, message: dict):
+        """Queue a message for this worker's connections in a course"""
         if course_id not in self.active_connections:
             logger.debug(f"No active connections for course {course_id}")
             return
 
         message_str = json.dumps(message)
-        disconnected = []
+        for connection in list(self.active_connections.get(course_id, ())):
+            client = self.clients.get(connection)
+            if client is not None:
+                self._enqueue(client, message_str)
 
-        for connection in self.active_connections[course_id]:
-            try:
-                await connection.send_text(message_str)
-            except Exception as e:
-                logger.error(f"Error broadcasting to course {course_id}: {e}")
-                disconnected.append(connection)
+    async def send_to_user(self, user_id: int, message: dict):
+        """Send a message to every connection opened by a specific user, on every worker"""
+        await self._deliver_to_user(user_id, message)
+        self._publish("user", user_id, message)
 
-        # Clean up disconnected clients
-        for connection in disconnected:
-            self.disconnect(connection, course_id)
+    async def _deliver_to_user(self, user_id: int, message: dict):
+        """Queue a message for this worker's connections of a user"""
+        connections = self.user_connections.get(user_id)
+        if not connections:
+            logger.debug(f"No active connections for user {user_id}")
+            return
+
+        message_str = json.dumps(message)
+        for connection in list(connections):
+            client = self.clients.get(connection)
+            if client is not None:
+                self._enqueue(client, message_str)
 
     async def broadcast_exercise_published(self, course_id: int, course_exercise_data: dict):
         """Broadcast when a new exercise is published to a course"""
@@ -110,6 +346,20 @@ class ConnectionManager:
             "data": request_data
         })
 
+    async def broadcast_evaluations_created(self, course_id: int, data: dict):
+        """Broadcast once per course when a batch of evaluations is created"""
+        await self.broadcast_to_course(course_id, {
+            "type": "evaluations_created",
+            "data": data
+        })
+
+    async def broadcast_exercise_audio_ready(self, therapist_id: int, data: dict):
+        """Notify the therapist that an exercise audio build finished (ok or failed)"""
+        await self.send_to_user(therapist_id, {
+            "type": "exercise_audio_ready",
+            "data": data
+        })
+
 
 # Global instance
 manager = ConnectionManager()
@@ -0,0 +1,207 @@
+"""
+Backplane de WebSocket sobre LISTEN/NOTIFY de Postgres.
+
+Con varios workers de uvicorn (o varias réplicas) cada proceso solo conoce sus
+propios sockets. Cada worker abre una conexión asyncpg propia que escucha el
+canal `settings.ws_backplane_channel`; `ConnectionManager` publica ahí cada
+broadcast y los demás workers lo reenvían a sus sockets locales. El worker que
+publica entrega primero en local, publica en segundo plano (la petición HTTP
+no espera a NOTIFY) e ignora su propia notificación.
+
+NOTIFY admite ~8000 bytes por mensaje: los más grandes se parten en trozos
+que se publican en la misma transacción y el receptor los une por índice.
+Las publicaciones pasan por una cola acotada (`settings.ws_backplane_queue_size`)
+que vacía una sola tarea; si se llena, el mensaje se entrega solo en local y
+cuenta en `dropped_publishes`. Si la conexión se pierde, los broadcasts se
+entregan solo en local mientras se reconecta con espera creciente.
+
+Prueba con varios procesos: pytest tests/test_ws_backplane.py (necesita Postgres)
+"""
+
+from itertools import count
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from sqlalchemy.engine import make_url
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+CHUNK_CHARS = 7000  # json.dumps escapa a ASCII: caracteres == bytes
+KEEPALIVE_S = 30
+MAX_RECONNECT_DELAY_S = 30
+PARTIAL_TTL_S = 60  # trozos huérfanos (el emisor cayó a mitad) se descartan
+
+
+class PostgresBackplane:
+    def __init__(self, dsn: str, connect_args: dict, channel: str, on_message, queue_size: int = 1000):
+        self.origin = uuid.uuid4().hex
+        self._dsn = dsn
+        self._connect_args = connect_args
+        self._channel = channel
+        self._on_message = on_message  # async (message: dict) -> None
+        self._conn = None
+        self._lock = asyncio.Lock()  # asyncpg: una operación a la vez por conexión
+        self._task: asyncio.Task | None = None
+        self._ids = count()
+        self._partial: dict[tuple[str, int], tuple[float, list]] = {}
+        self._relays: set[asyncio.Task] = set()
+        # Publicaciones pendientes; una sola tarea las envía en orden
+        self._outbox: asyncio.Queue[dict] = asyncio.Queue(maxsize=max(1, queue_size))
+        self._publisher: asyncio.Task | None = None
+        self.stats = {
+            "published": 0,
+            "received": 0,
+            "publish_errors": 0,
+            "dropped_publishes": 0,
+            "local_only": 0,
+            "reconnects": 0,
+        }
+
+    @property
+    def connected(self) -> bool:
+        return self._conn is not None
+
+    @property
+    def pending(self) -> int:
+        return self._outbox.qsize()
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        self._publisher = asyncio.create_task(self._drain())
+
+    async def stop(self):
+        tasks = [task for task in (self._task, self._publisher) if task is not None]
+        self._task = self._publisher = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self):
+        import asyncpg
+
+        delay = 1
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(self._dsn, **self._connect_args)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(self._channel, self._on_notify)
+                self._conn = conn
+                delay = 1
+                logger.info(f"Backplane WebSocket escuchando en '{self._channel}'")
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), timeout=KEEPALIVE_S)
+                    except asyncio.TimeoutError:
+                        # Detecta conexiones muertas que no avisan (TCP colgado)
+                        async with self._lock:
+                            await conn.execute("SELECT 1", timeout=10)
+                logger.warning("Backplane WebSocket: conexión cerrada")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Backplane WebSocket sin conexión ({e}); solo entrega local")
+            finally:
+                self._conn = None
+                if conn is not None and not conn.is_closed():
+                    conn.terminate()
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY_S)
+
+    def publish(self, message: dict):
+        """
+        Encola la publicación para los demás workers y vuelve en seguida: quien
+        emite (una petición HTTP) no espera a NOTIFY. Con la cola llena el
+        mensaje se descarta (solo entrega local). Nunca lanza.
+        """
+        if self._conn is None:
+            self.stats["local_only"] += 1
+            return
+        try:
+            self._outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            self.stats["dropped_publishes"] += 1
+            logger.warning("Backplane WebSocket: cola de publicación llena; mensaje solo en local")
+
+    async def _drain(self):
+        while True:
+            message = await self._outbox.get()
+            await self._notify(message)
+
+    async def _notify(self, message: dict):
+        conn = self._conn
+        if conn is None:
+            self.stats["local_only"] += 1
+            return
+        data = json.dumps(message)
+        chunks = [data[i:i + CHUNK_CHARS] for i in range(0, len(data), CHUNK_CHARS)]
+        msg_id = next(self._ids)
+        envelopes = [
+            json.dumps({"o": self.origin, "id": msg_id, "i": i, "n": len(chunks), "d": chunk})
+            for i, chunk in enumerate(chunks)
+        ]
+        try:
+            async with self._lock:
+                await conn.execute(
+                    "SELECT pg_notify($1, e) FROM unnest($2::text[]) AS e",
+                    self._channel, envelopes, timeout=10,
+                )
+            self.stats["published"] += 1
+        except Exception as e:
+            self.stats["publish_errors"] += 1
+            logger.warning(f"Backplane WebSocket: no se pudo publicar ({e})")
+
+    def _on_notify(self, conn, pid, channel, payload: str):
+        try:
+            envelope = json.loads(payload)
+            if envelope["o"] == self.origin:
+                return
+            data = self._assemble(envelope)
+            if data is None:
+                return
+            message = json.loads(data)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Backplane WebSocket: notificación inválida ({e})")
+            return
+        self.stats["received"] += 1
+        task = asyncio.get_running_loop().create_task(self._on_message(message))
+        self._relays.add(task)
+        task.add_done_callback(self._relays.discard)
+
+    def _assemble(self, envelope: dict) -> str | None:
+        if envelope["n"] == 1:
+            return envelope["d"]
+        now = time.monotonic()
+        for key in [k for k, (started, _) in self._partial.items() if now - started > PARTIAL_TTL_S]:
+            del self._partial[key]
+        key = (envelope["o"], envelope["id"])
+        started, parts = self._partial.setdefault(key, (now, [None] * envelope["n"]))
+        parts[envelope["i"]] = envelope["d"]
+        if any(part is None for part in parts):
+            return None
+        del self._partial[key]
+        return "".join(parts)
+
+
+def from_settings(on_message) -> PostgresBackplane | None:
+    """Backplane para la base de datos configurada, o None (un solo worker / no Postgres)."""
+    if not settings.ws_backplane_enabled:
+        return None
+    url = make_url(settings.database_url)
+    if url.get_backend_name() != "postgresql":
+        return None
+
+    from .database import _async_engine_args
+
+    async_url, connect_args = _async_engine_args(settings.database_url)
+    dsn = async_url.set(drivername="postgresql").render_as_string(hide_password=False)
+    return PostgresBackplane(
+        dsn, connect_args, settings.ws_backplane_channel, on_message, settings.ws_backplane_queue_size,
+    )
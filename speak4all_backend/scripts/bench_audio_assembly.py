@@ -0,0 +1,172 @@
+"""
+Benchmark del ensamblado del audio de un ejercicio: NumPy en memoria frente
+al camino anterior con ffmpeg (un WAV de silencio por pausa, una normalización
+por fragmento y un concat final).
+
+Los fragmentos TTS se generan una sola vez con el proveedor local (tonos WAV
+a --tts-rate, como los 24 kHz de OpenAI) y solo se mide el ensamblado hasta el
+MP3, sin red:
+
+    python scripts/bench_audio_assembly.py --segments 20 --repeat 5
+
+Necesita ffmpeg en el PATH. Muestra la mediana por ejercicio, el número de
+procesos ffmpeg lanzados y la duración de cada MP3 (deben coincidir).
+"""
+
+from pathlib import Path
+import argparse
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services import ai_exercises  # noqa: E402
+from app.services.ai_providers import LocalProvider  # noqa: E402
+
+SAMPLE_RATE = ai_exercises.SAMPLE_RATE
+BITRATE = ai_exercises.BITRATE
+
+_ffmpeg_runs = 0
+_subprocess_run = subprocess.run
+
+
+def _counting_run(cmd, *args, **kwargs):
+    """Cuenta los procesos ffmpeg de ambos caminos (audio_assembly usa subprocess.run)."""
+    global _ffmpeg_runs
+    if cmd and cmd[0] == "ffmpeg":
+        _ffmpeg_runs += 1
+    return _subprocess_run(cmd, *args, **kwargs)
+
+
+subprocess.run = _counting_run
+
+
+def _ffmpeg(cmd: list[str]):
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+# --- Camino anterior (gen_silence + ensure_wav + concat_to_mp3) ---
+
+def _legacy_gen_silence(seconds: float, out_wav: Path):
+    _ffmpeg([
+        "ffmpeg", "-y",
+        "-f", "lavfi", "-t", f"{seconds}",
+        "-i", f"anullsrc=r={SAMPLE_RATE}:cl=mono",
+        "-ar", str(SAMPLE_RATE), "-ac", "1",
+        str(out_wav),
+    ])
+
+
+def _legacy_ensure_wav(src: Path, out_wav: Path):
+    _ffmpeg(["ffmpeg", "-y", "-i", str(src), "-ar", str(SAMPLE_RATE), "-ac", "1", str(out_wav)])
+
+
+def _legacy_concat_to_mp3(wavs: list[Path], out_mp3: Path):
+    valid = [w for w in wavs if w.exists() and w.stat().st_size > ai_exercises.SEGMENT_MIN_BYTES]
+    lst = out_mp3.with_suffix(".txt")
+    lst.write_text("".join(f"file '{w.as_posix()}'\n" for w in valid), encoding="utf-8")
+    _ffmpeg([
+        "ffmpeg", "-y",
+        "-f", "concat", "-safe", "0",
+        "-i", str(lst),
+        "-ar", str(SAMPLE_RATE), "-ac", "1",
+        "-af", "loudnorm,highpass=f=120,lowpass=f=9000",
+        "-c:a", "libmp3lame", "-b:a", BITRATE,
+        str(out_mp3),
+    ])
+
+
+def legacy_assemble(segments: list[dict], seg_wavs: list[Path], out_mp3: Path):
+    tmp = out_mp3.parent / "tmp"
+    tmp.mkdir()
+    chain: list[Path] = []
+    for i, (seg, wav) in enumerate(zip(segments, seg_wavs), start=1):
+        chain.append(wav)
+        pause = max(0.0, float(seg["pause"]))
+        if pause > 0:
+            sil = tmp / f"sil_{i:03d}.wav"
+            _legacy_gen_silence(pause, sil)
+            chain.append(sil)
+    norm = []
+    for i, wav in enumerate(chain):
+        n = tmp / f"n_{i:03d}.wav"
+        _legacy_ensure_wav(wav, n)
+        norm.append(n)
+    _legacy_concat_to_mp3(norm, out_mp3)
+
+
+# --- Medición ---
+
+def _duration_s(mp3: Path) -> float:
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(mp3)],
+        capture_output=True, text=True,
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return float("nan")
+
+
+def _script(n: int) -> str:
+    words = ["sol", "casa", "perro", "mariposa", "tren", "luna", "gato", "ratón"]
+    blocks = []
+    for i in range(n):
+        word = words[i % len(words)]
+        if i % 2:
+            blocks.append(f"[REP]{word}[/REP]")
+        else:
+            blocks.append(f"Ahora vamos a decir la palabra {word} despacio, número {i}.")
+    return " ".join(blocks)
+
+
+def _run(label: str, assemble, segments, seg_wavs, workdir: Path, repeat: int):
+    global _ffmpeg_runs
+    times = []
+    out = None
+    _ffmpeg_runs = 0
+    for r in range(repeat):
+        run_dir = workdir / f"{label}_{r}"
+        run_dir.mkdir()
+        out = run_dir / "exercise.mp3"
+        started = time.perf_counter()
+        assemble(segments, seg_wavs, out)
+        times.append(time.perf_counter() - started)
+    print(f"  {label:<8} mediana={statistics.median(times) * 1000:8.1f}ms "
+          f"min={min(times) * 1000:8.1f}ms "
+          f"ffmpeg/ejercicio={_ffmpeg_runs / repeat:5.1f} "
+          f"mp3={_duration_s(out):6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=20, help="bloques del guion")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tts-rate", type=int, default=24000, help="frecuencia de los WAV del TTS")
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        sys.exit("ffmpeg no está en el PATH")
+
+    segments = ai_exercises.split_into_segments(_script(args.segments))
+    provider = LocalProvider()
+    with tempfile.TemporaryDirectory(prefix="bench_audio_") as tmp:
+        workdir = Path(tmp)
+        seg_wavs = []
+        for i, seg in enumerate(segments):
+            wav = workdir / f"seg_{i:03d}.wav"
+            provider.synthesize_wav(seg["text"], wav, "local", "verse", "", args.tts_rate)
+            seg_wavs.append(wav)
+
+        total_pause = sum(float(s["pause"]) for s in segments)
+        print(f"segmentos={len(segments)} pausas={total_pause:.1f}s repeticiones={args.repeat}")
+        _run("numpy", ai_exercises.assemble_to_mp3, segments, seg_wavs, workdir, args.repeat)
+        _run("ffmpeg", legacy_assemble, segments, seg_wavs, workdir, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
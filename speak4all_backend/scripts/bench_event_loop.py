@@ -0,0 +1,175 @@
+"""
+Benchmark de latencia del event loop bajo carga de endpoints async.
+
+Mientras N workers llaman en bucle a endpoints `async def` que usan la base de
+datos (publicar/eliminar ejercicio en un curso, o entregar/anular como
+estudiante), un sondeo pide GET /health cada `--probe-interval` segundos. Si un
+endpoint async bloquea el event loop con consultas síncronas, el sondeo (y
+cualquier otra petición o WebSocket) espera; la latencia del sondeo lo muestra.
+
+Se mide primero sin carga (línea base) y después con carga. Para comparar
+antes/después, ejecutar el mismo comando contra cada versión del backend:
+
+    uvicorn app.main:app --workers 1
+    python scripts/bench_event_loop.py publish --token <JWT terapeuta> \\
+        --course-id 1 --exercise-ids 10 11 12 13 -c 4 -d 20
+    python scripts/bench_event_loop.py submit --tokens <JWT est. 1> <JWT est. 2> \\
+        --course-exercise-id 7 -c 2 -d 20
+
+Cada worker usa su propio ejercicio (publish) o su propio estudiante (submit)
+para no chocar entre sí.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+# PNG de 1×1 para las entregas
+_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+def _request(base_url: str, token: str | None, method: str, path: str,
+             body: bytes | None = None, content_type: str = "application/json"):
+    headers = {"Content-Type": content_type}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    req = urllib.request.Request(base_url.rstrip("/") + path, data=body, method=method, headers=headers)
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        return resp.read()
+
+
+def _multipart(field: str, filename: str, content_type: str, payload: bytes) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def cycle_publish(args, worker: int):
+    """Publica un ejercicio en el curso y lo elimina del curso."""
+    exercise_id = args.exercise_ids[worker % len(args.exercise_ids)]
+    published = json.loads(_request(
+        args.base_url, args.token, "POST", "/course-exercises/",
+        json.dumps({"course_id": args.course_id, "exercise_id": exercise_id}).encode(),
+    ))
+    _request(args.base_url, args.token, "DELETE", f"/course-exercises/{published['id']}")
+
+
+def cycle_submit(args, worker: int):
+    """Entrega una imagen como estudiante y anula la entrega."""
+    token = args.tokens[worker % len(args.tokens)]
+    body, content_type = _multipart("media", "bench.png", "image/png", _PNG)
+    path = f"/submissions/course-exercises/{args.course_exercise_id}"
+    _request(args.base_url, token, "POST", f"{path}/submit", body, content_type)
+    _request(args.base_url, token, "DELETE", f"{path}/cancel")
+
+
+CYCLES = {"publish": cycle_publish, "submit": cycle_submit}
+
+
+def _probe(args, stop: threading.Event) -> list[float]:
+    samples = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            _request(args.base_url, None, "GET", "/health")
+            samples.append(time.perf_counter() - started)
+        except (urllib.error.URLError, OSError):
+            pass
+        stop.wait(args.probe_interval)
+    return samples
+
+
+def _percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def _report(label: str, samples: list[float]):
+    if not samples:
+        print(f"  {label:<10} sin muestras")
+        return
+    print(f"  {label:<10} n={len(samples):<5} "
+          f"p50={_percentile(samples, 50) * 1000:8.1f}ms "
+          f"p95={_percentile(samples, 95) * 1000:8.1f}ms "
+          f"p99={_percentile(samples, 99) * 1000:8.1f}ms "
+          f"max={max(samples) * 1000:8.1f}ms "
+          f"media={statistics.fmean(samples) * 1000:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=sorted(CYCLES))
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token", help="publish: JWT del terapeuta dueño del curso")
+    parser.add_argument("--course-id", type=int, help="publish: curso donde publicar")
+    parser.add_argument("--exercise-ids", type=int, nargs="+", help="publish: ejercicios READY (uno por worker)")
+    parser.add_argument("--tokens", nargs="+", help="submit: JWT de estudiantes inscritos (uno por worker)")
+    parser.add_argument("--course-exercise-id", type=int, help="submit: ejercicio publicado sin fecha vencida")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("-d", "--duration", type=float, default=15.0, help="segundos con carga")
+    parser.add_argument("--baseline", type=float, default=5.0, help="segundos de sondeo sin carga")
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if args.scenario == "publish" and not (args.token and args.course_id and args.exercise_ids):
+        parser.error("publish necesita --token, --course-id y --exercise-ids")
+    if args.scenario == "submit" and not (args.tokens and args.course_exercise_id):
+        parser.error("submit necesita --tokens y --course-exercise-id")
+
+    cycle = CYCLES[args.scenario]
+
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(_probe, args, stop)
+        time.sleep(args.baseline)
+        stop.set()
+        baseline = future.result()
+
+    stop = threading.Event()
+    cycles: list[float] = []
+    errors: list[Exception] = []
+
+    def _worker(worker: int):
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                cycle(args, worker)
+                cycles.append(time.perf_counter() - started)
+            except (urllib.error.URLError, OSError) as e:
+                errors.append(e)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency + 1) as pool:
+        probe = pool.submit(_probe, args, stop)
+        for worker in range(args.concurrency):
+            pool.submit(_worker, worker)
+        time.sleep(args.duration)
+        stop.set()
+        loaded = probe.result()
+
+    print(f"escenario={args.scenario} c={args.concurrency} duración={args.duration:.0f}s "
+          f"ciclos={len(cycles)} errores={len(errors)} ciclos/s={len(cycles) / args.duration:.1f}")
+    print("latencia de GET /health (event loop):")
+    _report("sin carga", baseline)
+    _report("con carga", loaded)
+    print("duración de cada ciclo:")
+    _report("ciclo", cycles)
+    for err in errors[:5]:
+        print(f"  error: {err}")
+
+
+if __name__ == "__main__":
+    main()
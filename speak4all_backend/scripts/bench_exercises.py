@@ -0,0 +1,152 @@
+"""
+Benchmark de los endpoints de ejercicios (preview, preview en streaming y creación).
+
+Pensado para correr contra un backend arrancado con AI_PROVIDER=local, de modo que
+no se use la red ni se gaste en OpenAI:
+
+    AI_PROVIDER=local LOCAL_AI_LATENCY_MS=300 uvicorn app.main:app
+    python scripts/bench_exercises.py --token <JWT de terapeuta> --endpoint preview -n 200 -c 20
+
+Con --endpoint create y --wait-audio se mide también el tiempo hasta que el
+audio del ejercicio queda READY (consultando /exercises/{id}/audio-status).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+
+def _request(base_url: str, token: str, method: str, path: str, body: dict | None = None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(
+        base_url.rstrip("/") + path,
+        data=data,
+        method=method,
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+    )
+    return urllib.request.urlopen(req, timeout=300)
+
+
+def _prompt(i: int, unique: bool) -> str:
+    suffix = f" (variante {uuid.uuid4().hex[:8]})" if unique else ""
+    return f"Ejercicio de repetición de palabras con la letra R para niños de 6 años {i % 10}{suffix}"
+
+
+def run_preview(args, i: int) -> dict:
+    started = time.perf_counter()
+    with _request(args.base_url, args.token, "POST", "/exercises/preview", {
+        "prompt": _prompt(i, args.unique),
+        "regenerate": args.regenerate,
+    }) as resp:
+        resp.read()
+    return {"total": time.perf_counter() - started}
+
+
+def run_stream(args, i: int) -> dict:
+    started = time.perf_counter()
+    first = None
+    with _request(args.base_url, args.token, "POST", "/exercises/preview/stream", {
+        "prompt": _prompt(i, args.unique),
+        "regenerate": args.regenerate,
+    }) as resp:
+        header_ttft = resp.headers.get("X-Time-To-First-Token-Ms")
+        for line in resp:
+            if first is None and line.startswith(b"event: delta"):
+                first = time.perf_counter() - started
+            if line.startswith(b"event: error"):
+                raise RuntimeError("evento error en el stream")
+    result = {"total": time.perf_counter() - started}
+    if first is not None:
+        result["ttft"] = first
+    if header_ttft is not None:
+        result["ttft_header"] = float(header_ttft) / 1000
+    return result
+
+
+def run_create(args, i: int) -> dict:
+    started = time.perf_counter()
+    with _request(args.base_url, args.token, "POST", "/exercises/", {
+        "name": f"bench-{uuid.uuid4().hex[:8]}",
+        "prompt": _prompt(i, args.unique),
+        "text": "",
+        "marked_text": (
+            "¡Hola! Vamos a practicar.\n\n"
+            f"[REP]rana[/REP]\n[REP]perro {i}[/REP]\n[REP 2.0]El ratón corre rápido.[/REP]\n\n"
+            "¡Muy bien! Hasta pronto."
+        ),
+    }) as resp:
+        exercise = json.loads(resp.read())
+    result = {"total": time.perf_counter() - started}
+
+    if args.wait_audio:
+        while True:
+            with _request(args.base_url, args.token, "GET", f"/exercises/{exercise['id']}/audio-status") as resp:
+                audio = json.loads(resp.read())
+            if audio["audio_status"] != "PENDING":
+                break
+            time.sleep(0.25)
+        if audio["audio_status"] != "READY":
+            raise RuntimeError(f"audio FAILED: {audio.get('error')}")
+        result["audio_ready"] = time.perf_counter() - started
+    return result
+
+
+RUNNERS = {"preview": run_preview, "stream": run_stream, "create": run_create}
+
+
+def _percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True, help="JWT de un usuario terapeuta")
+    parser.add_argument("--endpoint", choices=sorted(RUNNERS), default="preview")
+    parser.add_argument("-n", "--requests", type=int, default=100)
+    parser.add_argument("-c", "--concurrency", type=int, default=10)
+    parser.add_argument("--unique", action="store_true", help="prompts distintos (sin aciertos de caché)")
+    parser.add_argument("--regenerate", action="store_true", help="envía regenerate=true (ignora la caché)")
+    parser.add_argument("--wait-audio", action="store_true", help="create: esperar a que el audio esté READY")
+    args = parser.parse_args()
+
+    runner = RUNNERS[args.endpoint]
+
+    def _one(i: int):
+        try:
+            return runner(args, i), None
+        except (urllib.error.URLError, RuntimeError, OSError) as e:
+            return None, e
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(_one, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r, err in results if r is not None]
+    errors = [err for _, err in results if err is not None]
+    print(f"endpoint={args.endpoint} n={args.requests} c={args.concurrency} "
+          f"ok={len(ok)} errores={len(errors)} tiempo={elapsed:.2f}s rps={len(ok) / elapsed:.1f}")
+
+    for metric in ("total", "ttft", "ttft_header", "audio_ready"):
+        values = [r[metric] for r in ok if metric in r]
+        if not values:
+            continue
+        print(f"  {metric:<12} p50={_percentile(values, 50) * 1000:8.1f}ms "
+              f"p95={_percentile(values, 95) * 1000:8.1f}ms "
+              f"p99={_percentile(values, 99) * 1000:8.1f}ms "
+              f"media={statistics.fmean(values) * 1000:8.1f}ms")
+
+    for err in errors[:5]:
+        print(f"  error: {err}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark de throughput de POST /auth/login con muchos clientes a la vez.
+
+Simula el inicio de una clase: `-c` clientes (200 por defecto) hacen login en
+bucle con cuentas existentes durante `-d` segundos. Mientras tanto un sondeo
+pide GET /health para ver si el resto de la API sigue respondiendo. Al final
+muestra logins/s, latencias, los 503 por cola llena (pool de contraseñas) y
+las métricas de /metrics (con --metrics-token, el METRICS_TOKEN de la API).
+
+    uvicorn app.main:app --workers 1
+    python scripts/bench_login.py --password secreto123 \\
+        --emails alumno1@x.com alumno2@x.com alumno3@x.com -c 200 -d 30
+
+Para comparar tamaños del pool, reiniciar la API con otro
+PASSWORD_POOL_WORKERS / PASSWORD_POOL_MAX_PENDING y repetir.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def _request(base_url: str, method: str, path: str, body: dict | None = None, headers: dict | None = None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(
+        base_url.rstrip("/") + path, data=data, method=method,
+        headers={"Content-Type": "application/json", **(headers or {})},
+    )
+    with urllib.request.urlopen(req, timeout=120) as resp:
+        return resp.status, resp.read()
+
+
+def _percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def _report(label: str, samples: list[float]):
+    if not samples:
+        print(f"  {label:<10} sin muestras")
+        return
+    print(f"  {label:<10} n={len(samples):<6} "
+          f"p50={_percentile(samples, 50) * 1000:8.1f}ms "
+          f"p95={_percentile(samples, 95) * 1000:8.1f}ms "
+          f"p99={_percentile(samples, 99) * 1000:8.1f}ms "
+          f"max={max(samples) * 1000:8.1f}ms "
+          f"media={statistics.fmean(samples) * 1000:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--emails", nargs="+", required=True, help="cuentas con contraseña (se reparten entre clientes)")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("-c", "--concurrency", type=int, default=200)
+    parser.add_argument("-d", "--duration", type=float, default=20.0, help="segundos con carga")
+    parser.add_argument("--probe-interval", type=float, default=0.1)
+    parser.add_argument("--metrics-token", help="METRICS_TOKEN de la API para leer /metrics")
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    ok: list[float] = []
+    shed: list[float] = []  # 503 con Retry-After
+    errors: dict[str, int] = {}
+    probe: list[float] = []
+
+    def _client(n: int):
+        email = args.emails[n % len(args.emails)]
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                _request(args.base_url, "POST", "/auth/login", {"email": email, "password": args.password})
+                with lock:
+                    ok.append(time.perf_counter() - started)
+            except urllib.error.HTTPError as e:
+                with lock:
+                    if e.code == 503:
+                        shed.append(time.perf_counter() - started)
+                    else:
+                        errors[str(e.code)] = errors.get(str(e.code), 0) + 1
+                if e.code == 503:
+                    stop.wait(float(e.headers.get("Retry-After", 1)))
+            except (urllib.error.URLError, OSError) as e:
+                with lock:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+    def _probe():
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                _request(args.base_url, "GET", "/health")
+                probe.append(time.perf_counter() - started)
+            except (urllib.error.URLError, OSError):
+                pass
+            stop.wait(args.probe_interval)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency + 1) as pool:
+        pool.submit(_probe)
+        for n in range(args.concurrency):
+            pool.submit(_client, n)
+        time.sleep(args.duration)
+        stop.set()
+
+    print(f"clientes={args.concurrency} duración={args.duration:.0f}s "
+          f"logins={len(ok)} logins/s={len(ok) / args.duration:.1f} "
+          f"503={len(shed)} otros errores={errors or 0}")
+    print("latencia:")
+    _report("login OK", ok)
+    _report("503", shed)
+    _report("/health", probe)
+    if not args.metrics_token:
+        return
+    try:
+        _, body = _request(args.base_url, "GET", "/metrics", headers={"X-Metrics-Token": args.metrics_token})
+        print("pool de contraseñas:", json.loads(body).get("password_pool"))
+    except (urllib.error.URLError, OSError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
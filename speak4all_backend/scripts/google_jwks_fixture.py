@@ -0,0 +1,88 @@
+"""
+JWKS de Google de mentira para probar el login con Google sin red.
+
+Genera un par de claves RSA y un JWKS con la pública, y firma id_token con el
+mismo formato que Google (RS256, kid, iss, aud, sub, email, name).
+
+    python scripts/google_jwks_fixture.py keys --out-dir /tmp/google-fixture
+    GOOGLE_CLIENT_ID=test-client GOOGLE_JWKS_FILE=/tmp/google-fixture/jwks.json \\
+        uvicorn app.main:app
+    python scripts/google_jwks_fixture.py token --key /tmp/google-fixture/private.pem \\
+        --aud test-client --sub 123 --email alumno@x.com --name "Alumno Prueba"
+
+El token impreso se envía como `id_token` a POST /auth/google.
+"""
+
+from pathlib import Path
+import argparse
+import json
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+KID = "fixture-key-1"
+
+
+def cmd_keys(args):
+    out = Path(args.out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    public_pem = private.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    public_jwk = jwk.construct(public_pem.decode(), "RS256").to_dict()
+    public_jwk.update({"kid": args.kid, "use": "sig", "alg": "RS256"})
+
+    (out / "private.pem").write_bytes(pem)
+    (out / "jwks.json").write_text(json.dumps({"keys": [public_jwk]}, indent=2))
+    print(f"{out / 'private.pem'}\n{out / 'jwks.json'}")
+
+
+def cmd_token(args):
+    now = int(time.time())
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": args.aud,
+        "sub": args.sub,
+        "email": args.email,
+        "email_verified": True,
+        "name": args.name or args.email,
+        "iat": now,
+        "exp": now + args.ttl,
+    }
+    print(jwt.encode(claims, Path(args.key).read_text(), algorithm="RS256", headers={"kid": args.kid}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    keys = sub.add_parser("keys", help="genera private.pem y jwks.json")
+    keys.add_argument("--out-dir", required=True)
+    keys.add_argument("--kid", default=KID)
+    keys.set_defaults(func=cmd_keys)
+
+    token = sub.add_parser("token", help="firma un id_token")
+    token.add_argument("--key", required=True, help="private.pem generado con `keys`")
+    token.add_argument("--aud", required=True, help="GOOGLE_CLIENT_ID de la API")
+    token.add_argument("--sub", required=True)
+    token.add_argument("--email", required=True)
+    token.add_argument("--name")
+    token.add_argument("--kid", default=KID)
+    token.add_argument("--ttl", type=int, default=3600, help="segundos de validez")
+    token.set_defaults(func=cmd_token)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
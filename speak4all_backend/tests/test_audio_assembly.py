@@ -0,0 +1,80 @@
+"""
+Ensamblado del audio en memoria (ai_exercises.assemble_to_mp3): mismas reglas
+que el concat de ffmpeg anterior para los fragmentos vacíos o truncados.
+"""
+
+import struct
+import wave
+
+import numpy as np
+import pytest
+
+from app.services import ai_exercises, audio_assembly
+
+RATE = ai_exercises.SAMPLE_RATE
+
+
+def _write_wav(path, n_samples: int, value: float = 0.25, rate: int = RATE):
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes((np.full(n_samples, value) * 32767).astype("<i2").tobytes())
+    return path
+
+
+@pytest.fixture
+def encoded(monkeypatch):
+    """Sustituye la codificación MP3 (ffmpeg) y guarda el PCM ensamblado."""
+    captured = {}
+
+    def _encode(samples, out_mp3, sample_rate, bitrate, **kwargs):
+        captured["pcm"] = samples
+    monkeypatch.setattr(audio_assembly, "encode_mp3", _encode)
+    return captured
+
+
+def test_short_segments_are_dropped_but_pauses_kept(tmp_path, encoded):
+    min_samples = (ai_exercises.SEGMENT_MIN_BYTES - audio_assembly.WAV_HEADER_BYTES) // 2
+    wavs = [
+        _write_wav(tmp_path / "a.wav", 4410),
+        _write_wav(tmp_path / "tiny.wav", min_samples),  # 2000 bytes justos: se descarta
+        _write_wav(tmp_path / "b.wav", min_samples + 1),
+    ]
+    segments = [{"pause": 0.1}, {"pause": 0.2}, {"pause": 0.0}]
+
+    ai_exercises.assemble_to_mp3(segments, wavs, tmp_path / "out.mp3")
+
+    pcm = encoded["pcm"]
+    pause_1, pause_2 = int(0.1 * RATE), int(0.2 * RATE)
+    assert pcm.size == 4410 + pause_1 + pause_2 + min_samples + 1
+    assert np.count_nonzero(pcm) == 4410 + min_samples + 1
+    assert not pcm[4410:4410 + pause_1 + pause_2].any()
+
+
+def test_missing_segments_are_skipped(tmp_path, encoded):
+    wavs = [tmp_path / "missing.wav", _write_wav(tmp_path / "a.wav", 4410)]
+
+    ai_exercises.assemble_to_mp3([{"pause": 0.0}, {"pause": 0.0}], wavs, tmp_path / "out.mp3")
+
+    assert encoded["pcm"].size == 4410
+
+
+def test_short_threshold_uses_output_rate(tmp_path, encoded):
+    # 24 kHz (OpenAI): se mide tras remuestrear a AUDIO_RATE, como hacía ensure_wav
+    wav = _write_wav(tmp_path / "a.wav", 500, rate=24000)  # 919 muestras a 44,1 kHz
+
+    with pytest.raises(RuntimeError):
+        ai_exercises.assemble_to_mp3([{"pause": 0.0}], [wav], tmp_path / "out.mp3")
+
+
+@pytest.mark.parametrize("bits", [0, 4, 12])
+def test_unsupported_bit_depth_falls_back_to_ffmpeg(bits):
+    fmt = struct.pack("<HHIIHH", 1, 1, RATE, RATE, 1, bits)
+    pcm = b"\x00" * 64
+    data = (
+        b"RIFF" + struct.pack("<I", 4 + 8 + len(fmt) + 8 + len(pcm)) + b"WAVE"
+        + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+        + b"data" + struct.pack("<I", len(pcm)) + pcm
+    )
+    assert audio_assembly._parse_wav(data) is None
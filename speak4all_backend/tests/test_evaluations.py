@@ -0,0 +1,28 @@
+"""Actualización de evaluaciones (PUT /evaluations/{id})."""
+
+from app import models
+
+
+def test_update_with_missing_rubric_returns_404_and_keeps_scores(client, auth_headers, db, seed_course):
+    course, _ = seed_course(db, n_students=2, n_exercises=2, seed=16)
+    evaluation = db.query(models.Evaluation).filter(models.Evaluation.is_deleted.is_(False)).first()
+    evaluation.is_locked = False
+    evaluation.rubric_template_id = 9999  # plantilla borrada: SQLite no comprueba la FK
+    db.add(models.EvaluationCriterionScore(
+        evaluation_id=evaluation.id, rubric_criteria_id=1, rubric_level_id=1, points_awarded=3,
+    ))
+    db.commit()
+    evaluation_id, therapist_id = evaluation.id, course.therapist_id
+
+    response = client.put(
+        f"/evaluations/{evaluation_id}",
+        json={"criterion_scores": [{"rubric_criteria_id": 1, "rubric_level_id": 1, "points_awarded": 3}]},
+        headers=auth_headers(therapist_id, models.UserRole.THERAPIST),
+    )
+
+    assert response.status_code == 404
+    db.expire_all()
+    scores = db.query(models.EvaluationCriterionScore).filter(
+        models.EvaluationCriterionScore.evaluation_id == evaluation_id,
+    ).count()
+    assert scores == 1
@@ -0,0 +1,163 @@
+"""
+Lotes de ejercicios en base de datos (exercise_batches): reclamo con límite
+global de concurrencia, reintentos y guardado final en una transacción.
+"""
+
+import asyncio
+
+import pytest
+
+from app import models
+from app.config import settings
+from app.services import ai_exercises, audio_jobs, exercise_batches
+
+ItemStatus = models.ExerciseBatchItemStatus
+
+
+@pytest.fixture
+def therapist(db):
+    user = models.User(email="t@x.com", full_name="Terapeuta", role=models.UserRole.THERAPIST)
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def fake_ai(monkeypatch, session_factory, tmp_path):
+    """IA y render falsos (escriben en tmp_path/media); cuentan llamadas y notificaciones."""
+    calls = {"generate": [], "render": [], "fail_render": set(), "notified": []}
+    monkeypatch.chdir(tmp_path)
+
+    def _generate(prompt, profile_description=None):
+        calls["generate"].append(prompt)
+        return f"[REP]{prompt}[/REP]"
+
+    def _render(marked_text, chunk_dir, previous_manifest=None, base_dir=None):
+        calls["render"].append(marked_text)
+        chunks = base_dir / "media" / chunk_dir
+        chunks.mkdir(parents=True, exist_ok=True)
+        (chunks / "seg.wav").write_bytes(b"RIFF")
+        if marked_text in calls["fail_render"]:
+            raise RuntimeError("TTS caído")
+        out_rel = f"{chunk_dir.rsplit('/', 1)[0]}/exercise.mp3"
+        (base_dir / "media" / out_rel).write_bytes(b"ID3")
+        return out_rel, [{"chunk_path": f"{chunk_dir}/seg.wav"}]
+
+    async def _send_to_user(user_id, message):
+        calls["notified"].append(message["data"])
+
+    monkeypatch.setattr(ai_exercises, "generate_marked_text_from_prompt", _generate)
+    monkeypatch.setattr(ai_exercises, "render_exercise_audio", _render)
+    monkeypatch.setattr(exercise_batches.manager, "send_to_user", _send_to_user)
+    monkeypatch.setattr(exercise_batches, "SessionLocal", session_factory)
+    monkeypatch.setattr(settings, "exercise_batch_concurrency", 2)
+    monkeypatch.setattr(settings, "audio_job_max_attempts", 2)
+    return calls
+
+
+def _create(db, therapist, prompts) -> str:
+    batch = exercise_batches.create_batch(
+        db, therapist.id, None, [{"name": p, "prompt": p, "profile_id": None} for p in prompts],
+    )
+    db.commit()
+    return batch.id
+
+
+def _drain() -> int:
+    async def _run():
+        loop = asyncio.get_running_loop()
+        n = 0
+        while await asyncio.to_thread(exercise_batches.process_next_item, loop):
+            n += 1
+        return n
+    return asyncio.run(_run())
+
+
+def test_claims_respect_global_limit(db, session_factory, therapist, fake_ai):
+    _create(db, therapist, ["a", "b", "c"])
+    workers = [session_factory() for _ in range(3)]
+
+    first = exercise_batches.claim_next_item(workers[0])
+    second = exercise_batches.claim_next_item(workers[1])
+    assert [first.index, second.index] == [0, 1]
+    assert exercise_batches.claim_next_item(workers[2]) is None
+
+    first.status = ItemStatus.DONE
+    workers[0].commit()
+    third = exercise_batches.claim_next_item(workers[2])
+    assert third.index == 2 and third.status == ItemStatus.GENERATING
+    for session in workers:
+        session.close()
+
+
+def test_batch_persists_all_exercises_at_the_end(db, therapist, fake_ai):
+    batch_id = _create(db, therapist, ["a", "b", "c"])
+
+    assert _drain() == 3
+
+    db.expire_all()
+    batch = exercise_batches.get_batch(db, batch_id)
+    assert batch.status == models.ExerciseBatchStatus.DONE
+    assert batch.finished_at is not None
+    exercises = db.query(models.Exercise).order_by(models.Exercise.id).all()
+    assert [e.name for e in exercises] == ["a", "b", "c"]
+    assert [item.exercise_id for item in batch.items] == [e.id for e in exercises]
+    assert all(e.audio_status == models.AudioStatus.READY for e in exercises)
+    assert fake_ai["notified"][-1]["status"] == "DONE"
+    assert fake_ai["notified"][-1]["done"] == 3
+
+
+def test_retry_keeps_generated_script(db, therapist, fake_ai):
+    batch_id = _create(db, therapist, ["a", "b"])
+    fake_ai["fail_render"].add("[REP]b[/REP]")
+
+    _drain()
+
+    db.expire_all()
+    batch = exercise_batches.get_batch(db, batch_id)
+    item_a, item_b = batch.items
+    assert fake_ai["generate"] == ["a", "b"]  # el reintento no vuelve a llamar a la IA
+    assert fake_ai["render"].count("[REP]b[/REP]") == settings.audio_job_max_attempts
+    assert item_a.status == ItemStatus.DONE and item_a.exercise_id is not None
+    assert item_b.status == ItemStatus.FAILED and item_b.attempts == 2
+    assert "TTS caído" in item_b.error
+    assert batch.status == models.ExerciseBatchStatus.DONE
+    assert db.query(models.Exercise).count() == 1
+
+
+def _media(tmp_path, relative: str):
+    return tmp_path / "media" / relative
+
+
+def test_chunks_move_to_exercise_dir(db, therapist, fake_ai, tmp_path):
+    batch_id = _create(db, therapist, ["a", "b"])
+    fake_ai["fail_render"].add("[REP]b[/REP]")
+
+    _drain()
+
+    db.expire_all()
+    item_a, item_b = exercise_batches.get_batch(db, batch_id).items
+    exercise = db.get(models.Exercise, item_a.exercise_id)
+    assert _media(tmp_path, exercise.audio_path).exists()
+    # El manifiesto apunta a WAV que existen: editar el ejercicio reutiliza los fragmentos
+    assert exercise.audio_manifest == [{"chunk_path": f"{audio_jobs.exercise_chunk_dir(exercise.id)}/seg.wav"}]
+    assert _media(tmp_path, exercise.audio_manifest[0]["chunk_path"]).exists()
+    assert not _media(tmp_path, exercise_batches.item_chunk_dir(batch_id, 0)).exists()
+    assert not _media(tmp_path, exercise_batches.item_dir(batch_id, 1)).exists()
+
+
+def test_rendered_files_removed_when_persist_fails(db, therapist, fake_ai, tmp_path, monkeypatch):
+    batch_id = _create(db, therapist, ["a", "b"])
+
+    def _broken_persist(db, batch):
+        raise RuntimeError("sin conexión")
+    monkeypatch.setattr(exercise_batches, "_persist", _broken_persist)
+
+    _drain()
+
+    db.expire_all()
+    batch = exercise_batches.get_batch(db, batch_id)
+    assert batch.status == models.ExerciseBatchStatus.FAILED
+    assert all(item.status == ItemStatus.FAILED for item in batch.items)
+    assert not _media(tmp_path, exercise_batches.batch_dir(batch_id)).exists()
+    assert db.query(models.Exercise).count() == 0
@@ -0,0 +1,136 @@
+"""Verificación de id_token de Google sin red, con el JWKS de scripts/google_jwks_fixture.py."""
+
+from argparse import Namespace
+from pathlib import Path
+import importlib.util
+import json
+import time
+import urllib.error
+
+from jose import jwt
+import pytest
+
+from app.config import settings
+from app.services import google_jwks
+
+AUDIENCE = "test-client"
+
+_spec = importlib.util.spec_from_file_location(
+    "google_jwks_fixture", Path(__file__).resolve().parent.parent / "scripts" / "google_jwks_fixture.py",
+)
+jwks_fixture = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(jwks_fixture)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch, tmp_path):
+    """Estado del módulo limpio y caché en disco dentro de tmp_path."""
+    monkeypatch.setattr(google_jwks, "_keys", {})
+    monkeypatch.setattr(google_jwks, "_expires_at", 0.0)
+    monkeypatch.setattr(google_jwks, "_last_fetch", float("-inf"))
+    monkeypatch.setattr(google_jwks, "_disk_loaded", False)
+    monkeypatch.setattr(google_jwks, "_refreshing", False)
+    monkeypatch.setattr(google_jwks, "_stats", dict.fromkeys(google_jwks._stats, 0))
+    monkeypatch.setattr(settings, "google_jwks_cache_file", str(tmp_path / "cache.json"))
+    monkeypatch.setattr(settings, "google_jwks_file", None)
+
+
+@pytest.fixture
+def fixture_dir(tmp_path):
+    out = tmp_path / "fixture"
+    jwks_fixture.cmd_keys(Namespace(out_dir=str(out), kid=jwks_fixture.KID))
+    return out
+
+
+@pytest.fixture
+def use_fixture_file(fixture_dir, monkeypatch):
+    monkeypatch.setattr(settings, "google_jwks_file", str(fixture_dir / "jwks.json"))
+
+
+def _token(fixture_dir: Path, kid: str = jwks_fixture.KID, **overrides) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": AUDIENCE,
+        "sub": "123",
+        "email": "alumno@x.com",
+        "email_verified": True,
+        "iat": now,
+        "exp": now + 3600,
+        **overrides,
+    }
+    key = (fixture_dir / "private.pem").read_text()
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid})
+
+
+def test_valid_token(fixture_dir, use_fixture_file):
+    claims = google_jwks.verify_id_token(_token(fixture_dir), AUDIENCE)
+    assert claims["sub"] == "123"
+    assert claims["email"] == "alumno@x.com"
+
+
+@pytest.mark.parametrize("overrides", [
+    {"aud": "otro-cliente"},
+    {"iss": "https://evil.example.com"},
+    {"iat": int(time.time()) - 7200, "exp": int(time.time()) - 3600},
+])
+def test_invalid_claims_are_rejected(fixture_dir, use_fixture_file, overrides):
+    with pytest.raises(google_jwks.GoogleTokenError):
+        google_jwks.verify_id_token(_token(fixture_dir, **overrides), AUDIENCE)
+
+
+def test_unknown_kid_is_rejected(fixture_dir, use_fixture_file):
+    with pytest.raises(google_jwks.GoogleTokenError, match="desconocida"):
+        google_jwks.verify_id_token(_token(fixture_dir, kid="rotated-key"), AUDIENCE)
+
+
+@pytest.mark.parametrize("cache_control, age, expected", [
+    ("public, max-age=20000, must-revalidate, no-transform", None, 20000),
+    ("public, max-age=20000", "500", 19500),
+    ("public, max-age=100", "500", 0),
+    (None, None, google_jwks.DEFAULT_MAX_AGE_S),
+])
+def test_max_age(cache_control, age, expected):
+    assert google_jwks._max_age(cache_control, age) == expected
+
+
+def _wait_refresh_done(timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while google_jwks._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not google_jwks._refreshing
+
+
+def test_stale_keys_are_served_when_fetch_fails(fixture_dir, monkeypatch):
+    jwks = json.loads((fixture_dir / "jwks.json").read_text())
+    google_jwks._set_keys({k["kid"]: k for k in jwks["keys"]}, time.time() - 60)
+    google_jwks._disk_loaded = True
+
+    def _unreachable():
+        raise urllib.error.URLError("sin red")
+    monkeypatch.setattr(google_jwks, "_fetch", _unreachable)
+
+    claims = google_jwks.verify_id_token(_token(fixture_dir), AUDIENCE)
+    assert claims["sub"] == "123"
+    _wait_refresh_done()
+    assert google_jwks._stats["fetch_errors"] == 1
+
+    # Sin nuevas descargas hasta MIN_FETCH_INTERVAL_S: el login no espera a la red
+    google_jwks.verify_id_token(_token(fixture_dir), AUDIENCE)
+    _wait_refresh_done()
+    assert google_jwks._stats["fetch_errors"] == 1
+    assert google_jwks._stats["background_refreshes"] == 1
+
+
+def test_background_refresh_flag_reset_when_fetch_lock_busy(monkeypatch):
+    fetched = []
+    monkeypatch.setattr(google_jwks, "_fetch", lambda: fetched.append(1) or ({}, time.time() + 3600))
+
+    with google_jwks._fetch_lock:  # descarga en curso desde un login
+        google_jwks._refresh_in_background()
+        _wait_refresh_done()
+    assert fetched == []
+
+    google_jwks._refresh_in_background()
+    _wait_refresh_done()
+    assert fetched == [1]
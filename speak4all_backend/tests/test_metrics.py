@@ -0,0 +1,31 @@
+"""GET /metrics solo con METRICS_TOKEN."""
+
+from app.config import settings
+from app.services import ai_exercises
+
+
+def test_metrics_disabled_without_token_setting(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", None)
+    assert client.get("/metrics", headers={"X-Metrics-Token": "x"}).status_code == 404
+
+
+def test_metrics_rejects_missing_or_wrong_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", "s3cret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"X-Metrics-Token": "otro"}).status_code == 401
+
+
+def test_metrics_with_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", "s3cret")
+    response = client.get("/metrics", headers={"X-Metrics-Token": "s3cret"})
+    assert response.status_code == 200
+    body = response.json()
+    assert "password_pool" in body
+    assert {"hits", "misses", "hit_rate", "bytes"} <= set(body["tts_cache"])
+
+
+def test_metrics_tts_cache_disabled(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", "s3cret")
+    monkeypatch.setattr(ai_exercises, "tts_cache", None)
+    response = client.get("/metrics", headers={"X-Metrics-Token": "s3cret"})
+    assert response.json()["tts_cache"] is None
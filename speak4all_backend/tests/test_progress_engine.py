@@ -0,0 +1,114 @@
+"""
+Progreso de un estudiante (progress_engine.student_progress): una sola
+sentencia SQL por llamada y mismo resultado que el bucle por ejercicio que
+había antes en GET /progress/courses/{course_id}/students/{student_id}.
+"""
+
+import pytest
+
+from app import models
+from app.services import progress_engine
+
+
+def legacy_student_progress(db, course_id: int, student_id: int):
+    """El cálculo anterior: varias consultas por ejercicio del curso."""
+    course_exercises = db.query(models.CourseExercise).filter(
+        models.CourseExercise.course_id == course_id,
+        models.CourseExercise.is_deleted.is_(False),
+    ).all()
+
+    total_weight = 0
+    weighted_score_sum = 0
+    evaluated_count = 0
+    entries = []
+    for ce in course_exercises:
+        weighting = db.query(models.ExerciseWeighting).filter(
+            models.ExerciseWeighting.course_exercise_id == ce.id
+        ).first()
+        weight = weighting.weight if weighting else 1
+        total_weight += weight
+
+        evaluation = db.query(models.Evaluation).join(
+            models.Submission, models.Evaluation.submission_id == models.Submission.id
+        ).filter(
+            models.Submission.course_exercise_id == ce.id,
+            models.Submission.student_id == student_id,
+            models.Evaluation.is_deleted.is_(False),
+        ).first()
+
+        exercise = db.query(models.Exercise).filter(models.Exercise.id == ce.exercise_id).first()
+        category = None
+        if ce.category_id:
+            category = db.query(models.ExerciseCategory).filter(
+                models.ExerciseCategory.id == ce.category_id
+            ).first()
+
+        entry = {
+            "course_exercise_id": ce.id,
+            "exercise_name": exercise.name,
+            "weight": weight,
+            "evaluated": False,
+            "score": None,
+            "max_score": None,
+            "category_id": category.id if category else None,
+            "category_name": category.name if category else None,
+        }
+        if evaluation:
+            evaluated_count += 1
+            entry["evaluated"] = True
+            rubric = db.query(models.RubricTemplate).filter(
+                models.RubricTemplate.id == evaluation.rubric_template_id
+            ).first()
+            if rubric and rubric.max_score > 0:
+                weighted_score_sum += (evaluation.total_score / rubric.max_score) * 100 * weight
+                entry["score"] = evaluation.total_score
+                entry["max_score"] = rubric.max_score
+        entries.append(entry)
+
+    weighted_score = (weighted_score_sum / total_weight) if total_weight > 0 else 0.0
+    return round(weighted_score, 6), evaluated_count, entries
+
+
+def _comparable(progress: dict):
+    keys = ("course_exercise_id", "exercise_name", "weight", "evaluated", "score", "max_score",
+            "category_id", "category_name")
+    entries = [{k: entry[k] for k in keys} for entry in progress["exercise_scores"]]
+    return round(progress["weighted_score"], 6), progress["evaluated_exercises"], entries
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_matches_legacy_loop_in_one_statement(db, seed_course, count_statements, seed):
+    course, students = seed_course(db, n_students=5, n_exercises=10, seed=seed)
+    course_id = course.id
+
+    for student_id in [s.id for s in students]:
+        with count_statements(db) as legacy_count:
+            expected = legacy_student_progress(db, course_id, student_id)
+        with count_statements(db) as count:
+            progress = progress_engine.student_progress(db, course_id, student_id)
+
+        assert _comparable(progress) == expected
+        assert count["n"] == 1
+        assert legacy_count["n"] > 3 * progress["total_exercises"]
+
+
+@pytest.mark.parametrize("n_exercises", [1, 5, 40])
+def test_statement_count_does_not_grow_with_exercises(db, seed_course, count_statements, n_exercises):
+    course, students = seed_course(db, n_students=2, n_exercises=n_exercises, seed=7)
+    course_id, student_id = course.id, students[0].id
+
+    with count_statements(db) as count:
+        progress_engine.student_progress(db, course_id, student_id)
+
+    assert count["n"] == 1
+
+
+def test_empty_course(db, seed_course, count_statements):
+    course, students = seed_course(db, n_students=1, n_exercises=0, seed=1)
+    course_id, student_id = course.id, students[0].id
+
+    with count_statements(db) as count:
+        progress = progress_engine.student_progress(db, course_id, student_id)
+
+    assert count["n"] == 1
+    assert progress["total_exercises"] == 0 and progress["weighted_score"] == 0.0
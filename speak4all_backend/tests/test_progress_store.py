@@ -0,0 +1,117 @@
+"""
+Tabla materializada student_course_progress (progress_store): se mantiene al
+unirse o salir un estudiante del curso y la lectura del curso no escribe.
+"""
+
+from sqlalchemy import event
+
+from app import models
+from app.services import progress_engine, progress_store
+
+
+def _stored(db, course_id: int, student_id: int):
+    db.expire_all()
+    return db.get(models.StudentCourseProgress, (course_id, student_id))
+
+
+def _expected(db, course_id: int, student_id: int) -> tuple:
+    progress = progress_engine.student_progress(db, course_id, student_id)
+    return (round(progress["weighted_sum"], 6), progress["total_weight"],
+            progress["evaluated_exercises"], progress["total_exercises"])
+
+
+def _as_tuple(row) -> tuple:
+    return round(row.weighted_sum, 6), row.total_weight, row.evaluated_count, row.total_exercises
+
+
+def _accept(client, auth_headers, db, course, student_id: int):
+    req = db.query(models.CourseJoinRequest).filter_by(course_id=course.id, student_id=student_id).first()
+    if req is None:
+        req = models.CourseJoinRequest(course_id=course.id, student_id=student_id)
+        db.add(req)
+    req.status = models.JoinRequestStatus.PENDING
+    db.commit()
+    response = client.post(
+        f"/courses/{course.id}/requests/{req.id}/decision",
+        json={"accept": True},
+        headers=auth_headers(course.therapist_id, models.UserRole.THERAPIST),
+    )
+    assert response.status_code == 200, response.text
+
+
+def _remove(client, auth_headers, db, course, student_id: int):
+    cs = db.query(models.CourseStudent).filter_by(
+        course_id=course.id, student_id=student_id, deleted_at=None,
+    ).one()
+    response = client.delete(
+        f"/courses/{course.id}/students/{cs.id}",
+        headers=auth_headers(course.therapist_id, models.UserRole.THERAPIST),
+    )
+    assert response.status_code == 204, response.text
+
+
+def test_accepting_join_request_creates_row(client, auth_headers, db, seed_course):
+    course, students = seed_course(db, n_students=1, n_exercises=6, seed=3)
+    newcomer = models.User(email="new@x.com", full_name="Nuevo", role=models.UserRole.STUDENT)
+    db.add(newcomer)
+    db.commit()
+
+    _accept(client, auth_headers, db, course, newcomer.id)
+
+    row = _stored(db, course.id, newcomer.id)
+    assert row is not None
+    assert _as_tuple(row) == _expected(db, course.id, newcomer.id)
+
+
+def test_rejoin_does_not_serve_stale_row(client, auth_headers, db, seed_course):
+    course, students = seed_course(db, n_students=2, n_exercises=6, seed=5)
+    course_id, student_id = course.id, students[0].id
+    progress_store.refresh_course(db, course_id)
+    db.commit()
+
+    _remove(client, auth_headers, db, course, student_id)
+    assert _stored(db, course_id, student_id) is None
+
+    # Mientras está fuera del curso cambian los ejercicios (refresh_course solo toca a los activos)
+    ce = db.query(models.CourseExercise).filter_by(course_id=course_id, is_deleted=False).first()
+    ce.is_deleted = True
+    progress_store.refresh_course(db, course_id)
+    db.commit()
+
+    _accept(client, auth_headers, db, course, student_id)
+
+    row = _stored(db, course_id, student_id)
+    assert _as_tuple(row) == _expected(db, course_id, student_id)
+
+
+def test_course_progress_read_does_not_write(client, auth_headers, db, seed_course):
+    course, students = seed_course(db, n_students=3, n_exercises=5, seed=2)
+    course_id = course.id
+    progress_store.refresh_student(db, course_id, students[0].id)  # las demás filas faltan
+    db.commit()
+    expected = {s.id: _expected(db, course_id, s.id) for s in students}
+    db.rollback()
+
+    writes = []
+
+    def _record(conn, cursor, statement, *args):
+        if statement.lstrip().split()[0].upper() in ("INSERT", "UPDATE", "DELETE"):
+            writes.append(statement)
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        response = client.get(
+            f"/progress/course/{course_id}/all",
+            headers=auth_headers(course.therapist_id, models.UserRole.THERAPIST),
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+
+    assert response.status_code == 200, response.text
+    assert writes == []
+    assert db.query(models.StudentCourseProgress).count() == 1
+    for entry in response.json():
+        weighted_sum, total_weight, evaluated, total = expected[entry["student_id"]]
+        assert entry["evaluated_exercises"] == evaluated
+        assert entry["total_exercises"] == total
+        assert entry["weighted_score"] == round(weighted_sum / total_weight if total_weight else 0.0, 2)
@@ -0,0 +1,18 @@
+"""Caché en disco de segmentos TTS (tts_cache.TTSSegmentCache)."""
+
+from app.services.tts_cache import TTSSegmentCache
+
+
+def test_overwrite_does_not_inflate_size(tmp_path):
+    cache = TTSSegmentCache(tmp_path / "cache", max_bytes=10_000)
+    small, large = tmp_path / "small.wav", tmp_path / "large.wav"
+    small.write_bytes(b"a" * 100)
+    large.write_bytes(b"b" * 300)
+
+    cache.put("ab" * 32, small)
+    cache.put("ab" * 32, small)
+    assert cache.stats()["bytes"] == 100
+
+    cache.put("ab" * 32, large)
+    assert cache.stats()["bytes"] == 300
+
@@ -0,0 +1,107 @@
+"""
+Síntesis concurrente de segmentos TTS (ai_exercises.synthesize_segments) con
+un proveedor falso de latencia fija: el tiempo total debe ser
+≈ ceil(n / concurrencia) × latencia y los errores transitorios se reintentan.
+"""
+
+from math import ceil
+import threading
+import time
+
+import pytest
+
+from app.services import ai_exercises
+from app.services.ai_providers import AIProvider, AIProviderError
+
+LATENCY_S = 0.2
+
+
+class FakeTTSProvider(AIProvider):
+    name = "fake"
+
+    def __init__(self, latency_s: float, failures: dict[str, int] | None = None):
+        self.latency_s = latency_s
+        self.failures = dict(failures or {})  # texto -> fallos antes de responder
+        self.calls: dict[str, int] = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def complete(self, model, messages, temperature, max_tokens):
+        raise AssertionError("no se usa en estas pruebas")
+
+    def stream(self, model, messages, temperature, max_tokens):
+        raise AssertionError("no se usa en estas pruebas")
+
+    def synthesize_wav(self, text, out_wav, model, voice, instructions, sample_rate):
+        with self._lock:
+            self.calls[text] = self.calls.get(text, 0) + 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            fail = self.failures.get(text, 0) > 0
+            if fail:
+                self.failures[text] -= 1
+        try:
+            time.sleep(self.latency_s)
+            if fail:
+                raise AIProviderError("429 Too Many Requests (simulado)")
+            out_wav.write_bytes(b"RIFF")
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def fake_tts(monkeypatch):
+    def _install(concurrency: int, **kwargs) -> FakeTTSProvider:
+        fake = FakeTTSProvider(LATENCY_S, **kwargs)
+        monkeypatch.setattr(ai_exercises, "provider", fake)
+        monkeypatch.setattr(ai_exercises, "tts_cache", None)
+        monkeypatch.setattr(ai_exercises, "TTS_MAX_CONCURRENCY", concurrency)
+        monkeypatch.setattr(ai_exercises, "TTS_RETRY_BACKOFF_S", 0.01)
+        return fake
+    return _install
+
+
+def _items(tmp_path, n: int) -> list:
+    return [(f"segmento {i}", tmp_path / f"seg_{i}.wav") for i in range(n)]
+
+
+def _timed(items) -> float:
+    started = time.perf_counter()
+    ai_exercises.synthesize_segments(items)
+    return time.perf_counter() - started
+
+
+@pytest.mark.parametrize("n, concurrency", [(8, 4), (10, 4), (6, 1), (3, 8)])
+def test_wall_time_is_bounded_by_concurrency(fake_tts, tmp_path, n, concurrency):
+    fake = fake_tts(concurrency)
+    items = _items(tmp_path, n)
+
+    elapsed = _timed(items)
+
+    expected = ceil(n / min(concurrency, n)) * LATENCY_S
+    assert expected * 0.95 <= elapsed < expected + LATENCY_S * 0.75
+    assert fake.peak_in_flight == min(concurrency, n)
+    assert all(wav.exists() for _, wav in items)
+
+
+def test_transient_errors_are_retried(fake_tts, tmp_path):
+    fake = fake_tts(4, failures={"segmento 1": 2, "segmento 3": 1})
+    items = _items(tmp_path, 4)
+
+    elapsed = _timed(items)
+
+    assert fake.calls == {"segmento 0": 1, "segmento 1": 3, "segmento 2": 1, "segmento 3": 2}
+    assert all(wav.exists() for _, wav in items)
+    # Los reintentos solo alargan el segmento que falla: 3 llamadas + esperas cortas
+    assert elapsed < 3 * LATENCY_S + 0.5
+
+
+def test_gives_up_after_max_retries(fake_tts, monkeypatch, tmp_path):
+    fake = fake_tts(2, failures={"segmento 0": 10})
+    monkeypatch.setattr(ai_exercises, "TTS_MAX_RETRIES", 2)
+
+    with pytest.raises(AIProviderError):
+        ai_exercises.synthesize_segments(_items(tmp_path, 2))
+    assert fake.calls["segmento 0"] == 3
@@ -0,0 +1,193 @@
+"""
+Backplane WebSocket (LISTEN/NOTIFY).
+
+La prueba con varios procesos arranca WORKERS procesos, cada uno con su
+propio ConnectionManager conectado al Postgres de DATABASE_URL y un socket
+falso suscrito al curso 1 como usuario 100+N. El proceso 0 emite un broadcast
+al curso (deben recibirlo todos, una sola vez), un mensaje al usuario 101
+(solo el proceso 1) y un broadcast grande que se parte en varios NOTIFY.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import time
+
+import pytest
+
+from app.websocket_manager import ConnectionManager
+from app.ws_backplane import PostgresBackplane
+
+
+WORKERS = 3
+COURSE_ID = 1
+USER_BASE = 100
+LARGE_KB = 20
+TIMEOUT_S = 5.0
+
+
+class FakeWebSocket:
+    """Lo mínimo de fastapi.WebSocket que usa ConnectionManager."""
+
+    def __init__(self):
+        self.received: list[dict] = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        self.received.append(json.loads(data))
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+class SlowConnection:
+    """Conexión asyncpg falsa cuyo NOTIFY no termina hasta `release`."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.notified: list[list[str]] = []
+
+    async def execute(self, query, channel, envelopes, timeout=None):
+        await self.release.wait()
+        self.notified.append(envelopes)
+
+
+def _manager_with_backplane(conn, queue_size: int = 1000) -> ConnectionManager:
+    """Manager con un backplane ya "conectado" a `conn` (sin LISTEN); hay que llamarlo dentro del loop."""
+    manager = ConnectionManager()
+    backplane = PostgresBackplane("postgresql://-", {}, "test", manager._relay, queue_size)
+    backplane._conn = conn
+    backplane._publisher = asyncio.create_task(backplane._drain())
+    manager.backplane = backplane
+    return manager
+
+
+def test_broadcast_delivers_locally_without_waiting_for_notify():
+    async def scenario():
+        conn = SlowConnection()
+        manager = _manager_with_backplane(conn)
+        socket = FakeWebSocket()
+        await manager.connect(socket, 1, 100)
+
+        await asyncio.wait_for(manager.broadcast_to_course(1, {"type": "check"}), timeout=1)
+        await asyncio.wait_for(manager.send_to_user(100, {"type": "check_user"}), timeout=1)
+        await asyncio.sleep(0.05)
+        assert [m["type"] for m in socket.received] == ["check", "check_user"]
+        assert conn.notified == []
+
+        conn.release.set()
+        await asyncio.sleep(0.05)
+        assert len(conn.notified) == 2
+        assert manager.backplane.stats["published"] == 2
+
+        manager.disconnect(socket)
+        await manager.stop_backplane()
+
+    asyncio.run(scenario())
+
+
+def test_full_publish_queue_drops_instead_of_blocking():
+    async def scenario():
+        conn = SlowConnection()
+        manager = _manager_with_backplane(conn, queue_size=2)
+        await asyncio.sleep(0)
+
+        # Uno en curso (bloqueado en NOTIFY) + 2 en cola; el resto se descarta
+        for n in range(5):
+            await asyncio.wait_for(manager.broadcast_to_course(1, {"type": "check", "n": n}), timeout=1)
+            await asyncio.sleep(0)
+        stats = manager.stats()["backplane"]
+        assert stats["pending_publishes"] == 2
+        assert stats["dropped_publishes"] == 2
+
+        conn.release.set()
+        await asyncio.sleep(0.05)
+        sent = [json.loads(json.loads(envelopes[0])["d"])["message"]["n"] for envelopes in conn.notified]
+        assert sent == [0, 1, 2]
+        await manager.stop_backplane()
+
+    asyncio.run(scenario())
+
+
+async def _wait_for(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.05)
+    return predicate()
+
+
+async def _worker_main(idx: int, barrier, results):
+    manager = ConnectionManager()
+    await manager.start_backplane()
+    if manager.backplane is None:
+        results.put((idx, "sin backplane: DATABASE_URL no es Postgres o WS_BACKPLANE_ENABLED=false"))
+        return
+    if not await _wait_for(lambda: manager.backplane.connected, 10):
+        results.put((idx, "el backplane no conectó en 10 s"))
+        await manager.stop_backplane()
+        return
+
+    socket = FakeWebSocket()
+    await manager.connect(socket, COURSE_ID, USER_BASE + idx)
+    await asyncio.to_thread(barrier.wait)
+
+    large = "x" * (LARGE_KB * 1024)
+    if idx == 0:
+        await manager.broadcast_to_course(COURSE_ID, {"type": "check", "n": 1})
+        await manager.send_to_user(USER_BASE + 1, {"type": "check_user"})
+        await manager.broadcast_to_course(COURSE_ID, {"type": "check_large", "data": large})
+
+    def _types():
+        return [m.get("type") for m in socket.received if m.get("type", "").startswith("check")]
+
+    expected = ["check", "check_large"] + (["check_user"] if idx == 1 else [])
+    await _wait_for(lambda: sorted(_types()) == sorted(expected), TIMEOUT_S)
+    await asyncio.sleep(0.5)  # duplicados tardíos
+
+    problems = []
+    types = _types()
+    if sorted(types) != sorted(expected):
+        problems.append(f"esperado {sorted(expected)}, recibido {sorted(types)}")
+    big = [m for m in socket.received if m.get("type") == "check_large"]
+    if big and big[0].get("data") != large:
+        problems.append("el mensaje grande llegó corrupto")
+
+    await asyncio.to_thread(barrier.wait)
+    manager.disconnect(socket)
+    await manager.stop_backplane()
+    results.put((idx, "; ".join(problems) or None))
+
+
+def _worker(idx: int, barrier, results):
+    try:
+        asyncio.run(_worker_main(idx, barrier, results))
+    except Exception as e:
+        results.put((idx, f"excepción: {e!r}"))
+
+
+@pytest.mark.postgres
+def test_broadcast_reaches_sockets_on_other_workers():
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(WORKERS, timeout=60)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=_worker, args=(i, barrier, results)) for i in range(WORKERS)]
+    for p in processes:
+        p.start()
+
+    outcome = {}
+    try:
+        for _ in processes:
+            idx, problem = results.get(timeout=90)
+            outcome[idx] = problem
+    finally:
+        for p in processes:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.terminate()
+
+    problems = {idx: outcome.get(idx, "sin respuesta") for idx in range(WORKERS)}
+    assert all(problem is None for problem in problems.values()), problems